@@ -1,16 +1,16 @@
 from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import (
-    SpectacularAPIView,
     SpectacularRedocView,
     SpectacularSwaggerView,
 )
+from core.schema import CachedSpectacularAPIView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('core.urls')),
     # API Documentation URLs
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
+    path('api/schema/', CachedSpectacularAPIView.as_view(), name='schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     path('api/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
 ]
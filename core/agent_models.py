@@ -42,6 +42,7 @@ class Product(models.Model):
 
 class DemandForecast(models.Model):
     """Demand predictions from Inventory Agent (LNN)"""
+    # Partitioned by forecast_date month on PostgreSQL (migration 0019, core.partitioning)
     forecast_id = models.UUIDField(default=uuid.uuid4, unique=True)
     store = models.ForeignKey(Store, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -50,7 +51,7 @@ class DemandForecast(models.Model):
     confidence_score = models.FloatField(help_text="0-1 confidence level")
     forecast_horizon_days = models.IntegerField(default=7)
     model_version = models.CharField(max_length=50, default="LNN_v1")
-    external_factors = models.JSONField(default=dict, blank=True, help_text="Weather, events, etc.")
+    external_factors = models.JSONField(default=dict, blank=True, help_text="Weather, events, etc.")  # GIN-indexed on PostgreSQL (migration 0013)
     created_by_agent = models.CharField(max_length=100, default="InventoryAgent")
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -61,6 +62,115 @@ class DemandForecast(models.Model):
         return f"Forecast: {self.product.name} at {self.store.name} - {self.predicted_demand} units"
 
 
+class ForecastCurve(models.Model):
+    """
+    One forecaster run's whole horizon for a store and product: the daily
+    mean and quantiles packed as float32 arrays (see core.forecast_store),
+    instead of one DemandForecast row per day
+    """
+    # Indexed through the unique constraint below
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, db_index=False)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    run_date = models.DateField(help_text="First forecast day; day n of the horizon is run_date + n")
+    horizon_days = models.SmallIntegerField()
+    points = models.BinaryField(help_text="Mean, then each forecast_store.QUANTILES level, horizon_days values each")
+    confidence_score = models.FloatField(help_text="0-1 confidence level")
+    model_version = models.CharField(max_length=50, default="LNN_v1")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['store', 'product', 'run_date', 'model_version'],
+                                    name='unique_forecast_curve_run'),
+        ]
+        indexes = [
+            models.Index(fields=['run_date']),
+        ]
+
+    def __str__(self):
+        return f"Forecast curve: product {self.product_id} at store {self.store_id} from {self.run_date}"
+
+
+class ForecastCubeBuild(models.Model):
+    """One build of a day's aggregated forecast cube; rebuilt when that day's forecasts change"""
+    forecast_date = models.DateField()
+    method = models.CharField(max_length=20, choices=[
+        ('bottom_up', 'Bottom-up'),
+        ('mint', 'MinT (structural scaling)')
+    ])
+    forecasts = models.IntegerField(default=0, help_text="DemandForecast rows the cube was built from")
+    last_forecast_at = models.DateTimeField(null=True, blank=True)
+    build_ms = models.FloatField(default=0)
+    built_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['forecast_date', 'method']
+
+    def __str__(self):
+        return f"Forecast cube {self.forecast_date} ({self.method}): {self.forecasts} forecasts"
+
+
+class ForecastAggregate(models.Model):
+    """Reconciled demand of one store-level x product-level node of a forecast cube"""
+    build = models.ForeignKey(ForecastCubeBuild, on_delete=models.CASCADE, related_name='cells')
+    store_level = models.CharField(max_length=20)  # store, region, store_type, network
+    store_key = models.CharField(max_length=255)
+    product_level = models.CharField(max_length=20)  # product, category, all
+    product_key = models.CharField(max_length=255)
+    # Ancestors, where the node has a single one, for drill-down filters
+    region = models.CharField(max_length=255, blank=True)
+    store_type = models.CharField(max_length=50, blank=True)
+    category = models.CharField(max_length=100, blank=True)
+    series = models.IntegerField(help_text="Store/product forecasts summed into this node")
+    base_demand = models.FloatField(null=True, blank=True, help_text="Independent estimate from recent demand")
+    forecast_demand = models.FloatField(help_text="Sum of the unreconciled forecasts")
+    demand = models.FloatField(help_text="Reconciled demand; coherent across all levels")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['build', 'store_level', 'product_level']),
+        ]
+
+    def __str__(self):
+        return f"{self.store_level} {self.store_key} x {self.product_level} {self.product_key}: {self.demand:.1f}"
+
+
+class ForecastBacktestDay(models.Model):
+    """Overall accuracy of one day's forecasts; the backtest resumes after the latest day"""
+    forecast_date = models.DateField(unique=True)
+    forecasts = models.IntegerField(default=0)
+    forecast_units = models.IntegerField(default=0)
+    actual_units = models.IntegerField(default=0, help_text="Realized demand of the forecast store/products")
+    wape = models.FloatField(null=True, blank=True)
+    mape = models.FloatField(null=True, blank=True)
+    bias = models.FloatField(null=True, blank=True, help_text="Over (+) or under (-) forecast, relative to demand")
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Backtest {self.forecast_date}: {self.forecasts} forecasts, WAPE {self.wape}"
+
+
+# Rebalance statuses that still represent outstanding work
+OPEN_REBALANCE_STATUSES = ['pending', 'approved', 'in_progress']
+
+# status: statuses it may move to
+REBALANCE_TRANSITIONS = {
+    'pending': ['approved', 'rejected'],
+    'approved': ['in_progress', 'rejected'],
+    'in_progress': ['completed'],
+    'rejected': [],
+    'completed': [],
+}
+
+ROUTE_TRANSITIONS = {
+    'planned': ['active', 'delayed', 'cancelled'],
+    'active': ['delayed', 'completed', 'cancelled'],
+    'delayed': ['active', 'completed', 'cancelled'],
+    'completed': [],
+    'cancelled': [],
+}
+
+
 class StockRebalanceAction(models.Model):
     """Actions from Rebalancer Agent"""
     action_id = models.UUIDField(default=uuid.uuid4, unique=True)
@@ -87,6 +197,16 @@ class StockRebalanceAction(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     
+    class Meta:
+        constraints = [
+            # At most one open rebalance per product at a target store
+            models.UniqueConstraint(
+                fields=['target_store', 'product'],
+                condition=models.Q(status__in=OPEN_REBALANCE_STATUSES),
+                name='unique_open_rebalance_per_target_product',
+            ),
+        ]
+    
     def __str__(self):
         return f"Rebalance: {self.quantity} {self.product.name} from {self.source_store.name} to {self.target_store.name}"
 
@@ -138,14 +258,18 @@ class ExternalDisruption(models.Model):
         ('high', 'High'),
         ('critical', 'Critical')
     ])
-    affected_areas = models.JSONField(default=list, help_text="List of affected locations/routes")
+    affected_areas = models.JSONField(default=list, help_text="List of affected locations/routes")  # GIN-indexed on PostgreSQL (migration 0013)
     start_time = models.DateTimeField()
     end_time = models.DateTimeField(null=True, blank=True)
     impact_radius_km = models.FloatField(default=5.0)
+    latitude = models.FloatField(null=True, blank=True, help_text="Centre of the impact radius")
+    longitude = models.FloatField(null=True, blank=True)
     affected_routes = models.ManyToManyField(RouteOptimization, blank=True)
     data_source = models.CharField(max_length=100, help_text="API, news, manual, etc.")
     created_by_agent = models.CharField(max_length=100, default="DelayMonitorAgent")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # PostgreSQL also has a GiST-indexed active_period tstzrange column (migration 0015)
     
     def __str__(self):
         return f"{self.event_type.title()}: {self.title} ({self.severity})"
@@ -164,7 +288,7 @@ class VisionInspection(models.Model):
         ('security', 'Security Check')
     ])
     detected_objects = models.JSONField(default=list, help_text="YOLO detection results")
-    anomalies_found = models.JSONField(default=list, help_text="Issues detected")
+    anomalies_found = models.JSONField(default=list, help_text="Issues detected")  # GIN-indexed on PostgreSQL (migration 0013)
     confidence_scores = models.JSONField(default=dict, help_text="Detection confidence levels")
     action_required = models.BooleanField(default=False)
     priority = models.CharField(max_length=20, choices=[
@@ -183,6 +307,7 @@ class VisionInspection(models.Model):
 
 class AgentExplanation(models.Model):
     """Natural language explanations from Explainer Agent (GPT-4)"""
+    # Partitioned by created_at month on PostgreSQL (migration 0019, core.partitioning)
     explanation_id = models.UUIDField(default=uuid.uuid4, unique=True)
     query = models.TextField(help_text="Original user question")
     context_data = models.JSONField(default=dict, help_text="Relevant data for explanation")
@@ -210,6 +335,7 @@ class AgentExplanation(models.Model):
 
 class CortexCoordination(models.Model):
     """Central coordination from Cortex Manager"""
+    # Partitioned by created_at month on PostgreSQL (migration 0019, core.partitioning)
     coordination_id = models.UUIDField(default=uuid.uuid4, unique=True)
     event_type = models.CharField(max_length=50, choices=[
         ('rebalance_triggered', 'Rebalance Triggered'),
@@ -219,7 +345,7 @@ class CortexCoordination(models.Model):
         ('conflict_resolved', 'Conflict Resolved'),
         ('system_health_check', 'System Health Check')
     ])
-    involved_agents = models.JSONField(default=list, help_text="List of agents involved")
+    involved_agents = models.JSONField(default=list, help_text="List of agents involved")  # GIN-indexed on PostgreSQL (migration 0013)
     coordination_data = models.JSONField(default=dict, help_text="Coordination context")
     priority = models.CharField(max_length=20, choices=[
         ('low', 'Low'),
@@ -244,6 +370,7 @@ class CortexCoordination(models.Model):
 
 class AgentMetrics(models.Model):
     """Performance metrics for all agents"""
+    # Partitioned by timestamp month on PostgreSQL (migration 0019, core.partitioning)
     metric_id = models.UUIDField(default=uuid.uuid4, unique=True)
     agent_name = models.CharField(max_length=100)
     metric_type = models.CharField(max_length=50, choices=[
@@ -266,3 +393,94 @@ class AgentMetrics(models.Model):
     
     def __str__(self):
         return f"{self.agent_name}: {self.metric_type} = {self.metric_value} {self.unit}"
+
+
+class TaskSpan(models.Model):
+    """Measured run of one agent task, linked into a workflow trace"""
+    span_id = models.UUIDField(default=uuid.uuid4, unique=True)
+    trace_id = models.UUIDField(db_index=True, help_text="Shared by every task of one workflow")
+    parent_span_id = models.UUIDField(null=True, blank=True)
+    # No FK constraint: CortexCoordination is partitioned on PostgreSQL (migration 0019) and
+    # archived month by month, so spans may outlive their coordination
+    coordination = models.ForeignKey(CortexCoordination, on_delete=models.SET_NULL, null=True, blank=True,
+                                     db_constraint=False, related_name='spans')
+    task_name = models.CharField(max_length=255)
+    agent_name = models.CharField(max_length=100)
+    celery_task_id = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=20, choices=[
+        ('success', 'Success'),
+        ('error', 'Error'),
+        ('deduplicated', 'Deduplicated'),
+        ('duplicate', 'Duplicate (already running)')
+    ])
+    error = models.TextField(blank=True)
+    enqueued_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField()
+    wall_time_ms = models.FloatField()
+    db_time_ms = models.FloatField()
+    query_count = models.IntegerField()
+    queue_wait_ms = models.FloatField(null=True, blank=True, help_text="Enqueue to start; empty for direct calls")
+
+    class Meta:
+        ordering = ['started_at']
+        indexes = [
+            models.Index(fields=['agent_name', 'started_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.task_name} [{self.status}] {self.wall_time_ms:.0f} ms"
+
+
+class TaskExecution(models.Model):
+    """Idempotency record and run lease for agent tasks and retried API calls"""
+    idempotency_key = models.CharField(max_length=128, unique=True)
+    task_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=[
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed')
+    ], default='running')
+    result = models.JSONField(null=True, blank=True)
+    lease_expires_at = models.DateTimeField(help_text="Another run may take over after this")
+    started_at = models.DateTimeField(default=timezone.now)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.task_name} [{self.idempotency_key[:12]}] {self.status}"
+
+
+class EndpointProfile(models.Model):
+    """Per-endpoint, per-day aggregate of profiled API requests"""
+    method = models.CharField(max_length=10)
+    route = models.CharField(max_length=255, help_text="URL pattern, not the concrete path")
+    date = models.DateField()
+    request_count = models.IntegerField(default=0)
+    total_time_ms = models.FloatField(default=0)
+    max_time_ms = models.FloatField(default=0)
+    db_time_ms = models.FloatField(default=0)
+    query_count = models.IntegerField(default=0)
+    duplicate_query_count = models.IntegerField(default=0)
+    serialize_time_ms = models.FloatField(default=0, help_text="serializer.data, excluding its queries")
+    render_time_ms = models.FloatField(default=0)
+    last_profile = models.JSONField(default=dict, blank=True, help_text="Most recent sample incl. repeated queries/stacks")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['method', 'route', 'date']
+    
+    def __str__(self):
+        return f"{self.method} {self.route} ({self.date}): {self.request_count} requests"
+
+
+class ActiveAgentModel(models.Model):
+    """Model version an ML-backed agent should use; workers switch to it without a restart"""
+    kind = models.CharField(max_length=20, unique=True, choices=[
+        ('forecaster', 'Demand forecaster (InventoryAgent)'),
+        ('detector', 'Object detector (VisionInspectorAgent)'),
+        ('llm', 'Language model (ExplainerAgent)')
+    ])
+    version = models.CharField(max_length=100, help_text="model_version / processed_by_model / language_model value")
+    activated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.kind}: {self.version}"
@@ -1,26 +1,37 @@
+from django.utils import timezone
 from rest_framework import serializers
 from .agent_models import (
-    Store, Product, DemandForecast, StockRebalanceAction, 
+    Store, Product, DemandForecast, ForecastAggregate, StockRebalanceAction, 
     RouteOptimization, ExternalDisruption, VisionInspection,
-    AgentExplanation, CortexCoordination, AgentMetrics
+    AgentExplanation, CortexCoordination, AgentMetrics, TaskSpan, EndpointProfile,
+    REBALANCE_TRANSITIONS, ROUTE_TRANSITIONS
 )
+from .profiling import TimedSerializerMixin
+from .sparse_fields import SparseFieldsMixin
 
 
-class StoreSerializer(serializers.ModelSerializer):
+def check_transition(instance, current, target, transitions):
+    """Reject a status change the state machine doesn't allow (creation may start anywhere)"""
+    if instance is not None and target != current and target not in transitions.get(current, []):
+        raise serializers.ValidationError(f"Can't move from {current} to {target}")
+    return target
+
+
+class StoreSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for Store model"""
     class Meta:
         model = Store
         fields = '__all__'
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for Product model"""
     class Meta:
         model = Product
         fields = '__all__'
 
 
-class DemandForecastSerializer(serializers.ModelSerializer):
+class DemandForecastSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for demand forecasts from Inventory Agent"""
     store_name = serializers.CharField(source='store.name', read_only=True)
     product_name = serializers.CharField(source='product.name', read_only=True)
@@ -30,7 +41,7 @@ class DemandForecastSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class StockRebalanceActionSerializer(serializers.ModelSerializer):
+class StockRebalanceActionSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for rebalance actions"""
     source_store_name = serializers.CharField(source='source_store.name', read_only=True)
     target_store_name = serializers.CharField(source='target_store.name', read_only=True)
@@ -40,8 +51,16 @@ class StockRebalanceActionSerializer(serializers.ModelSerializer):
         model = StockRebalanceAction
         fields = '__all__'
 
+    def validate_status(self, value):
+        return check_transition(self.instance, getattr(self.instance, 'status', None), value, REBALANCE_TRANSITIONS)
+
+    def validate(self, data):
+        if data.get('status') == 'completed' and not data.get('completed_at'):
+            data['completed_at'] = getattr(self.instance, 'completed_at', None) or timezone.now()
+        return data
 
-class RouteOptimizationSerializer(serializers.ModelSerializer):
+
+class RouteOptimizationSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for route optimization"""
     start_location_name = serializers.CharField(source='start_location.name', read_only=True)
     end_location_name = serializers.CharField(source='end_location.name', read_only=True)
@@ -50,9 +69,13 @@ class RouteOptimizationSerializer(serializers.ModelSerializer):
     class Meta:
         model = RouteOptimization
         fields = '__all__'
+        expandable_fields = ['rebalance_details', 'alternative_routes']
+
+    def validate_route_status(self, value):
+        return check_transition(self.instance, getattr(self.instance, 'route_status', None), value, ROUTE_TRANSITIONS)
 
 
-class ExternalDisruptionSerializer(serializers.ModelSerializer):
+class ExternalDisruptionSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for external disruptions"""
     affected_routes_count = serializers.IntegerField(source='affected_routes.count', read_only=True)
     
@@ -61,34 +84,39 @@ class ExternalDisruptionSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class VisionInspectionSerializer(serializers.ModelSerializer):
+class VisionInspectionSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for vision inspections"""
     store_name = serializers.CharField(source='store.name', read_only=True)
     
     class Meta:
         model = VisionInspection
         fields = '__all__'
+        expandable_fields = ['detected_objects']
 
 
-class AgentExplanationSerializer(serializers.ModelSerializer):
+class AgentExplanationSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for agent explanations"""
     query_preview = serializers.SerializerMethodField()
     
     class Meta:
         model = AgentExplanation
         fields = '__all__'
+        expandable_fields = ['context_data']
+        method_field_sources = {'query_preview': ['query']}
     
     def get_query_preview(self, obj):
         return obj.query[:100] + "..." if len(obj.query) > 100 else obj.query
 
 
-class CortexCoordinationSerializer(serializers.ModelSerializer):
+class CortexCoordinationSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for cortex coordination"""
     duration_seconds = serializers.SerializerMethodField()
     
     class Meta:
         model = CortexCoordination
         fields = '__all__'
+        expandable_fields = ['execution_timeline']
+        method_field_sources = {'duration_seconds': ['completed_at', 'created_at']}
     
     def get_duration_seconds(self, obj):
         if obj.completed_at and obj.created_at:
@@ -96,15 +124,56 @@ class CortexCoordinationSerializer(serializers.ModelSerializer):
         return None
 
 
-class AgentMetricsSerializer(serializers.ModelSerializer):
+class AgentMetricsSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for agent metrics"""
     class Meta:
         model = AgentMetrics
         fields = '__all__'
 
 
+class TaskSpanSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    """Serializer for measured agent task runs"""
+    class Meta:
+        model = TaskSpan
+        fields = '__all__'
+
+
+class EndpointProfileSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    """Serializer for per-endpoint request profiles"""
+    avg_time_ms = serializers.FloatField(read_only=True)
+    avg_db_time_ms = serializers.SerializerMethodField()
+    avg_queries = serializers.SerializerMethodField()
+    avg_serialize_time_ms = serializers.SerializerMethodField()
+    avg_render_time_ms = serializers.SerializerMethodField()
+
+    class Meta:
+        model = EndpointProfile
+        fields = '__all__'
+        method_field_sources = {
+            'avg_db_time_ms': ['request_count', 'db_time_ms'],
+            'avg_queries': ['request_count', 'query_count'],
+            'avg_serialize_time_ms': ['request_count', 'serialize_time_ms'],
+            'avg_render_time_ms': ['request_count', 'render_time_ms'],
+        }
+
+    def _average(self, obj, total):
+        return round(total / obj.request_count, 2) if obj.request_count else None
+
+    def get_avg_db_time_ms(self, obj):
+        return self._average(obj, obj.db_time_ms)
+
+    def get_avg_queries(self, obj):
+        return self._average(obj, obj.query_count)
+
+    def get_avg_serialize_time_ms(self, obj):
+        return self._average(obj, obj.serialize_time_ms)
+
+    def get_avg_render_time_ms(self, obj):
+        return self._average(obj, obj.render_time_ms)
+
+
 # Dashboard summary serializers
-class DashboardSummarySerializer(serializers.Serializer):
+class DashboardSummarySerializer(TimedSerializerMixin, serializers.Serializer):
     """Summary data for the main dashboard"""
     total_stores = serializers.IntegerField()
     total_products = serializers.IntegerField()
@@ -122,7 +191,84 @@ class DashboardSummarySerializer(serializers.Serializer):
     critical_alerts = serializers.ListField()
 
 
-class AgentHealthSerializer(serializers.Serializer):
+class SearchHitSerializer(TimedSerializerMixin, serializers.Serializer):
+    """One full-text search match; the searched text fields of its type are included"""
+    type = serializers.ChoiceField(choices=['explanations', 'disruptions', 'rebalances', 'transfers'])
+    id = serializers.IntegerField()
+    rank = serializers.FloatField()
+    timestamp = serializers.DateTimeField()
+
+
+class SearchResultsSerializer(TimedSerializerMixin, serializers.Serializer):
+    query = serializers.CharField()
+    took_ms = serializers.FloatField()
+    results = SearchHitSerializer(many=True)
+
+
+class ForecastHorizonSerializer(TimedSerializerMixin, serializers.Serializer):
+    """Daily forecast demand of one store and product from its latest forecaster run"""
+    store = serializers.IntegerField()
+    product = serializers.IntegerField()
+    model_version = serializers.CharField()
+    run_date = serializers.DateField()
+    confidence_score = serializers.FloatField()
+    values = serializers.ListField(child=serializers.FloatField())
+
+
+class ForecastAggregateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = ForecastAggregate
+        fields = ['store_level', 'store_key', 'product_level', 'product_key', 'region', 'store_type',
+                  'category', 'series', 'base_demand', 'forecast_demand', 'demand']
+
+
+class ForecastCubeSerializer(TimedSerializerMixin, serializers.Serializer):
+    """One level of a day's aggregated, reconciled forecast cube"""
+    forecast_date = serializers.DateField()
+    method = serializers.CharField()
+    forecasts = serializers.IntegerField()
+    built_at = serializers.DateTimeField()
+    results = ForecastAggregateSerializer(many=True)
+
+
+class ForecastAccuracySerializer(TimedSerializerMixin, serializers.Serializer):
+    """Backtested accuracy of one store, product, category or model version"""
+    key = serializers.CharField()
+    forecasts = serializers.IntegerField()
+    forecast_units = serializers.FloatField()
+    actual_units = serializers.FloatField()
+    wape = serializers.FloatField(allow_null=True)
+    mape = serializers.FloatField(allow_null=True)
+    bias = serializers.FloatField(allow_null=True)
+    accuracy = serializers.FloatField()
+
+
+class ForecastAccuracyReportSerializer(TimedSerializerMixin, serializers.Serializer):
+    dimension = serializers.ChoiceField(choices=['store', 'product', 'category', 'model_version'])
+    start = serializers.DateField()
+    end = serializers.DateField()
+    results = ForecastAccuracySerializer(many=True)
+
+
+class MetricHistorySerializer(TimedSerializerMixin, serializers.Serializer):
+    """One agent's metric over a day or month, from live and archived rows"""
+    period = serializers.DateField()
+    agent_name = serializers.CharField()
+    metric_type = serializers.CharField()
+    count = serializers.IntegerField()
+    avg = serializers.FloatField()
+    min = serializers.FloatField()
+    max = serializers.FloatField()
+
+
+class MetricHistoryReportSerializer(TimedSerializerMixin, serializers.Serializer):
+    interval = serializers.ChoiceField(choices=['day', 'month'])
+    start = serializers.DateField()
+    end = serializers.DateField()
+    results = MetricHistorySerializer(many=True)
+
+
+class AgentHealthSerializer(TimedSerializerMixin, serializers.Serializer):
     """Health status of all agents"""
     agent_name = serializers.CharField()
     status = serializers.CharField()  # healthy, warning, error, offline
@@ -2,150 +2,268 @@
 Background tasks for AI agents
 """
 from celery import shared_task
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from datetime import timedelta
-import json
 import random
 from .agent_models import (
     Store, Product, DemandForecast, StockRebalanceAction,
     RouteOptimization, ExternalDisruption, VisionInspection,
-    AgentExplanation, CortexCoordination, AgentMetrics
+    AgentExplanation, CortexCoordination, AgentMetrics, REBALANCE_TRANSITIONS
 )
+from .backtesting import model_confidence, run_backtest
+from .db_routers import replica_reads
+from .disruption_index import active_disruption_ids
+from .forecast_hierarchy import current_cube
+from .forecast_store import QUANTILES, save_curve
+from .models import Inventory, LowStockItem, StockLevelEvent, StockLot
+from .idempotency import idempotent_task, purge_executions
+from .model_registry import registry
+from .partitioning import ensure_partitions
+from .stock_ledger import take_snapshots
+from .stock_lots import FEFO_ORDER
+from .tracing import link_coordination, traced_task
+from .transitions import bulk_transition
 
 
 @shared_task
+@traced_task('InventoryAgent')
+@idempotent_task(reuse_seconds=24 * 3600, key_func=lambda *args, **kwargs: timezone.now().date().isoformat())
 def inventory_agent_forecast_task(store_id, product_id):
     """
-    Simulate LNN-based demand forecasting
-    In real implementation, this would run the actual LNN model
+    LNN-based demand forecasting with the active forecaster model
     """
-    try:
-        store = Store.objects.get(id=store_id)
-        product = Product.objects.get(id=product_id)
-        
-        # Mock LNN prediction with some realistic variation
-        base_demand = random.randint(10, 100)
-        confidence = random.uniform(0.75, 0.95)
-        
-        # Simulate external factors affecting demand
-        external_factors = {}
-        if random.random() > 0.7:  # 30% chance of external factors
-            external_factors = {
-                'weather': random.choice(['sunny', 'rainy', 'cloudy']),
-                'event': random.choice(['cricket_match', 'festival', 'normal']),
-                'traffic': random.choice(['light', 'medium', 'heavy'])
-            }
-            if external_factors['event'] == 'cricket_match':
-                base_demand = int(base_demand * 1.5)  # Higher demand during matches
-        
+    store = Store.objects.get(id=store_id)
+    product = Product.objects.get(id=product_id)
+    
+    forecaster = registry.get('forecaster')
+    mean, quantiles, confidence, external_factors = forecaster.model.predict_horizon(
+        store, product, settings.FORECAST_HORIZON_DAYS, QUANTILES
+    )
+    base_demand = round(mean[0])
+    # Prefer the model version's backtested accuracy to the model's own estimate
+    backtested = model_confidence(forecaster.version)
+    if backtested is not None:
+        confidence = backtested
+
+    # Today's demand stays a DemandForecast row; the whole horizon is one compact curve
+    with transaction.atomic():
         forecast = DemandForecast.objects.create(
             store=store,
             product=product,
             forecast_date=timezone.now().date(),
             predicted_demand=base_demand,
             confidence_score=confidence,
+            forecast_horizon_days=len(mean),
             external_factors=external_factors,
+            model_version=forecaster.version,
             created_by_agent='InventoryAgent'
         )
-        
-        # Log agent metrics
-        AgentMetrics.objects.create(
-            agent_name='InventoryAgent',
-            metric_type='response_time',
-            metric_value=random.uniform(200, 500),
-            unit='ms'
-        )
-        
-        return {
-            'status': 'success',
-            'forecast_id': str(forecast.forecast_id),
-            'predicted_demand': base_demand,
-            'confidence': confidence
-        }
-        
-    except Exception as e:
-        return {'status': 'error', 'message': str(e)}
+        save_curve(store, product, forecast.forecast_date, forecaster.version, mean, quantiles, confidence)
+    
+    return {
+        'status': 'success',
+        'forecast_id': str(forecast.forecast_id),
+        'predicted_demand': base_demand,
+        'confidence': confidence
+    }
+
+
+def _source_store_id(product_id, target_store_id, needed_by):
+    """
+    Ship first-expired-first-out: the warehouse whose stock of the product
+    expires soonest while still outlasting `needed_by`
+    """
+    source_types = ['warehouse', 'fulfillment_center']
+    source_store_id = StockLot.objects.filter(
+        Q(expiry_date__isnull=True) | Q(expiry_date__gte=needed_by),
+        inventory__catalog_product_id=product_id,
+        store__store_type__in=source_types,
+        quantity__gt=0
+    ).exclude(store_id=target_store_id).order_by(*FEFO_ORDER).values_list('store_id', flat=True).first()
+    if source_store_id is None:
+        # No lot-tracked stock anywhere: fall back to any warehouse
+        source_store_id = Store.objects.filter(
+            store_type__in=source_types
+        ).exclude(id=target_store_id).values_list('id', flat=True).first()
+    return source_store_id
 
 
-@shared_task 
+@shared_task
+@traced_task('RebalancerAgent')
+@idempotent_task(lease_seconds=1800, reuse_seconds=60)
 def rebalancer_agent_task():
     """
     Analyze inventory and create rebalance actions
     """
-    try:
-        # Find stores with potential rebalancing needs
-        # This is simplified - real implementation would use complex algorithms
-        
+    # Find stores with potential rebalancing needs
+    # This is simplified - real implementation would use complex algorithms
+    
+    actions_created = 0
+    
+    # Check recent forecasts for low stock predictions, joined with the
+    # store's current stock of the product
+    on_hand = Inventory.objects.filter(
+        store=OuterRef('store'), catalog_product=OuterRef('product')
+    ).values('quantity')[:1]
+    recent_forecasts = DemandForecast.objects.filter(
+        created_at__gte=timezone.now() - timedelta(hours=24),
+        predicted_demand__gte=50  # High demand threshold
+    ).annotate(on_hand=Coalesce(Subquery(on_hand), 0))
+    
+    for forecast in recent_forecasts:
+        shortfall = forecast.predicted_demand - forecast.on_hand
+        if shortfall <= 0:
+            continue
+        
+        source_store_id = _source_store_id(forecast.product_id, forecast.store_id, forecast.forecast_date)
+        if source_store_id is None:
+            continue
+        
+        # The unique open-rebalance constraint rejects a second open action
+        # for the same target/product, even from a concurrent run
+        try:
+            with transaction.atomic():
+                StockRebalanceAction.objects.create(
+                    source_store_id=source_store_id,
+                    target_store_id=forecast.store_id,
+                    product_id=forecast.product_id,
+                    quantity=max(20, shortfall),
+                    urgency='medium',
+                    reason=(
+                        f'High demand forecast: {forecast.predicted_demand} units predicted, '
+                        f'{forecast.on_hand} in stock'
+                    ),
+                    created_by_agent='RebalancerAgent'
+                )
+        except IntegrityError:
+            continue
+        actions_created += 1
+    
+    # Log metrics
+    AgentMetrics.objects.create(
+        agent_name='RebalancerAgent',
+        metric_type='throughput',
+        metric_value=actions_created,
+        unit='actions'
+    )
+    
+    return {
+        'status': 'success',
+        'actions_created': actions_created
+    }
+
+
+@shared_task
+@traced_task('LowStockMonitor')
+def low_stock_events_task(batch_size=500):
+    """
+    Act on low-stock crossings published by core.low_stock
+
+    Only rows that crossed their product minimum since the last run are
+    touched: each still-low row gets a rebalance action topping it up to
+    the product maximum. Events are claimed with SKIP LOCKED, so several
+    workers can drain the queue at once.
+    """
+    with transaction.atomic():
+        events = list(StockLevelEvent.objects.select_for_update(skip_locked=True).filter(
+            processed_at__isnull=True
+        ).order_by('created_at')[:batch_size])
+        if not events:
+            return {'status': 'success', 'events_processed': 0, 'actions_created': 0}
+
+        # A row may have recovered since it crossed; only act on what's still low
+        low_ids = {event.inventory_id for event in events if event.kind == 'below_minimum'}
+        still_low = LowStockItem.objects.filter(
+            inventory_id__in=low_ids, store__isnull=False, product__isnull=False
+        ).select_related('store', 'product')
+
         actions_created = 0
-        
-        # Check recent forecasts for low stock predictions
-        recent_forecasts = DemandForecast.objects.filter(
-            created_at__gte=timezone.now() - timedelta(hours=24),
-            predicted_demand__gte=50  # High demand threshold
-        )
-        
-        for forecast in recent_forecasts:
-            # Check if rebalance already exists
-            existing = StockRebalanceAction.objects.filter(
-                target_store=forecast.store,
-                product=forecast.product,
-                status__in=['pending', 'approved', 'in_progress']
-            ).exists()
-            
-            if not existing:
-                # Find source store (simplified logic)
-                source_stores = Store.objects.filter(
-                    store_type__in=['warehouse', 'fulfillment_center']
-                ).exclude(id=forecast.store.id)
-                
-                if source_stores.exists():
-                    source_store = source_stores.first()
-                    
-                    rebalance = StockRebalanceAction.objects.create(
-                        source_store=source_store,
-                        target_store=forecast.store,
-                        product=forecast.product,
-                        quantity=max(20, forecast.predicted_demand),
-                        urgency='medium',
-                        reason=f'High demand forecast: {forecast.predicted_demand} units predicted',
-                        created_by_agent='RebalancerAgent'
+        today = timezone.now().date()
+        for item in still_low:
+            source_store_id = _source_store_id(item.product_id, item.store_id, today)
+            if source_store_id is None:
+                continue
+            try:
+                with transaction.atomic():
+                    StockRebalanceAction.objects.create(
+                        source_store_id=source_store_id,
+                        target_store_id=item.store_id,
+                        product_id=item.product_id,
+                        quantity=max(item.maximum_stock_level - item.quantity, item.minimum_stock_level),
+                        urgency='high' if item.quantity <= 0 else 'medium',
+                        reason=(
+                            f'Stock below minimum at {item.store.name}: {item.quantity} on hand, '
+                            f'minimum {item.minimum_stock_level}'
+                        ),
+                        created_by_agent='LowStockMonitor'
                     )
-                    actions_created += 1
-        
-        # Log metrics
-        AgentMetrics.objects.create(
-            agent_name='RebalancerAgent',
-            metric_type='throughput',
-            metric_value=actions_created,
-            unit='actions'
-        )
-        
-        return {
-            'status': 'success',
-            'actions_created': actions_created
-        }
-        
-    except Exception as e:
-        return {'status': 'error', 'message': str(e)}
+            except IntegrityError:
+                # An open rebalance already covers this row
+                continue
+            actions_created += 1
+
+        StockLevelEvent.objects.filter(pk__in=[event.pk for event in events]).update(processed_at=timezone.now())
+
+    AgentMetrics.objects.create(
+        agent_name='LowStockMonitor',
+        metric_type='throughput',
+        metric_value=actions_created,
+        unit='actions'
+    )
+    return {
+        'status': 'success',
+        'events_processed': len(events),
+        'actions_created': actions_created
+    }
+
+
+# Journey time multiplier for a route affected by a disruption of this severity
+DISRUPTION_DELAY_FACTORS = {'low': 1.1, 'medium': 1.25, 'high': 1.5, 'critical': 2.0}
 
 
 @shared_task
+@traced_task('RoutePlannerAgent')
+@idempotent_task(reuse_seconds=3600)
 def route_planner_agent_task(rebalance_action_id):
     """
     Create optimized routes for rebalance actions
     """
-    try:
-        rebalance = StockRebalanceAction.objects.get(id=rebalance_action_id)
-        
-        # Mock route optimization (real implementation would use routing algorithms)
-        distance = random.uniform(5.0, 50.0)
-        duration = distance / 30.0  # Assume 30 km/h average speed
-        cost = distance * 15.0  # Cost per km
-        
-        # Add some traffic variability
-        traffic_factor = random.uniform(1.0, 1.5)
-        duration *= traffic_factor
-        
+    rebalance = StockRebalanceAction.objects.get(id=rebalance_action_id)
+    
+    # Mock route optimization (real implementation would use routing algorithms)
+    distance = random.uniform(5.0, 50.0)
+    duration = distance / 30.0  # Assume 30 km/h average speed
+    cost = distance * 15.0  # Cost per km
+    
+    # Add some traffic variability
+    traffic_factor = random.uniform(1.0, 1.5)
+    duration *= traffic_factor
+    traffic_conditions = random.choice(['light', 'medium', 'heavy'])
+
+    # Disruptions at either end while the delivery is under way slow it down
+    now = timezone.now()
+    window_end = now + timedelta(hours=duration)
+    disruption_ids = set()
+    for store in (rebalance.source_store, rebalance.target_store):
+        disruption_ids.update(active_disruption_ids(now, window_end, store))
+    disruptions = list(ExternalDisruption.objects.filter(pk__in=disruption_ids))
+    if disruptions:
+        duration *= max(DISRUPTION_DELAY_FACTORS[disruption.severity] for disruption in disruptions)
+        traffic_conditions = 'heavy'
+
+    with transaction.atomic():
+        # Approve a pending action with a conditional update; one already approved still gets its route,
+        # but one rejected or completed meanwhile doesn't
+        _, rejected, _ = bulk_transition(
+            StockRebalanceAction.objects.filter(pk=rebalance.pk), 'status', 'approved', REBALANCE_TRANSITIONS
+        )
+        if rejected and rejected[0]['status'] != 'approved':
+            return {'status': 'skipped', 'reason': f"Rebalance action is {rejected[0]['status']}"}
+
         route = RouteOptimization.objects.create(
             rebalance_action=rebalance,
             start_location=rebalance.source_store,
@@ -153,298 +271,201 @@ def route_planner_agent_task(rebalance_action_id):
             total_distance_km=round(distance, 1),
             estimated_duration_hours=round(duration, 1),
             estimated_cost=round(cost, 2),
-            traffic_conditions=random.choice(['light', 'medium', 'heavy']),
+            traffic_conditions=traffic_conditions,
             created_by_agent='RoutePlannerAgent'
         )
-        
-        # Update rebalance action status
-        rebalance.status = 'approved'
-        rebalance.save()
-        
-        AgentMetrics.objects.create(
-            agent_name='RoutePlannerAgent',
-            metric_type='response_time',
-            metric_value=random.uniform(800, 1500),
-            unit='ms'
-        )
-        
-        return {
-            'status': 'success',
-            'route_id': str(route.route_id),
-            'distance_km': route.total_distance_km,
-            'duration_hours': route.estimated_duration_hours
-        }
-        
-    except Exception as e:
-        return {'status': 'error', 'message': str(e)}
+        for disruption in disruptions:
+            disruption.affected_routes.add(route)
+    
+    return {
+        'status': 'success',
+        'route_id': str(route.route_id),
+        'distance_km': route.total_distance_km,
+        'duration_hours': route.estimated_duration_hours,
+        'disruptions': len(disruptions)
+    }
 
 
 @shared_task
+@traced_task('DelayMonitorAgent')
+@idempotent_task(reuse_seconds=60)
 def delay_monitor_agent_task():
     """
     Monitor for external disruptions
     """
-    try:
-        disruptions_found = 0
-        
-        # Simulate finding disruptions (real implementation would use APIs)
-        if random.random() > 0.8:  # 20% chance of finding a disruption
-            event_types = ['weather', 'traffic', 'strike', 'festival', 'sports_event']
-            event_type = random.choice(event_types)
-            
-            disruption_data = {
-                'weather': {
-                    'title': 'Heavy rainfall expected',
-                    'description': 'IMD predicts heavy rainfall in Bangalore',
-                    'severity': 'medium'
-                },
-                'traffic': {
-                    'title': 'Accident on Outer Ring Road',
-                    'description': 'Multi-vehicle accident causing delays',
-                    'severity': 'high'
-                },
-                'strike': {
-                    'title': 'Transport workers strike',
-                    'description': 'City bus drivers on strike',
-                    'severity': 'high'
-                },
-                'festival': {
-                    'title': 'Ganesh Chaturthi celebrations',
-                    'description': 'Festival processions affecting traffic',
-                    'severity': 'medium'
-                },
-                'sports_event': {
-                    'title': 'India vs Pakistan cricket match',
-                    'description': 'High viewership expected to affect demand',
-                    'severity': 'low'
-                }
+    disruptions_found = 0
+    
+    # Simulate finding disruptions (real implementation would use APIs)
+    if random.random() > 0.8:  # 20% chance of finding a disruption
+        event_types = ['weather', 'traffic', 'strike', 'festival', 'sports_event']
+        event_type = random.choice(event_types)
+        
+        disruption_data = {
+            'weather': {
+                'title': 'Heavy rainfall expected',
+                'description': 'IMD predicts heavy rainfall in Bangalore',
+                'severity': 'medium'
+            },
+            'traffic': {
+                'title': 'Accident on Outer Ring Road',
+                'description': 'Multi-vehicle accident causing delays',
+                'severity': 'high'
+            },
+            'strike': {
+                'title': 'Transport workers strike',
+                'description': 'City bus drivers on strike',
+                'severity': 'high'
+            },
+            'festival': {
+                'title': 'Ganesh Chaturthi celebrations',
+                'description': 'Festival processions affecting traffic',
+                'severity': 'medium'
+            },
+            'sports_event': {
+                'title': 'India vs Pakistan cricket match',
+                'description': 'High viewership expected to affect demand',
+                'severity': 'low'
             }
-            
-            event_info = disruption_data[event_type]
-            
-            disruption = ExternalDisruption.objects.create(
-                event_type=event_type,
-                title=event_info['title'],
-                description=event_info['description'],
-                severity=event_info['severity'],
-                affected_areas=['Bangalore', 'Whitefield', 'Electronic City'],
-                start_time=timezone.now(),
-                end_time=timezone.now() + timedelta(hours=random.randint(2, 12)),
-                data_source='MockAPI',
-                created_by_agent='DelayMonitorAgent'
-            )
-            
-            disruptions_found = 1
+        }
         
-        AgentMetrics.objects.create(
-            agent_name='DelayMonitorAgent',
-            metric_type='throughput',
-            metric_value=disruptions_found,
-            unit='disruptions'
-        )
+        event_info = disruption_data[event_type]
         
-        return {
-            'status': 'success',
-            'disruptions_found': disruptions_found
-        }
+        disruption = ExternalDisruption.objects.create(
+            event_type=event_type,
+            title=event_info['title'],
+            description=event_info['description'],
+            severity=event_info['severity'],
+            affected_areas=['Bangalore', 'Whitefield', 'Electronic City'],
+            start_time=timezone.now(),
+            end_time=timezone.now() + timedelta(hours=random.randint(2, 12)),
+            data_source='MockAPI',
+            created_by_agent='DelayMonitorAgent'
+        )
         
-    except Exception as e:
-        return {'status': 'error', 'message': str(e)}
+        disruptions_found = 1
+    
+    AgentMetrics.objects.create(
+        agent_name='DelayMonitorAgent',
+        metric_type='throughput',
+        metric_value=disruptions_found,
+        unit='disruptions'
+    )
+    
+    return {
+        'status': 'success',
+        'disruptions_found': disruptions_found
+    }
 
 
 @shared_task
+@traced_task('VisionInspectorAgent')
+@idempotent_task(reuse_seconds=3600)
 def vision_inspector_agent_task(store_id, image_path):
     """
-    Simulate YOLO-based vision inspection
+    YOLO-based vision inspection with the active detector model
     """
-    try:
-        store = Store.objects.get(id=store_id)
-        
-        # Mock YOLO detection results
-        detected_objects = []
-        anomalies = []
-        action_required = False
-        
-        # Simulate detection of various objects
-        object_types = ['product_box', 'empty_shelf', 'price_tag', 'customer', 'staff']
-        for obj_type in object_types:
-            if random.random() > 0.6:  # 40% chance of detecting each object type
-                confidence = random.uniform(0.7, 0.98)
-                bbox = [
-                    random.randint(0, 500),
-                    random.randint(0, 400),
-                    random.randint(100, 200),
-                    random.randint(100, 150)
-                ]
-                detected_objects.append({
-                    'object': obj_type,
-                    'confidence': round(confidence, 2),
-                    'bbox': bbox
-                })
-        
-        # Check for anomalies
-        if random.random() > 0.7:  # 30% chance of anomalies
-            possible_anomalies = [
-                'empty_shelf_section',
-                'misplaced_products', 
-                'price_tag_missing',
-                'spoiled_products',
-                'cleanliness_issue'
-            ]
-            anomalies = random.sample(possible_anomalies, random.randint(1, 2))
-            action_required = True
-        
-        inspection = VisionInspection.objects.create(
-            store=store,
-            image_path=image_path,
-            inspection_type='shelf_stock',
-            detected_objects=detected_objects,
-            anomalies_found=anomalies,
-            action_required=action_required,
-            priority='high' if action_required else 'low',
-            created_by_agent='VisionInspectorAgent'
-        )
-        
-        AgentMetrics.objects.create(
-            agent_name='VisionInspectorAgent',
-            metric_type='response_time',
-            metric_value=random.uniform(1500, 3000),
-            unit='ms'
-        )
-        
-        return {
-            'status': 'success',
-            'inspection_id': str(inspection.inspection_id),
-            'objects_detected': len(detected_objects),
-            'anomalies_found': len(anomalies),
-            'action_required': action_required
-        }
-        
-    except Exception as e:
-        return {'status': 'error', 'message': str(e)}
+    store = Store.objects.get(id=store_id)
+    
+    detector = registry.get('detector')
+    detected_objects, anomalies = detector.model.detect(image_path)
+    action_required = bool(anomalies)
+
+    inspection = VisionInspection.objects.create(
+        store=store,
+        image_path=image_path,
+        inspection_type='shelf_stock',
+        detected_objects=detected_objects,
+        anomalies_found=anomalies,
+        action_required=action_required,
+        priority='high' if action_required else 'low',
+        processed_by_model=detector.version,
+        created_by_agent='VisionInspectorAgent'
+    )
+    
+    return {
+        'status': 'success',
+        'inspection_id': str(inspection.inspection_id),
+        'objects_detected': len(detected_objects),
+        'anomalies_found': len(anomalies),
+        'action_required': action_required
+    }
 
 
 @shared_task
+@traced_task('ExplainerAgent')
+@idempotent_task(reuse_seconds=300)
 def explainer_agent_task(query, context_data):
     """
-    Generate explanations using GPT-4 (mocked for demo)
+    Generate explanations with the active language model (mocked unless OPENAI_API_KEY is set)
     """
-    try:
-        # Mock GPT-4 response generation
-        # Real implementation would call OpenAI API
-        
-        explanations = {
-            'inventory': "The inventory levels show a concerning trend with several products approaching critical thresholds. Our AI forecasting suggests immediate action is needed.",
-            'rebalance': "The rebalancing action was triggered by predictive analytics showing an 85% probability of stockout in the next 48 hours.",
-            'route': "The route optimization considers real-time traffic data, fuel costs, and delivery priorities to minimize total delivery time.",
-            'disruption': "External disruptions are automatically detected through multiple data sources including weather APIs, traffic feeds, and news monitoring.",
-            'inspection': "Computer vision analysis identified potential issues that require human verification and corrective action."
-        }
-        
-        # Determine explanation type based on context
-        explanation_type = 'general'
-        if 'rebalance' in context_data:
-            explanation_type = 'rebalance'
-        elif 'route' in context_data:
-            explanation_type = 'route'
-        elif 'disruption' in context_data:
-            explanation_type = 'disruption'
-        elif 'inspection' in context_data:
-            explanation_type = 'inspection'
-        elif 'inventory' in context_data:
-            explanation_type = 'inventory'
-        
-        base_explanation = explanations.get(explanation_type, 
-            "I analyzed the available data and coordinated with other AI agents to provide this comprehensive response.")
-        
-        # Add context-specific details
-        if context_data:
-            context_summary = f" Based on the following data: {json.dumps(context_data, indent=2)}"
-            full_explanation = base_explanation + context_summary
-        else:
-            full_explanation = base_explanation
-        
-        explanation = AgentExplanation.objects.create(
-            query=query,
-            context_data=context_data,
-            explanation_text=full_explanation,
-            confidence_level='high',
-            data_sources=['InventoryAgent', 'RebalancerAgent', 'RoutePlannerAgent'],
-            tokens_used=random.randint(100, 500),
-            response_time_ms=random.randint(1500, 3500),
-            created_by_agent='ExplainerAgent'
-        )
-        
-        AgentMetrics.objects.create(
-            agent_name='ExplainerAgent',
-            metric_type='response_time',
-            metric_value=explanation.response_time_ms,
-            unit='ms'
-        )
-        
-        return {
-            'status': 'success',
-            'explanation_id': str(explanation.explanation_id),
-            'explanation_text': full_explanation,
-            'tokens_used': explanation.tokens_used
-        }
-        
-    except Exception as e:
-        return {'status': 'error', 'message': str(e)}
+    language_model = registry.get('llm')
+    full_explanation, tokens_used, response_time_ms = language_model.model.explain(query, context_data)
+
+    explanation = AgentExplanation.objects.create(
+        query=query,
+        context_data=context_data,
+        explanation_text=full_explanation,
+        confidence_level='high',
+        data_sources=['InventoryAgent', 'RebalancerAgent', 'RoutePlannerAgent'],
+        tokens_used=tokens_used,
+        response_time_ms=response_time_ms,
+        language_model=language_model.version,
+        created_by_agent='ExplainerAgent'
+    )
+    
+    return {
+        'status': 'success',
+        'explanation_id': str(explanation.explanation_id),
+        'explanation_text': full_explanation,
+        'tokens_used': explanation.tokens_used
+    }
 
 
 @shared_task
+@traced_task('CortexManager')
+@idempotent_task(reuse_seconds=60)
 def cortex_manager_task(event_type, involved_agents, coordination_data):
     """
     Coordinate multi-agent activities
     """
-    try:
-        coordination = CortexCoordination.objects.create(
-            event_type=event_type,
-            involved_agents=involved_agents,
-            coordination_data=coordination_data,
-            priority='medium',
-            status='in_progress',
-            execution_timeline=[],
-            created_by_agent='CortexManager'
-        )
-        
-        # Simulate coordination steps
-        timeline = []
-        for i, agent in enumerate(involved_agents):
-            timeline.append({
-                'step': i + 1,
-                'agent': agent,
-                'action': f'Coordinated with {agent}',
-                'timestamp': timezone.now().isoformat(),
-                'status': 'completed'
-            })
-        
-        coordination.execution_timeline = timeline
-        coordination.status = 'completed'
-        coordination.completed_at = timezone.now()
-        coordination.save()
-        
-        AgentMetrics.objects.create(
-            agent_name='CortexManager',
-            metric_type='response_time',
-            metric_value=random.uniform(100, 300),
-            unit='ms'
-        )
-        
-        return {
-            'status': 'success',
-            'coordination_id': str(coordination.coordination_id),
-            'agents_coordinated': len(involved_agents),
-            'execution_steps': len(timeline)
-        }
-        
-    except Exception as e:
-        return {'status': 'error', 'message': str(e)}
+    coordination = CortexCoordination.objects.create(
+        event_type=event_type,
+        involved_agents=involved_agents,
+        coordination_data=coordination_data,
+        priority=coordination_data.get('priority', 'medium'),
+        status='in_progress',
+        execution_timeline=[],
+        created_by_agent='CortexManager'
+    )
+    link_coordination(coordination)
+    
+    # Simulate coordination steps
+    timeline = []
+    for i, agent in enumerate(involved_agents):
+        timeline.append({
+            'step': i + 1,
+            'agent': agent,
+            'action': f'Coordinated with {agent}',
+            'timestamp': timezone.now().isoformat(),
+            'status': 'completed'
+        })
+    
+    coordination.execution_timeline = timeline
+    coordination.status = 'completed'
+    coordination.completed_at = timezone.now()
+    coordination.save()
+    
+    return {
+        'status': 'success',
+        'coordination_id': str(coordination.coordination_id),
+        'agents_coordinated': len(involved_agents),
+        'execution_steps': len(timeline)
+    }
 
 
 # Periodic tasks for continuous monitoring
 @shared_task
+@traced_task('SystemHealthCheck')
 def periodic_system_health_check():
     """
     Regular health check of all agent systems
@@ -452,37 +473,105 @@ def periodic_system_health_check():
     agents = [
         'InventoryAgent', 'RebalancerAgent', 'RoutePlannerAgent',
         'DelayMonitorAgent', 'VisionInspectorAgent', 'ExplainerAgent',
-        'CortexManager'
+        'CortexManager', 'LowStockMonitor'
     ]
     
     health_status = {}
     
-    for agent in agents:
-        # Check recent activity
-        recent_metrics = AgentMetrics.objects.filter(
-            agent_name=agent,
-            timestamp__gte=timezone.now() - timedelta(hours=1)
-        )
+    # Read-only analytics: safe to serve from a replica
+    with replica_reads():
+        for agent in agents:
+            # Check recent activity
+            recent_metrics = AgentMetrics.objects.filter(
+                agent_name=agent,
+                timestamp__gte=timezone.now() - timedelta(hours=1)
+            )
         
-        if recent_metrics.exists():
-            avg_response_time = recent_metrics.filter(
-                metric_type='response_time'
-            ).aggregate(avg_time=timezone.now())
+            if recent_metrics.exists():
+                avg_response_time = recent_metrics.filter(
+                    metric_type='response_time'
+                ).aggregate(avg_time=Avg('metric_value'))['avg_time']
             
-            health_status[agent] = {
-                'status': 'healthy',
-                'last_activity': recent_metrics.latest('timestamp').timestamp,
-                'metrics_count': recent_metrics.count()
-            }
-        else:
-            health_status[agent] = {
-                'status': 'warning',
-                'last_activity': None,
-                'metrics_count': 0
-            }
+                health_status[agent] = {
+                    'status': 'healthy',
+                    'last_activity': recent_metrics.latest('timestamp').timestamp,
+                    'metrics_count': recent_metrics.count(),
+                    'avg_response_time_ms': avg_response_time
+                }
+            else:
+                health_status[agent] = {
+                    'status': 'warning',
+                    'last_activity': None,
+                    'metrics_count': 0
+                }
     
     return {
         'status': 'success',
         'timestamp': timezone.now().isoformat(),
         'agent_health': health_status
     }
+
+
+@shared_task
+@traced_task('TaskExecutionCleanup')
+def purge_task_executions():
+    """
+    Delete idempotency leases past TASK_EXECUTION_RETENTION_HOURS
+    """
+    return {
+        'status': 'success',
+        'deleted': purge_executions(),
+    }
+
+
+@shared_task
+@traced_task('StockLedger')
+def periodic_stock_snapshot():
+    """
+    Roll each store's stock snapshot forward so point-in-time queries stay cheap
+    """
+    return {
+        'status': 'success',
+        'snapshots_taken': take_snapshots(),
+    }
+
+
+@shared_task
+@traced_task('ForecastBacktest')
+def periodic_forecast_backtest():
+    """
+    Score settled days' forecasts against realized demand
+    """
+    days = run_backtest()
+    return {
+        'status': 'success',
+        'days_scored': len(days),
+        'through': days[-1].forecast_date.isoformat() if days else None,
+    }
+
+
+@shared_task
+@traced_task('ForecastCube')
+def periodic_forecast_cube():
+    """
+    Keep today's aggregated forecast cube in step with today's forecasts
+    """
+    build = current_cube(timezone.localdate(), settings.FORECAST_RECONCILIATION)
+    return {
+        'status': 'success',
+        'forecast_date': build.forecast_date.isoformat(),
+        'forecasts': build.forecasts,
+        'build_ms': build.build_ms,
+    }
+
+
+@shared_task
+@traced_task('PartitionMaintenance')
+def maintain_partitions():
+    """
+    Create the coming months' history partitions before rows arrive for them
+    """
+    return {
+        'status': 'success',
+        'partitions_created': ensure_partitions(),
+    }
@@ -21,6 +21,8 @@ agent_router.register(r'inspections', agent_views.VisionInspectionViewSet)
 agent_router.register(r'explanations', agent_views.AgentExplanationViewSet)
 agent_router.register(r'coordinations', agent_views.CortexCoordinationViewSet)
 agent_router.register(r'metrics', agent_views.AgentMetricsViewSet)
+agent_router.register(r'task-spans', agent_views.TaskSpanViewSet)
+agent_router.register(r'endpoint-profiles', agent_views.EndpointProfileViewSet)
 
 urlpatterns = [
     # Legacy endpoints (maintain compatibility)
@@ -33,5 +35,6 @@ urlpatterns = [
     # Dashboard and system endpoints
     path('dashboard/summary/', agent_views.dashboard_summary, name='dashboard-summary'),
     path('dashboard/agent-health/', agent_views.agent_health, name='agent-health'),
+    path('search/', agent_views.search, name='search'),
     path('agents/simulate-workflow/', agent_views.simulate_agent_workflow, name='simulate-workflow'),
 ]
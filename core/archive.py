@@ -0,0 +1,293 @@
+"""
+Parquet archive of old agent history months
+
+    python manage.py archive_history                  # months older than ARCHIVE_RETENTION_MONTHS
+    python manage.py archive_history --older-than 6 --table core_agentmetrics
+
+Each month of a partitioned table (core.partitioning) is detached from
+its parent, written to ARCHIVE_DIR/<table>/<YYYY-MM>.parquet
+(zstd-compressed, one column per model field) and dropped; writes to the
+other months carry on meanwhile. Without partitions (other databases, or
+rows stranded in the default partition) the month's rows are locked,
+exported and deleted instead. Nothing is removed unless the file holds
+every row, and a run interrupted after detaching picks the table up again.
+
+`history()` is the read path for reports reaching past the retention
+window: live rows and archived months as one pandas DataFrame.
+pyarrow is needed for both and is only imported here.
+"""
+import json
+import os
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Min
+
+from .partitioning import PARTITIONED_MODELS, add_months, detach_partition, is_partitioned, month_bounds, month_start
+
+
+BATCH_SIZE = 10000
+COMPRESSION = 'zstd'
+
+ARCHIVED_MODELS = {model._meta.db_table: model for model in PARTITIONED_MODELS}
+
+
+def _schema(model):
+    """pyarrow schema of a model's concrete columns; UUIDs and JSON are stored as text"""
+    import pyarrow as pa
+
+    types = {
+        'AutoField': pa.int64(), 'BigAutoField': pa.int64(), 'IntegerField': pa.int64(),
+        'ForeignKey': pa.int64(), 'FloatField': pa.float64(), 'BooleanField': pa.bool_(),
+        'DateField': pa.date32(), 'DateTimeField': pa.timestamp('us', tz='UTC'),
+    }
+    return pa.schema([
+        pa.field(field.attname, types.get(field.get_internal_type(), pa.string()), nullable=True)
+        for field in model._meta.concrete_fields
+    ])
+
+
+def _column_values(field, values, json_text=False):
+    """A column as pyarrow takes it; `json_text` if JSON values are already encoded"""
+    if field.get_internal_type() == 'JSONField' and not json_text:
+        return [None if value is None else json.dumps(value, cls=field.encoder) for value in values]
+    if field.get_internal_type() == 'UUIDField':
+        return [None if value is None else str(value) for value in values]
+    return values
+
+
+def _month_of(value):
+    """Month of a date or a (UTC) datetime"""
+    if isinstance(value, datetime):
+        value = value.astimezone(dt_timezone.utc)
+    return month_start(value)
+
+
+def _bounds(model, start, end):
+    """start and end as values of the model's partition field (dates become UTC midnights)"""
+    if model._meta.get_field(PARTITIONED_MODELS[model]).get_internal_type() == 'DateTimeField':
+        start, end = (
+            value if isinstance(value, datetime) else datetime.combine(value, datetime.min.time(), tzinfo=dt_timezone.utc)
+            for value in (start, end)
+        )
+    return start, end
+
+
+def archive_dir(model):
+    return os.path.join(settings.ARCHIVE_DIR, model._meta.db_table)
+
+
+def _archive_files(model):
+    """(file name, month) of a model's archive files, oldest first"""
+    directory = archive_dir(model)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        (name, date.fromisoformat(f'{name[:7]}-01')) for name in os.listdir(directory) if name.endswith('.parquet')
+    )
+
+
+def archived_months(model):
+    """Months with an archive file, oldest first"""
+    return sorted({month for _, month in _archive_files(model)})
+
+
+def archivable_months(model, older_than_months):
+    """Months with rows before the current month and the `older_than_months` before it, oldest first"""
+    cutoff = add_months(month_start(date.today()), -older_than_months)
+    field = PARTITIONED_MODELS[model]
+    oldest = model.objects.aggregate(oldest=Min(field))['oldest']
+    if oldest is None:
+        return []
+    months, month = [], month_start(oldest)
+    while month < cutoff:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def archive_month(model, month):
+    """
+    Move one month of `model` into Parquet files; returns the rows archived.
+    A month archived again (late rows) gets another file.
+    """
+    rows = 0
+    if is_partitioned(model):
+        table = detach_partition(model, month)
+        if table is not None:
+            rows += _archive_table(model, month, table)
+    # Rows outside a partition: unpartitioned tables, the default partition,
+    # or rows written for the month after its partition was detached
+    rows += _archive_rows(model, month)
+    return rows
+
+
+def _archive_table(model, month, table):
+    """Archive a detached partition, then drop it"""
+    quote = connection.ops.quote_name
+    fields = model._meta.concrete_fields
+    columns = ', '.join(
+        f'{quote(field.column)}::text' if field.get_internal_type() == 'JSONField' else quote(field.column)
+        for field in fields
+    )
+    # Nothing writes to a detached table, so it can be read without locks
+    with transaction.atomic(), connection.chunked_cursor() as cursor:
+        cursor.execute(f'SELECT {columns} FROM {quote(table)}')
+        rows = _write_file(model, month, iter(lambda: cursor.fetchmany(BATCH_SIZE), []), json_text=True)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Nothing may point at archived rows (TaskSpan.coordination has no database constraint)
+        for relation in model._meta.related_objects:
+            column = quote(relation.field.column)
+            cursor.execute(
+                f'UPDATE {quote(relation.related_model._meta.db_table)} SET {column} = NULL '
+                f'WHERE {column} IN (SELECT {quote(model._meta.pk.column)} FROM {quote(table)})'
+            )
+        cursor.execute(f'DROP TABLE {quote(table)}')
+    return rows
+
+
+def _archive_rows(model, month):
+    """Archive and delete the month's rows still in the model's table"""
+    field_name = PARTITIONED_MODELS[model]
+    start, end = month_bounds(model, month)
+    fields = model._meta.concrete_fields
+    pk_index = fields.index(model._meta.pk)
+    queryset = model.objects.filter(**{f'{field_name}__gte': start, f'{field_name}__lt': end}).order_by()
+    pks = []
+
+    def batches():
+        batch = []
+        for row in queryset.select_for_update().values_list(*[field.attname for field in fields]).iterator(
+                chunk_size=BATCH_SIZE):
+            batch.append(row)
+            pks.append(row[pk_index])
+            if len(batch) == BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    # The exported rows stay locked until deleted, and only they are deleted
+    with transaction.atomic():
+        rows = _write_file(model, month, batches())
+        for offset in range(0, len(pks), BATCH_SIZE):
+            model.objects.filter(pk__in=pks[offset:offset + BATCH_SIZE]).delete()
+    return rows
+
+
+def _write_file(model, month, batches, json_text=False):
+    """
+    Write batches of row tuples to the month's next archive file; returns the
+    rows written. The file only appears once it holds every row.
+    """
+    import pyarrow.parquet as pq
+
+    fields = model._meta.concrete_fields
+    schema = _schema(model)
+    os.makedirs(archive_dir(model), exist_ok=True)
+    path = os.path.join(archive_dir(model), f'{month:%Y-%m}.parquet')
+    suffix = int(time.time())
+    while os.path.exists(path):
+        path = os.path.join(archive_dir(model), f'{month:%Y-%m}.{suffix}.parquet')
+        suffix += 1
+    partial = path + '.partial'
+
+    rows = 0
+    writer = pq.ParquetWriter(partial, schema, compression=COMPRESSION)
+    try:
+        for batch in batches:
+            rows += _write_batch(writer, schema, fields, batch, json_text)
+    finally:
+        writer.close()
+    if rows == 0:
+        os.remove(partial)
+        return 0
+    if pq.read_metadata(partial).num_rows != rows:
+        os.remove(partial)
+        raise RuntimeError(f'{partial} is incomplete; {model._meta.db_table} {month:%Y-%m} was left in place')
+    os.replace(partial, path)
+    return rows
+
+
+def _write_batch(writer, schema, fields, batch, json_text=False):
+    import pyarrow as pa
+
+    columns = list(zip(*batch))
+    writer.write_table(pa.Table.from_arrays(
+        [pa.array(_column_values(field, column, json_text), type=schema.field(field.attname).type)
+         for field, column in zip(fields, columns)],
+        schema=schema,
+    ))
+    return len(batch)
+
+
+def read_archive(model, start, end, fields=None, **filters):
+    """
+    Archived rows of `model` with the partition field in [start, end) (dates
+    or datetimes) as a DataFrame; `filters` are equality tests (agent_name='InventoryAgent')
+    """
+    import pandas as pd
+    import pyarrow.parquet as pq
+
+    field_name = PARTITIONED_MODELS[model]
+    start, end = _bounds(model, start, end)
+    directory = archive_dir(model)
+    first = _month_of(start)
+    paths = [
+        os.path.join(directory, name) for name, month in _archive_files(model)
+        if first <= month and month_bounds(model, month)[0] < end
+    ]
+    columns = list(fields) if fields else None
+    if not paths:
+        return pd.DataFrame(columns=columns or [field.attname for field in model._meta.concrete_fields])
+    predicates = [(field_name, '>=', start), (field_name, '<', end)]
+    predicates += [(name, '=', value) for name, value in filters.items()]
+    return pq.ParquetDataset(paths, filters=predicates).read(columns=columns).to_pandas()
+
+
+def history(model, start, end, fields, **filters):
+    """Rows of `model` in [start, end) from the database and the archive, as one DataFrame"""
+    import pandas as pd
+
+    field_name = PARTITIONED_MODELS[model]
+    start, end = _bounds(model, start, end)
+    live = pd.DataFrame.from_records(
+        list(model.objects.filter(
+            **{f'{field_name}__gte': start, f'{field_name}__lt': end}, **filters
+        ).values_list(*fields)),
+        columns=list(fields),
+    )
+    archived = read_archive(model, start, end, fields, **filters)
+    frames = [frame for frame in (archived, live) if not frame.empty]
+    return pd.concat(frames, ignore_index=True) if frames else live
+
+
+def metric_history(start, end, interval='day', **filters):
+    """
+    AgentMetrics per agent, metric type and day (or month) from `start` to
+    `end` (dates, inclusive), over live and archived rows: count, avg, min, max
+    """
+    from .agent_models import AgentMetrics
+
+    fields = ['timestamp', 'agent_name', 'metric_type', 'metric_value']
+    frame = history(AgentMetrics, start, end + timedelta(days=1), fields, **filters)
+    if frame.empty:
+        return []
+    periods = frame['timestamp'].dt.tz_convert('UTC').dt.tz_localize(None).dt.to_period('M' if interval == 'month' else 'D')
+    frame['period'] = periods.dt.start_time.dt.date
+    summary = frame.groupby(['period', 'agent_name', 'metric_type'])['metric_value'].agg(['count', 'mean', 'min', 'max'])
+    return [
+        {
+            'period': period,
+            'agent_name': agent_name,
+            'metric_type': metric_type,
+            'count': int(row['count']),
+            'avg': round(float(row['mean']), 4),
+            'min': float(row['min']),
+            'max': float(row['max']),
+        }
+        for (period, agent_name, metric_type), row in summary.iterrows()
+    ]
@@ -0,0 +1,229 @@
+"""
+Forecast backtesting: DemandForecast predictions against realized demand
+
+Realized demand for a store, product and day is the stock that left the
+store through BACKTEST_DEMAND_REASONS ledger entries (sales adjustments and
+transfers out), summed in the database. Each day's forecasts are joined
+with it in one pandas frame and scored per store, product, category and
+model_version:
+
+    WAPE  sum |forecast - actual| / sum actual
+    MAPE  mean |forecast - actual| / actual, over pairs with demand
+    bias  sum (forecast - actual) / sum actual
+
+Each group becomes an InventoryAgent `accuracy` AgentMetrics row (value:
+(1 - WAPE) as a percentage), carrying the sums so any date range rolls up
+exactly. A ForecastBacktestDay row records the day's overall scores and
+marks it done; runs resume after the latest one, so each day is scored
+once, BACKTEST_SETTLE_HOURS after it ends (late ledger entries included).
+"""
+import time
+from collections import defaultdict
+from datetime import datetime, time as dt_time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Min, Sum
+from django.utils import timezone
+
+from .agent_models import AgentMetrics, DemandForecast, ForecastBacktestDay
+from .models import StockLedgerEntry
+
+
+# AgentMetrics dimension -> forecast frame column
+DIMENSIONS = {
+    'store': 'store_id',
+    'product': 'product_id',
+    'category': 'category',
+    'model_version': 'model_version',
+}
+
+SUM_FIELDS = ('forecasts', 'forecast_units', 'actual_units', 'abs_error', 'error', 'ape_sum', 'ape_count')
+
+# Backtested model accuracy is reused as forecast confidence; re-read this often
+CONFIDENCE_CACHE_SECONDS = 3600
+_confidence_cache = {}  # model_version -> (checked at, confidence or None)
+
+
+def day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, dt_time.min))
+    return start, start + timedelta(days=1)
+
+
+def scores(sums):
+    """WAPE/MAPE/bias from summed errors; None where there was no demand to compare with"""
+    actual = sums['actual_units']
+    return {
+        'wape': sums['abs_error'] / actual if actual else None,
+        'mape': sums['ape_sum'] / sums['ape_count'] if sums['ape_count'] else None,
+        'bias': sums['error'] / actual if actual else None,
+    }
+
+
+def realized_demand(first_day, last_day=None):
+    """[(store_id, product_id, units)] that left stores through demand reasons on first_day..last_day"""
+    start, end = day_bounds(first_day)[0], day_bounds(last_day or first_day)[1]
+    rows = StockLedgerEntry.objects.filter(
+        created_at__gte=start, created_at__lt=end, delta__lt=0,
+        reason__in=settings.BACKTEST_DEMAND_REASONS,
+    ).values('store_id', product_id=F('inventory__catalog_product_id')).annotate(
+        units=-Sum('delta')
+    ).order_by()
+    return [(row['store_id'], row['product_id'], row['units']) for row in rows if row['product_id']]
+
+
+def evaluate_day(day):
+    """(ForecastBacktestDay, [AgentMetrics]) for one day's forecasts; nothing is saved"""
+    import pandas as pd  # only backtest runs need pandas
+
+    forecasts = pd.DataFrame.from_records(
+        list(DemandForecast.objects.filter(forecast_date=day).values_list(
+            'store_id', 'product_id', 'product__category', 'model_version', 'predicted_demand'
+        )),
+        columns=['store_id', 'product_id', 'category', 'model_version', 'forecast'],
+    )
+    summary = ForecastBacktestDay(forecast_date=day)
+    if forecasts.empty:
+        return summary, []
+
+    actuals = pd.DataFrame.from_records(realized_demand(day), columns=['store_id', 'product_id', 'actual'])
+    frame = forecasts.merge(actuals, on=['store_id', 'product_id'], how='left')
+    # float: with no demand at all the merged column is object-typed, and 0/0 would raise instead of giving NaN
+    frame['actual'] = frame['actual'].astype(float).fillna(0)
+    frame['error'] = frame['forecast'] - frame['actual']
+    frame['abs_error'] = frame['error'].abs()
+    frame['ape'] = (frame['abs_error'] / frame['actual']).where(frame['actual'] > 0)
+    aggregations = {
+        'forecasts': ('forecast', 'size'),
+        'forecast_units': ('forecast', 'sum'),
+        'actual_units': ('actual', 'sum'),
+        'abs_error': ('abs_error', 'sum'),
+        'error': ('error', 'sum'),
+        'ape_sum': ('ape', 'sum'),
+        'ape_count': ('ape', 'count'),
+    }
+
+    totals = frame.groupby(lambda _: day).agg(**aggregations).to_dict('records')[0]
+    totals = {field: _plain(totals[field]) for field in SUM_FIELDS}
+    summary.forecasts = totals['forecasts']
+    summary.forecast_units = round(totals['forecast_units'])
+    summary.actual_units = round(totals['actual_units'])
+    for name, value in scores(totals).items():
+        setattr(summary, name, value)
+
+    metrics = []
+    for dimension, column in DIMENSIONS.items():
+        grouped = frame.groupby(column).agg(**aggregations)
+        for key, row in zip(grouped.index.tolist(), grouped.to_dict('records')):
+            sums = {field: _plain(row[field]) for field in SUM_FIELDS}
+            group_scores = scores(sums)
+            if group_scores['wape'] is None:
+                continue  # no demand at all: accuracy is undefined
+            metrics.append(AgentMetrics(
+                agent_name='InventoryAgent',
+                metric_type='accuracy',
+                metric_value=round(max(0.0, 1 - group_scores['wape']) * 100, 2),
+                unit='%',
+                additional_data={
+                    'source': 'backtest',
+                    'forecast_date': day.isoformat(),
+                    'dimension': dimension,
+                    'key': _plain(key),
+                    **sums,
+                    **{name: round(value, 4) for name, value in group_scores.items() if value is not None},
+                },
+            ))
+    return summary, metrics
+
+
+def _plain(value):
+    """numpy scalar -> int/float/str for JSON"""
+    value = value.item() if hasattr(value, 'item') else value
+    return int(value) if isinstance(value, float) and value.is_integer() else value
+
+
+def run_backtest(until=None):
+    """
+    Score the forecast days not scored yet, oldest first, at most
+    BACKTEST_DAYS_PER_RUN of them. `until` (default: the last day that ended
+    BACKTEST_SETTLE_HOURS ago) is the last day considered. Returns the
+    ForecastBacktestDay rows written.
+    """
+    settled = timezone.localtime(timezone.now() - timedelta(hours=settings.BACKTEST_SETTLE_HOURS))
+    until = until or settled.date() - timedelta(days=1)
+    latest = ForecastBacktestDay.objects.aggregate(day=Max('forecast_date'))['day']
+    first = latest + timedelta(days=1) if latest else DemandForecast.objects.aggregate(day=Min('forecast_date'))['day']
+    if first is None or first > until:
+        return []
+
+    days = []
+    for offset in range(min((until - first).days + 1, settings.BACKTEST_DAYS_PER_RUN)):
+        day = first + timedelta(days=offset)
+        started = time.perf_counter()
+        summary, metrics = evaluate_day(day)
+        # A day's metrics and its marker commit together, so a failed run is simply retried
+        with transaction.atomic():
+            AgentMetrics.objects.bulk_create(metrics, batch_size=1000)
+            summary.save()
+        days.append(summary)
+        AgentMetrics.objects.create(
+            agent_name='InventoryAgent',
+            metric_type='response_time',
+            metric_value=round((time.perf_counter() - started) * 1000, 2),
+            unit='ms',
+            additional_data={'event': 'backtest', 'forecast_date': day.isoformat(), 'forecasts': summary.forecasts}
+        )
+    return days
+
+
+def discard_backtest(since):
+    """Forget the scores of `since` and later days, so the next runs recompute them"""
+    dates = list(ForecastBacktestDay.objects.filter(forecast_date__gte=since).values_list('forecast_date', flat=True))
+    with transaction.atomic():
+        AgentMetrics.objects.filter(
+            agent_name='InventoryAgent', metric_type='accuracy', timestamp__gte=day_bounds(since)[0],
+            additional_data__source='backtest',
+            additional_data__forecast_date__in=[day.isoformat() for day in dates],
+        ).delete()
+        ForecastBacktestDay.objects.filter(forecast_date__gte=since).delete()
+    return len(dates)
+
+
+def accuracy_report(dimension, start, end):
+    """Scores per `dimension` key over forecast days start..end, rolled up from the daily sums"""
+    rows = AgentMetrics.objects.filter(
+        agent_name='InventoryAgent', metric_type='accuracy', timestamp__gte=day_bounds(start)[0],
+        additional_data__source='backtest', additional_data__dimension=dimension,
+        additional_data__forecast_date__gte=start.isoformat(),
+        additional_data__forecast_date__lte=end.isoformat(),
+    ).values_list('additional_data', flat=True)
+
+    totals = defaultdict(lambda: dict.fromkeys(SUM_FIELDS, 0))
+    for data in rows:
+        for field in SUM_FIELDS:
+            totals[data['key']][field] += data[field]
+    report = []
+    for key, sums in totals.items():
+        group_scores = scores(sums)
+        report.append({
+            'key': key,
+            'forecasts': sums['forecasts'],
+            'forecast_units': sums['forecast_units'],
+            'actual_units': sums['actual_units'],
+            **{name: round(value, 4) if value is not None else None for name, value in group_scores.items()},
+            'accuracy': round(max(0.0, 1 - group_scores['wape']) * 100, 2),
+        })
+    return sorted(report, key=lambda row: row['accuracy'])
+
+
+def model_confidence(model_version):
+    """1 - WAPE of this model version over the last BACKTEST_CONFIDENCE_DAYS, or None if not backtested"""
+    cached = _confidence_cache.get(model_version)
+    now = time.monotonic()
+    if cached and now - cached[0] < CONFIDENCE_CACHE_SECONDS:
+        return cached[1]
+    end = timezone.localdate() - timedelta(days=1)
+    report = accuracy_report('model_version', end - timedelta(days=settings.BACKTEST_CONFIDENCE_DAYS - 1), end)
+    confidence = next((row['accuracy'] / 100 for row in report if row['key'] == model_version), None)
+    _confidence_cache[model_version] = (now, confidence)
+    return confidence
@@ -0,0 +1,415 @@
+"""
+Bulk create/upsert for agents and integrations
+
+A bulk request carries a JSON array or NDJSON (one object per line) of up
+to BULK_MAX_ITEMS items. Items are validated column by column against the
+model's fields - each foreign key column is checked with one query per
+chunk instead of one per item - then written in chunked bulk_create
+transactions. An invalid item is reported by index and skipped; it never
+aborts the rest of the batch.
+"""
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.response import Response
+
+from .agent_models import AgentMetrics, DemandForecast, VisionInspection
+from .low_stock import refresh_low_stock
+from .models import Inventory, StockLedgerEntry, legacy_product, legacy_store
+from .stock_lots import LotBook
+
+
+MISSING = object()
+
+# Errors listed in a response; the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+
+class InvalidLine:
+    """An NDJSON line that isn't valid JSON, reported as that item's error"""
+
+    def __init__(self, message):
+        self.message = message
+
+
+class NDJSONParser(BaseParser):
+    """Parse newline-delimited JSON into a list, one item per non-blank line"""
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        items = []
+        for number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as exc:
+                items.append(InvalidLine(f'Line {number} is not valid JSON: {exc}'))
+        return items
+
+
+class BulkWriter:
+    """
+    Validate and write a batch of plain dicts for one model.
+
+    Subclasses set `model`, the writable `fields` and the `unique_fields`
+    an upsert matches on. Foreign keys are given by primary key, as in the
+    regular endpoints.
+    """
+    model = None
+    fields = ()
+    unique_fields = ()
+    # How unique_fields are named to clients, if not by field name
+    unique_label = None
+    # field: minimum value, for counts that can't go negative
+    min_values = {}
+    # Whether the database has a unique constraint on exactly unique_fields,
+    # so an upsert can be one INSERT ... ON CONFLICT
+    conflict_target = True
+    chunk_size = 1000
+
+    def __init__(self, upsert=False):
+        self.upsert = upsert
+        self.errors = {}
+        self.created = 0
+        self.updated = 0
+
+    def run(self, items):
+        """Write the valid items; returns {'created', 'updated', 'error_count', 'errors'}"""
+        for start in range(0, len(items), self.chunk_size):
+            chunk = list(enumerate(items[start:start + self.chunk_size], start=start))
+            rows = self.validate(chunk)
+            rows = self.dedupe(rows)
+            if rows:
+                self.write(rows)
+        errors = [{'index': index, 'errors': self.errors[index]} for index in sorted(self.errors)]
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'error_count': len(errors),
+            'errors': errors[:MAX_REPORTED_ERRORS],
+        }
+
+    # Validation
+
+    def error(self, index, field, message):
+        self.errors.setdefault(index, {}).setdefault(field, []).append(message)
+
+    def validate(self, chunk):
+        """Turn (index, item) pairs into (index, {attname: value}) rows, one column at a time"""
+        rows = {}
+        for index, item in chunk:
+            if isinstance(item, InvalidLine):
+                self.error(index, 'non_field_errors', item.message)
+            elif not isinstance(item, dict):
+                self.error(index, 'non_field_errors', 'Expected a JSON object.')
+            else:
+                rows[index] = {}
+        items = dict(chunk)
+
+        for name in self.fields:
+            field = self.model._meta.get_field(name)
+            column = {index: items[index].get(name, MISSING) for index in rows}
+            if field.is_relation:
+                self.validate_relation(field, column, rows)
+            else:
+                self.validate_column(field, column, rows)
+        self.clean(rows, items)
+        return [(index, row) for index, row in rows.items() if index not in self.errors]
+
+    def validate_column(self, field, column, rows):
+        required = not (field.has_default() or field.null or field.blank)
+        choices = {value for value, _ in field.flatchoices} if field.choices else None
+        minimum = self.min_values.get(field.name)
+        for index, value in column.items():
+            if value is MISSING:
+                if required:
+                    self.error(index, field.name, 'This field is required.')
+                continue
+            if value is None:
+                if not field.null:
+                    self.error(index, field.name, 'This field may not be null.')
+                    continue
+            else:
+                try:
+                    value = field.to_python(value)
+                except ValidationError as exc:
+                    self.error(index, field.name, ' '.join(exc.messages))
+                    continue
+                if choices is not None and value not in choices:
+                    self.error(index, field.name, f'"{value}" is not a valid choice.')
+                    continue
+                if field.max_length is not None and isinstance(value, str) and len(value) > field.max_length:
+                    self.error(index, field.name, f'Ensure this field has no more than {field.max_length} characters.')
+                    continue
+                if minimum is not None and value < minimum:
+                    self.error(index, field.name, f'Ensure this value is greater than or equal to {minimum}.')
+                    continue
+            rows[index][field.attname] = value
+
+    def validate_relation(self, field, column, rows):
+        """Check a whole foreign key column with one query"""
+        target = field.related_model
+        keys = {}
+        for index, value in column.items():
+            if value is MISSING or value is None:
+                if not field.null:
+                    self.error(index, field.name, 'This field is required.')
+                else:
+                    rows[index][field.attname] = None
+                continue
+            try:
+                keys[index] = target._meta.pk.to_python(value)
+            except ValidationError:
+                self.error(index, field.name, f'Incorrect type. Expected pk value, received {type(value).__name__}.')
+        existing = set(target.objects.filter(pk__in=set(keys.values())).values_list('pk', flat=True))
+        for index, key in keys.items():
+            if key in existing:
+                rows[index][field.attname] = key
+            else:
+                self.error(index, field.name, f'Invalid pk "{key}" - object does not exist.')
+
+    def clean(self, rows, items):
+        """Hook for cross-field checks and derived columns on the chunk's valid rows"""
+
+    # Writing
+
+    def key_attnames(self):
+        return [self.model._meta.get_field(name).attname for name in self.unique_fields]
+
+    def key(self, row):
+        return tuple(row.get(attname) for attname in self.key_attnames())
+
+    def dedupe(self, rows):
+        """Fill in defaulted key fields; an earlier item repeating a later one's key is an error"""
+        if not self.unique_fields:
+            return rows
+        for name in self.unique_fields:
+            field = self.model._meta.get_field(name)
+            for _, row in rows:
+                if field.attname not in row:
+                    row[field.attname] = field.get_default()
+        last = {self.key(row): index for index, row in rows}
+        kept = []
+        for index, row in rows:
+            if last[self.key(row)] != index:
+                self.error(index, 'non_field_errors', f'Duplicate of item {last[self.key(row)]} in this batch.')
+            else:
+                kept.append((index, row))
+        return kept
+
+    def existing_keys(self, rows):
+        """Keys among the rows that are already stored, found with one query"""
+        if not self.unique_fields:
+            return set()
+        attnames = self.key_attnames()
+        lookup = Q()
+        for position, attname in enumerate(attnames):
+            lookup &= Q(**{f'{attname}__in': {self.key(row)[position] for _, row in rows}})
+        keys = {self.key(row) for _, row in rows}
+        return {key for key in self.model.objects.filter(lookup).values_list(*attnames) if key in keys}
+
+    def write(self, rows):
+        existing = self.existing_keys(rows)
+        if not self.upsert and existing:
+            rows = self.reject_existing(rows, existing)
+        try:
+            with transaction.atomic():
+                self.write_chunk(rows, existing)
+        except DatabaseError:
+            # Something only the database caught: find the offending items one by one
+            for index, row in rows:
+                try:
+                    with transaction.atomic():
+                        self.write_chunk([(index, row)], existing)
+                except DatabaseError as exc:
+                    self.error(index, 'non_field_errors', str(exc))
+
+    def reject_existing(self, rows, existing):
+        kept = []
+        for index, row in rows:
+            if self.key(row) in existing:
+                fields = ', '.join(self.unique_label or self.unique_fields)
+                self.error(index, 'non_field_errors', f'An item with this {fields} already exists; use upsert.')
+            else:
+                kept.append((index, row))
+        return kept
+
+    def update_fields(self):
+        """Fields an upsert overwrites on an existing record"""
+        return [name for name in self.fields if name not in self.unique_fields]
+
+    def write_chunk(self, rows, existing):
+        if self.upsert and self.unique_fields and not self.conflict_target:
+            return self.update_then_create(rows, existing)
+        objects = [self.model(**row) for _, row in rows]
+        options = {}
+        if self.upsert and self.unique_fields:
+            options = {
+                'update_conflicts': True,
+                'unique_fields': self.unique_fields,
+                'update_fields': self.update_fields(),
+            }
+        self.model.objects.bulk_create(objects, **options)
+        updated = sum(1 for _, row in rows if self.key(row) in existing) if self.unique_fields else 0
+        self.updated += updated
+        self.created += len(rows) - updated
+
+    def update_then_create(self, rows, existing):
+        """Upsert without ON CONFLICT: bulk_update the stored rows, bulk_create the rest"""
+        attnames = self.key_attnames()
+        lookup = Q()
+        for position, attname in enumerate(attnames):
+            lookup &= Q(**{f'{attname}__in': {key[position] for key in existing}})
+        pks = {
+            tuple(values[1:]): values[0]
+            for values in self.model.objects.filter(lookup).values_list('pk', *attnames)
+        } if existing else {}
+        updates = [self.model(pk=pks[self.key(row)], **row) for _, row in rows if self.key(row) in pks]
+        if updates:
+            self.model.objects.bulk_update(updates, self.update_fields())
+        self.model.objects.bulk_create([self.model(**row) for _, row in rows if self.key(row) not in pks])
+        self.updated += len(updates)
+        self.created += len(rows) - len(updates)
+
+
+class DemandForecastBulkWriter(BulkWriter):
+    """Forecasts, one per store, product and forecast date"""
+    model = DemandForecast
+    fields = ('store', 'product', 'forecast_date', 'predicted_demand', 'confidence_score',
+              'forecast_horizon_days', 'model_version', 'external_factors', 'created_by_agent')
+    unique_fields = ('store', 'product', 'forecast_date')
+    min_values = {'predicted_demand': 0, 'forecast_horizon_days': 1}
+
+
+class AgentMetricsBulkWriter(BulkWriter):
+    """Metrics; a client-supplied metric_id makes retries idempotent"""
+    model = AgentMetrics
+    fields = ('metric_id', 'agent_name', 'metric_type', 'metric_value', 'unit', 'additional_data')
+    unique_fields = ('metric_id',)
+    # Partitioned by month on PostgreSQL: metric_id is only unique together with timestamp
+    conflict_target = False
+
+
+class VisionInspectionBulkWriter(BulkWriter):
+    """Inspections; a client-supplied inspection_id makes retries idempotent"""
+    model = VisionInspection
+    fields = ('inspection_id', 'store', 'image_path', 'inspection_type', 'detected_objects',
+              'anomalies_found', 'confidence_scores', 'action_required', 'priority',
+              'processed_by_model', 'created_by_agent')
+    unique_fields = ('inspection_id',)
+
+
+class InventoryBulkWriter(BulkWriter):
+    """
+    Inventory rows by product_id and store_location, like the regular endpoint.
+
+    Quantity changes go through the same bookkeeping as Inventory.save() -
+    ledger entries, lots and the low-stock index - batched per chunk.
+    """
+    model = Inventory
+    fields = ('product_id', 'product_name', 'store_location', 'quantity', 'expiry_date')
+    unique_fields = ('store', 'catalog_product')
+    unique_label = ('store_location', 'product_id')
+    min_values = {'quantity': 0}
+
+    def __init__(self, upsert=False):
+        super().__init__(upsert)
+        self.stores = {}
+        self.products = {}
+
+    def clean(self, rows, items):
+        # One lookup per distinct store/product in the chunk, not per item
+        for index, row in rows.items():
+            if index in self.errors:
+                continue
+            if row['store_location'] not in self.stores:
+                self.stores[row['store_location']] = legacy_store(row['store_location']).pk
+            if row['product_id'] not in self.products:
+                self.products[row['product_id']] = legacy_product(row['product_id'], row['product_name']).pk
+            row['store_id'] = self.stores[row['store_location']]
+            row['catalog_product_id'] = self.products[row['product_id']]
+            row['last_updated'] = timezone.now()
+
+    def update_fields(self):
+        return super().update_fields() + ['store', 'catalog_product', 'last_updated']
+
+    def write_chunk(self, rows, existing):
+        keys = {self.key(row) for _, row in rows}
+        lookup = Q(store_id__in={key[0] for key in keys}, catalog_product_id__in={key[1] for key in keys})
+        previous = {
+            (store_id, product_id): quantity
+            for store_id, product_id, quantity in Inventory.objects.select_for_update().filter(lookup).values_list(
+                'store_id', 'catalog_product_id', 'quantity'
+            )
+        }
+        super().write_chunk(rows, existing)
+
+        ids = {
+            (store_id, product_id): pk
+            for pk, store_id, product_id in Inventory.objects.filter(lookup).values_list(
+                'pk', 'store_id', 'catalog_product_id'
+            )
+        }
+        entries = []
+        book = LotBook(ids.values())
+        for _, row in rows:
+            key = self.key(row)
+            delta = row['quantity'] - previous.get(key, 0)
+            if not delta:
+                continue
+            entries.append(StockLedgerEntry(
+                inventory_id=ids[key], store_id=row['store_id'], delta=delta,
+                reason='correction' if key in previous else 'opening'
+            ))
+            if delta > 0:
+                book.receive(ids[key], row['store_id'], delta, row.get('expiry_date'))
+            else:
+                book.withdraw(ids[key], -delta)
+        StockLedgerEntry.objects.bulk_create(entries)
+        book.save()
+        refresh_low_stock(ids.values())
+
+
+class BulkWriteMixin:
+    """Adds POST .../bulk/ to a viewset, writing through `bulk_writer_class`"""
+    bulk_writer_class = None
+
+    @extend_schema(
+        summary="Bulk create or upsert",
+        description="Create up to BULK_MAX_ITEMS records from a JSON array or an NDJSON body "
+                    "(Content-Type: application/x-ndjson). Invalid items are reported by index "
+                    "and skipped; the rest are written.",
+        parameters=[
+            OpenApiParameter(
+                name='upsert',
+                type=OpenApiTypes.BOOL,
+                location=OpenApiParameter.QUERY,
+                description='Update records that already exist instead of reporting them as errors'
+            )
+        ],
+        request={'application/json': OpenApiTypes.OBJECT, 'application/x-ndjson': OpenApiTypes.STR},
+        responses={200: OpenApiTypes.OBJECT}
+    )
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            return Response({"error": "Expected a JSON array or NDJSON body"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.BULK_MAX_ITEMS:
+            return Response(
+                {"error": f"At most {settings.BULK_MAX_ITEMS} items per request"},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        upsert = request.query_params.get('upsert', '').lower() in ('1', 'true', 'yes')
+        return Response(self.bulk_writer_class(upsert=upsert).run(items))
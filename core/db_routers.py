@@ -0,0 +1,127 @@
+"""
+Database routing for read replicas
+
+Read-only API traffic (GET/HEAD/OPTIONS on viewsets, dashboard and metrics
+endpoints) is spread across the configured replicas. Everything else - writes,
+Celery agent tasks, management commands - stays on the primary ('default').
+"""
+import contextvars
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# Per-request routing state, set by core.middleware.ReplicaRoutingMiddleware.
+# Outside of a request (Celery workers, shell, migrations) reads stay on primary.
+_replica_reads_allowed = contextvars.ContextVar('replica_reads_allowed', default=False)
+_pinned_to_primary = contextvars.ContextVar('pinned_to_primary', default=False)
+
+# alias -> (checked_at, is_fresh), process-local
+_lag_cache = {}
+
+PG_REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+def replica_aliases():
+    return list(getattr(settings, 'REPLICA_DATABASES', []))
+
+
+def replica_lag(alias):
+    """Return replication lag in seconds for a replica, or None if it can't be measured"""
+    try:
+        connection = connections[alias]
+        if connection.vendor != 'postgresql':
+            return 0.0
+        with connection.cursor() as cursor:
+            cursor.execute(PG_REPLICA_LAG_SQL)
+            return float(cursor.fetchone()[0])
+    except Exception:
+        return None
+
+
+def replica_is_fresh(alias):
+    """Check (and cache) whether a replica is within REPLICA_MAX_LAG_SECONDS"""
+    now = time.monotonic()
+    cached = _lag_cache.get(alias)
+    if cached and now - cached[0] < settings.REPLICA_LAG_CHECK_INTERVAL:
+        return cached[1]
+
+    lag = replica_lag(alias)
+    is_fresh = lag is not None and lag <= settings.REPLICA_MAX_LAG_SECONDS
+    _lag_cache[alias] = (now, is_fresh)
+    return is_fresh
+
+
+def pin_to_primary():
+    """Send all remaining reads in the current context to the primary"""
+    _pinned_to_primary.set(True)
+
+
+def is_pinned_to_primary():
+    return _pinned_to_primary.get()
+
+
+@contextmanager
+def replica_reads(pinned=False):
+    """
+    Allow reads in this block to go to a replica.
+
+    Used by the request middleware for safe methods and by read-only
+    analytics code outside of requests. `pinned` starts the block already
+    pinned to the primary (read-your-writes after a recent write).
+    """
+    allowed_token = _replica_reads_allowed.set(True)
+    pinned_token = _pinned_to_primary.set(pinned)
+    try:
+        yield
+    finally:
+        _pinned_to_primary.reset(pinned_token)
+        _replica_reads_allowed.reset(allowed_token)
+
+
+@contextmanager
+def primary_only():
+    """Force every read in this block onto the primary"""
+    allowed_token = _replica_reads_allowed.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads_allowed.reset(allowed_token)
+
+
+class ReplicaRouter:
+    """Route safe reads to a fresh replica, everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        if not _replica_reads_allowed.get() or _pinned_to_primary.get():
+            return DEFAULT_DB_ALIAS
+
+        candidates = [alias for alias in replica_aliases() if replica_is_fresh(alias)]
+        if not candidates:
+            return DEFAULT_DB_ALIAS
+        return random.choice(candidates)
+
+    def db_for_write(self, model, **hints):
+        # Any write makes later reads in the same request read-your-writes
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replica_aliases():
+            return False
+        return None
@@ -0,0 +1,198 @@
+"""
+Which external disruptions are in effect at a time, over a window, or near a store
+
+A disruption is in effect over [start_time, end_time], open-ended while
+end_time is null. The dashboard, the /active/ endpoint and the route
+planner ask this many times a minute, so each process keeps the
+disruptions that ended within DISRUPTION_INDEX_LOOKBACK_HOURS (or haven't
+ended) in an interval tree and answers from memory. The tree is rebuilt
+when a disruption is saved or deleted in this process, and when a cheap
+signature query (row count, latest pk, latest updated_at) run at most
+every DISRUPTION_INDEX_CHECK_SECONDS shows another process changed one.
+
+Windows reaching further back are answered by the database: on
+PostgreSQL a GiST-indexed `active_period` tstzrange column (migration
+0015), elsewhere the plain start/end comparison.
+
+"Near a store" means the store is within radius_km of the disruption's
+impact circle (latitude/longitude plus impact_radius_km); disruptions
+without coordinates match stores named in their affected_areas.
+"""
+import math
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, Max, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .agent_models import ExternalDisruption
+
+
+# end of a disruption that hasn't ended
+OPEN_END = datetime.max.replace(tzinfo=dt_timezone.utc)
+
+INTERVAL_FIELDS = (
+    'pk', 'start_time', 'end_time', 'latitude', 'longitude', 'impact_radius_km', 'affected_areas'
+)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
+
+
+@dataclass(frozen=True)
+class DisruptionInterval:
+    pk: int
+    start: datetime
+    end: datetime
+    latitude: float
+    longitude: float
+    impact_radius_km: float
+    areas: frozenset
+
+    @classmethod
+    def from_row(cls, pk, start, end, latitude, longitude, impact_radius_km, affected_areas):
+        areas = frozenset(str(area).lower() for area in affected_areas or () if area)
+        return cls(pk, start, end or OPEN_END, latitude, longitude, impact_radius_km, areas)
+
+    def affects(self, store, radius_km=0):
+        if self.latitude is not None and self.longitude is not None \
+                and store.latitude is not None and store.longitude is not None:
+            distance = haversine_km(self.latitude, self.longitude, store.latitude, store.longitude)
+            return distance <= self.impact_radius_km + radius_km
+        place = f'{store.name} {store.location}'.lower()
+        return any(area in place for area in self.areas)
+
+
+class IntervalTree:
+    """
+    Static augmented interval tree: intervals sorted by start, laid out as
+    an implicit balanced BST where each node knows the latest end in its
+    subtree. An overlap query visits O(log n + matches) nodes.
+    """
+
+    def __init__(self, intervals):
+        self.intervals = sorted(intervals, key=lambda interval: interval.start)
+        self.max_end = [None] * len(self.intervals)
+        self._build(0, len(self.intervals) - 1)
+
+    def _build(self, low, high):
+        if low > high:
+            return None
+        mid = (low + high) // 2
+        ends = [self.intervals[mid].end, self._build(low, mid - 1), self._build(mid + 1, high)]
+        self.max_end[mid] = max(end for end in ends if end is not None)
+        return self.max_end[mid]
+
+    def overlapping(self, start, end):
+        """Intervals intersecting [start, end]"""
+        found = []
+        stack = [(0, len(self.intervals) - 1)]
+        while stack:
+            low, high = stack.pop()
+            if low > high:
+                continue
+            mid = (low + high) // 2
+            if self.max_end[mid] < start:
+                continue  # nothing in this subtree lasts until start
+            stack.append((low, mid - 1))
+            interval = self.intervals[mid]
+            if interval.start <= end:  # otherwise everything to the right starts too late as well
+                if interval.end >= start:
+                    found.append(interval)
+                stack.append((mid + 1, high))
+        return found
+
+    def __len__(self):
+        return len(self.intervals)
+
+
+class DisruptionIndex:
+    """This process's interval tree of recent and ongoing disruptions; use `disruption_index`"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tree = None
+        self._covers_from = None
+        self._signature = None
+        self._checked_at = None
+
+    def invalidate(self):
+        self._tree = None
+
+    def _signature_now(self):
+        return ExternalDisruption.objects.aggregate(
+            count=Count('pk'), last_pk=Max('pk'), updated=Max('updated_at')
+        )
+
+    def _current(self):
+        now = time.monotonic()
+        if self._tree is not None and now - self._checked_at < settings.DISRUPTION_INDEX_CHECK_SECONDS:
+            return self._tree, self._covers_from
+        with self._lock:
+            signature = self._signature_now()
+            if self._tree is None or signature != self._signature:
+                covers_from = timezone.now() - timedelta(hours=settings.DISRUPTION_INDEX_LOOKBACK_HOURS)
+                rows = ExternalDisruption.objects.filter(
+                    Q(end_time__isnull=True) | Q(end_time__gte=covers_from)
+                ).values_list(*INTERVAL_FIELDS)
+                self._tree = IntervalTree(DisruptionInterval.from_row(*row) for row in rows)
+                self._covers_from = covers_from
+                self._signature = signature
+            self._checked_at = now
+            return self._tree, self._covers_from
+
+    def overlapping(self, start, end):
+        """Intervals in effect at some point of [start, end], or None if the window predates the index"""
+        tree, covers_from = self._current()
+        if start < covers_from:
+            return None
+        return tree.overlapping(start, end)
+
+
+disruption_index = DisruptionIndex()
+
+
+@receiver(post_save, sender=ExternalDisruption, dispatch_uid='disruption_index_save')
+@receiver(post_delete, sender=ExternalDisruption, dispatch_uid='disruption_index_delete')
+def invalidate_disruption_index(**kwargs):
+    disruption_index.invalidate()
+
+
+def active_between(queryset, start, end):
+    """Disruptions in effect at some point of [start, end], filtered in the database"""
+    if connections[queryset.db].vendor == 'postgresql':
+        # psycopg ranges; only importable where the PostgreSQL driver is installed
+        from django.contrib.postgres.fields import DateTimeRangeField
+        from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
+        return queryset.alias(
+            period=RawSQL('active_period', (), output_field=DateTimeRangeField())
+        ).filter(period__overlap=DateTimeTZRange(start, end, '[]'))
+    return queryset.filter(start_time__lte=end).filter(Q(end_time__gte=start) | Q(end_time__isnull=True))
+
+
+def active_disruption_ids(start=None, end=None, store=None, radius_km=0):
+    """
+    Primary keys of the disruptions in effect at `start` (default: now), or
+    at any point up to `end`, optionally only those affecting `store`
+    within `radius_km`; most recently started first.
+    """
+    start = start or timezone.now()
+    end = end or start
+    intervals = disruption_index.overlapping(start, end)
+    if intervals is None:
+        rows = active_between(ExternalDisruption.objects.all(), start, end).values_list(*INTERVAL_FIELDS)
+        intervals = [DisruptionInterval.from_row(*row) for row in rows]
+    if store is not None:
+        intervals = [interval for interval in intervals if interval.affects(store, radius_km)]
+    return [interval.pk for interval in sorted(intervals, key=lambda interval: interval.start, reverse=True)]
@@ -0,0 +1,234 @@
+"""
+Forecast demand aggregated over the store and product hierarchies
+
+    store -> region (from Store.location) -> network
+    store -> store_type                   -> network
+    product -> category                   -> all
+
+Every store level crossed with every product level is a node of a day's
+cube: Mumbai x Dairy, fulfillment centers x product 348, network x all.
+The cube is computed from that day's DemandForecast rows in one pandas
+pass - one group code per level, one bincount per level for sums - and
+stored as ForecastAggregate rows, so drill-down reads a handful of
+indexed rows instead of summing forecasts on every request.
+
+Levels stay coherent (a region is exactly the sum of its stores) because
+each is summed from the same reconciled store/product forecasts:
+
+    bottom_up  the forecasts as they are
+    mint       MinT with structural scaling (WLS, W = diag(S 1)). Each
+               aggregate node also gets an independent base estimate: its
+               average daily demand over FORECAST_HIERARCHY_HISTORY_DAYS.
+               The store/product forecasts are adjusted to the weighted
+               least-squares compromise between those and the forecasts,
+               solved by conjugate gradient without forming S.
+
+A cube is rebuilt when its day's forecasts change: row count or latest
+created_at, checked by the periodic task and on first read.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+
+from .agent_models import DemandForecast, ForecastAggregate, ForecastCubeBuild, Store
+from .backtesting import realized_demand
+
+
+METHODS = ('bottom_up', 'mint')
+
+# level -> bottom frame column holding its key (None: one node for everything)
+STORE_LEVELS = {
+    'store': 'store_id',
+    'region': 'region',
+    'store_type': 'store_type',
+    'network': None,
+}
+PRODUCT_LEVELS = {
+    'product': 'product_id',
+    'category': 'category',
+    'all': None,
+}
+
+# level -> ancestor columns a node of that level has a single value for
+ANCESTORS = {
+    'store': ('region', 'store_type'),
+    'region': ('region',),
+    'store_type': ('store_type',),
+    'product': ('category',),
+    'category': ('category',),
+}
+
+
+def store_region(location):
+    """Region of a store: the city of "Whitefield, Bangalore", "Mumbai Zone 4" or "Koramangala" """
+    region = location.rsplit(',', 1)[-1].strip()
+    name, _, zone = region.rpartition(' Zone ')
+    return name if name and zone.isdigit() else region
+
+
+def forecast_signature(forecast_date):
+    """What a cube was built from; a changed signature means the cube is stale"""
+    return DemandForecast.objects.filter(forecast_date=forecast_date).aggregate(
+        forecasts=Count('pk'), last_forecast_at=Max('created_at')
+    )
+
+
+def current_cube(forecast_date, method):
+    """The day's cube build, (re)built first if missing or stale"""
+    build = ForecastCubeBuild.objects.filter(forecast_date=forecast_date, method=method).first()
+    signature = forecast_signature(forecast_date)
+    if build is None or (build.forecasts, build.last_forecast_at) != tuple(signature.values()):
+        build = build_cube(forecast_date, method, signature)
+    return build
+
+
+def build_cube(forecast_date, method, signature=None):
+    """Compute and store the forecast cube of `forecast_date`"""
+    started = time.perf_counter()
+    signature = signature or forecast_signature(forecast_date)
+    cells = compute_cube(forecast_date, method)
+    with transaction.atomic():
+        build, _ = ForecastCubeBuild.objects.update_or_create(
+            forecast_date=forecast_date, method=method,
+            defaults={**signature, 'build_ms': round((time.perf_counter() - started) * 1000, 2)},
+        )
+        build.cells.all().delete()
+        ForecastAggregate.objects.bulk_create(
+            [ForecastAggregate(build=build, **cell) for cell in cells], batch_size=5000
+        )
+    return build
+
+
+def bottom_frame(forecast_date):
+    """The day's store/product forecasts with their hierarchy keys and recent daily demand"""
+    import pandas as pd  # only cube builds need pandas
+
+    frame = pd.DataFrame.from_records(
+        list(DemandForecast.objects.filter(forecast_date=forecast_date).values_list(
+            'store_id', 'product_id', 'product__category', 'predicted_demand'
+        )),
+        columns=['store_id', 'product_id', 'category', 'forecast'],
+    )
+    stores = pd.DataFrame.from_records(
+        [(pk, store_region(location), store_type)
+         for pk, location, store_type in Store.objects.values_list('pk', 'location', 'store_type')],
+        columns=['store_id', 'region', 'store_type'],
+    )
+    days = settings.FORECAST_HIERARCHY_HISTORY_DAYS
+    history = pd.DataFrame.from_records(
+        realized_demand(forecast_date - timedelta(days=days), forecast_date - timedelta(days=1)),
+        columns=['store_id', 'product_id', 'history'],
+    )
+    frame = frame.merge(stores, on='store_id', how='left').merge(history, on=['store_id', 'product_id'], how='left')
+    frame['forecast'] = frame['forecast'].astype(float)
+    frame['history'] = frame['history'].fillna(0).astype(float) / days
+    return frame
+
+
+def compute_cube(forecast_date, method):
+    """ForecastAggregate field dicts for every non-bottom node of the day's cube"""
+    import numpy as np
+
+    frame = bottom_frame(forecast_date)
+    if frame.empty:
+        return []
+    nodes = []
+    for store_level, store_column in STORE_LEVELS.items():
+        for product_level, product_column in PRODUCT_LEVELS.items():
+            if store_level == 'store' and product_level == 'product':
+                continue  # the forecasts themselves
+            columns = [column for column in (store_column, product_column) if column]
+            if columns:
+                codes = frame.groupby(columns, sort=False, dropna=False).ngroup().to_numpy()
+            else:
+                codes = np.zeros(len(frame), dtype=int)
+            nodes.append((store_level, product_level, codes))
+
+    forecast = frame['forecast'].to_numpy()
+    history = frame['history'].to_numpy()
+    if method == 'mint':
+        reconciled = np.maximum(_mint(forecast, history, [codes for *_, codes in nodes]), 0)
+    else:
+        reconciled = forecast
+
+    cells = []
+    for store_level, product_level, codes in nodes:
+        groups = codes.max() + 1
+        series = np.bincount(codes, minlength=groups)
+        base = np.bincount(codes, history, minlength=groups)
+        summed_forecast = np.bincount(codes, forecast, minlength=groups)
+        demand = np.bincount(codes, reconciled, minlength=groups)
+        # each node's first row, for its key and single-valued ancestors
+        first = np.full(groups, len(codes))
+        np.minimum.at(first, codes, np.arange(len(codes)))
+        store_column, product_column = STORE_LEVELS[store_level], PRODUCT_LEVELS[product_level]
+        ancestors = ANCESTORS.get(store_level, ()) + ANCESTORS.get(product_level, ())
+        for index, row in enumerate(frame.iloc[first].itertuples(index=False)):
+            cells.append({
+                'store_level': store_level,
+                'store_key': str(getattr(row, store_column)) if store_column else 'network',
+                'product_level': product_level,
+                'product_key': str(getattr(row, product_column)) if product_column else 'all',
+                **{column: getattr(row, column) for column in ancestors},
+                'series': int(series[index]),
+                'base_demand': round(float(base[index]), 2) if base[index] > 0 else None,
+                'forecast_demand': round(float(summed_forecast[index]), 2),
+                'demand': round(float(demand[index]), 2),
+            })
+    return cells
+
+
+def _mint(forecast, history, level_codes, tolerance=1e-8, max_iterations=200):
+    """
+    Reconciled bottom forecasts b = (S' W^-1 S)^-1 S' W^-1 y with W = diag(S 1).
+
+    Rows of S are the bottom series (weight 1) and every aggregate node
+    with a base estimate (weight: its number of series); nodes without
+    recent demand have no estimate and are left out. S' W^-1 S x is
+    x plus, per level, each node's sum of x over its size, so the system
+    is solved by conjugate gradient with bincounts instead of matrices.
+    """
+    import numpy as np
+
+    levels = []
+    rhs = forecast.copy()
+    for codes in level_codes:
+        groups = codes.max() + 1
+        base = np.bincount(codes, history, minlength=groups)
+        inverse_weight = np.where(base > 0, 1.0 / np.bincount(codes, minlength=groups), 0.0)
+        levels.append((codes, groups, inverse_weight))
+        rhs += (base * inverse_weight)[codes]
+
+    def apply(x):
+        result = x.copy()
+        for codes, groups, inverse_weight in levels:
+            result += (np.bincount(codes, x, minlength=groups) * inverse_weight)[codes]
+        return result
+
+    x = forecast.copy()
+    residual = rhs - apply(x)
+    direction = residual.copy()
+    norm = residual @ residual
+    limit = tolerance ** 2 * (rhs @ rhs)
+    for _ in range(max_iterations):
+        if norm <= limit:
+            break
+        applied = apply(direction)
+        step = norm / (direction @ applied)
+        x += step * direction
+        residual -= step * applied
+        new_norm = residual @ residual
+        direction = residual + (new_norm / norm) * direction
+        norm = new_norm
+    return x
+
+
+def cube_cells(build, store_level, product_level, **ancestors):
+    """A cube's nodes at one store level x product level, optionally under a region/store_type/category"""
+    return build.cells.filter(
+        store_level=store_level, product_level=product_level,
+        **{name: value for name, value in ancestors.items() if value}
+    ).order_by('-demand')
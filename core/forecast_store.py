@@ -0,0 +1,118 @@
+"""
+Compact multi-horizon forecast storage
+
+A DemandForecast row holds one day's prediction, so a 28-day horizon for
+500 stores x 5,000 products would be 70M rows, each with a UUID, a JSON
+column and two strings. A ForecastCurve row holds a whole forecaster run
+for one store and product: the daily mean and the QUANTILES bands packed
+into one float32 blob,
+
+    [mean day 0 .. day H-1][p10 day 0 .. H-1][p50 ...][p90 ...]
+
+so the 28-day horizon is 448 bytes in a single row, and a horizon-wide
+read is one index range scan instead of 28 lookups per pair. Slicing
+decodes only the requested days of the requested series.
+
+QUANTILES fixes the blob layout: append new levels at the end, never
+reorder them, or stored curves are misread.
+"""
+import sys
+from array import array
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .agent_models import ForecastCurve
+
+
+QUANTILES = (0.1, 0.5, 0.9)
+ITEM_SIZE = array('f').itemsize
+
+CURVE_FIELDS = (
+    'store_id', 'product_id', 'run_date', 'model_version', 'confidence_score', 'horizon_days', 'points'
+)
+
+
+def pack_curve(mean, quantiles):
+    """float32 blob of the daily mean followed by each QUANTILES level's daily values"""
+    points = array('f', mean)
+    for level in QUANTILES:
+        values = quantiles[level]
+        if len(values) != len(mean):
+            raise ValueError(f'Quantile {level} has {len(values)} days, the mean has {len(mean)}')
+        points.extend(values)
+    if sys.byteorder == 'big':
+        points.byteswap()  # stored little-endian
+    return points.tobytes()
+
+
+def curve_values(points, horizon_days, quantile=None, first_day=0, days=None):
+    """Daily values of one series (the mean, or a QUANTILES level) for days first_day.. of a packed horizon"""
+    series = 0 if quantile is None else QUANTILES.index(quantile) + 1
+    first_day = max(first_day, 0)
+    last_day = horizon_days if days is None else min(first_day + days, horizon_days)
+    if first_day >= last_day:
+        return []
+    offset = series * horizon_days
+    values = array('f')
+    values.frombytes(bytes(points[(offset + first_day) * ITEM_SIZE:(offset + last_day) * ITEM_SIZE]))
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return [round(value, 2) for value in values]
+
+
+def save_curve(store, product, run_date, model_version, mean, quantiles, confidence):
+    """Store (or replace) a run's horizon for one store and product"""
+    curve, _ = ForecastCurve.objects.update_or_create(
+        store=store, product=product, run_date=run_date, model_version=model_version,
+        defaults={
+            'horizon_days': len(mean),
+            'points': pack_curve(mean, quantiles),
+            'confidence_score': confidence,
+        }
+    )
+    return curve
+
+
+def latest_curves(as_of=None, queryset=None):
+    """
+    The most recent run on or before `as_of` (default: today) for each store
+    and product in `queryset`, among the runs of the last FORECAST_HORIZON_DAYS,
+    as CURVE_FIELDS dicts (model instances cost more than decoding the curves)
+    """
+    as_of = as_of or timezone.localdate()
+    queryset = queryset if queryset is not None else ForecastCurve.objects.all()
+    queryset = queryset.filter(
+        run_date__lte=as_of,
+        run_date__gt=as_of - timedelta(days=settings.FORECAST_HORIZON_DAYS),
+    ).order_by('store_id', 'product_id', '-run_date', '-created_at')
+    if connections[queryset.db].vendor == 'postgresql':
+        return list(queryset.distinct('store_id', 'product_id').values(*CURVE_FIELDS))
+    # No DISTINCT ON elsewhere: the first row of each pair in this order is its latest run
+    curves = {}
+    for curve in queryset.values(*CURVE_FIELDS):
+        curves.setdefault((curve['store_id'], curve['product_id']), curve)
+    return list(curves.values())
+
+
+def demand_between(start, end, queryset=None, quantile=None):
+    """
+    Forecast demand for each day start..end from the latest run covering
+    `start`, per store and product; days past that run's horizon are left out
+    """
+    return [
+        {
+            'store': curve['store_id'],
+            'product': curve['product_id'],
+            'model_version': curve['model_version'],
+            'run_date': curve['run_date'],
+            'confidence_score': curve['confidence_score'],
+            'values': curve_values(
+                curve['points'], curve['horizon_days'], quantile,
+                (start - curve['run_date']).days, (end - start).days + 1
+            ),
+        }
+        for curve in latest_curves(start, queryset)
+    ]
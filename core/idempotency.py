@@ -0,0 +1,146 @@
+"""
+Idempotency keys and run leases for agent tasks
+
+A logical job (task name + arguments, or a client-supplied Idempotency-Key)
+maps to one TaskExecution row. Inserting that row - or taking over an
+expired/failed one with a conditional UPDATE - is the lease: only one run
+per key can hold it. Recent successful results are handed back to
+duplicates instead of running the job again.
+"""
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .agent_models import TaskExecution
+
+
+def idempotency_key(name, args=(), kwargs=None):
+    """Deterministic key for a job: sha256 over its name and canonical arguments"""
+    payload = json.dumps([name, list(args), kwargs or {}], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def acquire(key, task_name, lease_seconds, reuse_seconds):
+    """
+    Try to take the lease for `key`.
+
+    Returns (lease, None) when this caller should run the job - `lease` is
+    the run's start time, used to fence its release - otherwise
+    (None, execution) with the row that currently owns the key.
+    """
+    now = timezone.now()
+    lease_expires_at = now + timedelta(seconds=lease_seconds)
+    try:
+        with transaction.atomic():
+            TaskExecution.objects.create(
+                idempotency_key=key,
+                task_name=task_name,
+                lease_expires_at=lease_expires_at,
+                started_at=now,
+            )
+        return now, None
+    except IntegrityError:
+        pass
+
+    # Take over a crashed run, a failed run, or a result too old to reuse
+    taken = TaskExecution.objects.filter(idempotency_key=key).filter(
+        Q(status='running', lease_expires_at__lt=now)
+        | Q(status='failed')
+        | Q(status='completed', completed_at__lt=now - timedelta(seconds=reuse_seconds))
+    ).update(
+        status='running',
+        task_name=task_name,
+        result=None,
+        lease_expires_at=lease_expires_at,
+        started_at=now,
+        completed_at=None,
+    )
+    if taken:
+        return now, None
+    return None, TaskExecution.objects.filter(idempotency_key=key).first()
+
+
+def release(key, lease, result, succeeded=True):
+    # A run whose lease expired and was taken over must not touch the new run's row
+    TaskExecution.objects.filter(idempotency_key=key, status='running', started_at=lease).update(
+        status='completed' if succeeded else 'failed',
+        result=result,
+        completed_at=timezone.now(),
+    )
+
+
+def purge_executions(retention_hours=None):
+    """
+    Delete leases finished, or abandoned by a crashed run, more than
+    `retention_hours` (TASK_EXECUTION_RETENTION_HOURS) ago; returns how many
+    """
+    hours = settings.TASK_EXECUTION_RETENTION_HOURS if retention_hours is None else retention_hours
+    cutoff = timezone.now() - timedelta(hours=hours)
+    deleted, _ = TaskExecution.objects.filter(
+        Q(status__in=('completed', 'failed'), completed_at__lt=cutoff)
+        | Q(status='running', lease_expires_at__lt=cutoff)
+    ).delete()
+    return deleted
+
+
+def run_once(key, task_name, func, lease_seconds=600, reuse_seconds=60,
+             is_success=lambda result: True):
+    """
+    Run `func()` unless another run for `key` is in flight or finished recently.
+
+    Duplicates get the stored result of a recent run (with
+    'deduplicated': True), or a 'duplicate' status while it's still running.
+    """
+    lease, execution = acquire(key, task_name, lease_seconds, reuse_seconds)
+    if lease is None:
+        if execution is not None and execution.status == 'completed' and isinstance(execution.result, dict):
+            return {**execution.result, 'deduplicated': True}
+        return {
+            'status': 'duplicate',
+            'message': f'{task_name} is already running for this request',
+            'idempotency_key': key,
+        }
+
+    try:
+        result = func()
+    except Exception:
+        release(key, lease, None, succeeded=False)
+        raise
+    release(key, lease, result, succeeded=is_success(result))
+    return result
+
+
+def _task_succeeded(result):
+    return not (isinstance(result, dict) and result.get('status') == 'error')
+
+
+def idempotent_task(lease_seconds=600, reuse_seconds=60, key_func=None):
+    """
+    Deduplicate an agent task by its arguments.
+
+    Place it under @shared_task. `key_func(*args, **kwargs)` can return
+    extra key material (e.g. the forecast date) when the arguments alone
+    don't identify the logical job. Results with status 'error' aren't
+    reused, so a retry runs the job again.
+    """
+    def decorator(func):
+        task_name = f'{func.__module__}.{func.__name__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            extra = key_func(*args, **kwargs) if key_func else None
+            key = idempotency_key(task_name, args, {'kwargs': kwargs, 'extra': extra})
+            return run_once(
+                key, task_name, lambda: func(*args, **kwargs),
+                lease_seconds=lease_seconds,
+                reuse_seconds=reuse_seconds,
+                is_success=_task_succeeded,
+            )
+        return wrapper
+    return decorator
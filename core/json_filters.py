@@ -0,0 +1,86 @@
+"""
+Containment filters over the agents' JSON fields
+
+    GET /api/agents/inspections/?anomalies_found=spoiled_products
+    GET /api/agents/disruptions/?affected_areas=Whitefield,Koramangala
+    GET /api/agents/forecasts/?external_factors=weather:rainy,event:cricket_match
+
+A row matches when its JSON array contains every listed item, or its
+JSON object has every listed key:value pair. On PostgreSQL this is a
+single `@>` containment test, which the jsonb_path_ops GIN indexes from
+migration 0013 answer without scanning the table. SQLite has no `@>`,
+so arrays are searched with json_each() and objects compared key by key
+- slower, but the same results.
+"""
+from django.db import connections
+from django.db.models import BooleanField, F, Func, Value
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+
+class JSONArrayContains(Func):
+    """`item in array` for a JSON array column, via json_each() (SQLite fallback)"""
+    output_field = BooleanField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        array, array_params = compiler.compile(self.source_expressions[0])
+        item, item_params = compiler.compile(self.source_expressions[1])
+        return (
+            f'EXISTS (SELECT 1 FROM json_each({array}) WHERE json_each.value = {item})',
+            (*array_params, *item_params)
+        )
+
+
+def json_contains(queryset, field, value):
+    """Rows whose JSON `field` contains `value`: a list of array items, or a dict of key/values"""
+    if connections[queryset.db].features.supports_json_field_contains:
+        return queryset.filter(**{f'{field}__contains': value})
+    if isinstance(value, dict):
+        return queryset.filter(**{f'{field}__{key}': item for key, item in value.items()})
+    for item in value:
+        queryset = queryset.filter(JSONArrayContains(F(field), Value(item)))
+    return queryset
+
+
+def contains_parameter(field, example):
+    """Schema entry for a json_filter_fields query parameter"""
+    return OpenApiParameter(
+        name=field,
+        type=OpenApiTypes.STR,
+        location=OpenApiParameter.QUERY,
+        description=f'Only rows whose {field} contains all of these (comma-separated), e.g. {example}'
+    )
+
+
+class JSONContainsFilterMixin:
+    """
+    Viewset mixin filtering list-style GETs by ?<field>= for each of
+    `json_filter_fields`. Array fields take items (?anomalies_found=a,b);
+    object fields take key:value pairs (?external_factors=weather:rainy).
+    """
+    json_filter_fields = ()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = getattr(self, 'request', None)
+        if request is None or request.method not in SAFE_METHODS or getattr(self, 'detail', False):
+            return queryset
+        for field in self.json_filter_fields:
+            items = [
+                item.strip()
+                for raw in request.query_params.getlist(field)
+                for item in raw.split(',') if item.strip()
+            ]
+            if items:
+                queryset = json_contains(queryset, field, self._contains_value(queryset.model, field, items))
+        return queryset
+
+    def _contains_value(self, model, field, items):
+        if model._meta.get_field(field).default is not dict:
+            return items
+        pairs = [item.partition(':') for item in items]
+        if not all(key and sep for key, sep, _ in pairs):
+            raise ValidationError({field: 'Expected comma-separated key:value pairs, e.g. weather:rainy'})
+        return {key: value for key, _, value in pairs}
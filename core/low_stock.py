@@ -0,0 +1,107 @@
+"""
+Incremental low-stock detection
+
+LowStockItem holds exactly the inventory rows below their product's
+minimum_stock_level. Instead of scanning the whole table against a
+threshold, every stock change re-checks only the rows it touched (in the
+same transaction, under the rows' locks) and records a StockLevelEvent
+when a row crosses the minimum in either direction. The
+low_stock_events_task consumes those events, so alerting and rebalancing
+only ever look at rows that changed.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Inventory, LowStockItem, StockLevelEvent
+
+
+# Rows per SELECT when re-checking
+CHUNK_SIZE = 500
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def refresh_low_stock(inventory_ids, publish=True):
+    """
+    Re-check the given rows against their product minimums.
+
+    Rows that dropped below it join LowStockItem, rows back at or above it
+    leave, and each crossing becomes a StockLevelEvent unless `publish` is
+    False (bulk loads). Callers should hold the rows' locks. Returns the
+    number of crossings.
+    """
+    now = timezone.now()
+    crossings = 0
+    for chunk in _chunks(sorted(set(inventory_ids))):
+        rows = {
+            row['pk']: row for row in Inventory.objects.filter(pk__in=chunk).values(
+                'pk', 'store_id', 'catalog_product_id', 'quantity',
+                'catalog_product__minimum_stock_level', 'catalog_product__maximum_stock_level'
+            )
+        }
+        current = {item.inventory_id: item for item in LowStockItem.objects.filter(inventory_id__in=chunk)}
+        below = {
+            pk for pk, row in rows.items()
+            if row['catalog_product__minimum_stock_level'] is not None
+            and row['quantity'] < row['catalog_product__minimum_stock_level']
+        }
+
+        added, changed, events = [], [], []
+        for pk in below:
+            row = rows[pk]
+            item = current.get(pk)
+            values = {
+                'store_id': row['store_id'],
+                'product_id': row['catalog_product_id'],
+                'quantity': row['quantity'],
+                'minimum_stock_level': row['catalog_product__minimum_stock_level'],
+                'maximum_stock_level': row['catalog_product__maximum_stock_level'],
+            }
+            if item is None:
+                added.append(LowStockItem(inventory_id=pk, below_since=now, **values))
+                events.append(_event(pk, row, 'below_minimum', now))
+            elif any(getattr(item, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(item, field, value)
+                item.updated_at = now
+                changed.append(item)
+
+        recovered = [pk for pk in current if pk not in below]
+        for pk in recovered:
+            if pk in rows:
+                events.append(_event(pk, rows[pk], 'recovered', now))
+
+        LowStockItem.objects.bulk_create(added)
+        LowStockItem.objects.bulk_update(changed, [
+            'store_id', 'product_id', 'quantity', 'minimum_stock_level', 'maximum_stock_level', 'updated_at'
+        ])
+        if recovered:
+            LowStockItem.objects.filter(inventory_id__in=recovered).delete()
+        if publish:
+            StockLevelEvent.objects.bulk_create(events)
+        crossings += len(events)
+    return crossings
+
+
+def _event(pk, row, kind, now):
+    return StockLevelEvent(
+        inventory_id=pk,
+        store_id=row['store_id'],
+        product_id=row['catalog_product_id'],
+        kind=kind,
+        quantity=row['quantity'],
+        minimum_stock_level=row['catalog_product__minimum_stock_level'] or 0,
+        created_at=now,
+    )
+
+
+def refresh_product(product_id):
+    """Re-check every store's row of a product, e.g. after its minimum_stock_level changed"""
+    with transaction.atomic():
+        inventory_ids = list(Inventory.objects.select_for_update().filter(
+            catalog_product_id=product_id
+        ).order_by('pk').values_list('pk', flat=True))
+        return refresh_low_stock(inventory_ids)
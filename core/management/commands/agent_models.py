@@ -0,0 +1,51 @@
+"""
+Show, warm up or switch the ML models behind the agents
+
+    python manage.py agent_models
+    python manage.py agent_models --warm
+    python manage.py agent_models --activate detector=YOLOv8s
+
+--activate loads the version in this process first, so a version that
+fails to load is never activated; running workers switch to it within
+AGENT_MODEL_CHECK_SECONDS without a restart.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.model_registry import registry
+
+
+class Command(BaseCommand):
+    help = 'List the active agent model versions, load them, or activate a new version'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--warm', action='store_true', help='Load every active model and report its cost')
+        parser.add_argument('--activate', action='append', default=[], metavar='KIND=VERSION',
+                            help='Make VERSION the model every worker uses for KIND (repeatable)')
+
+    def handle(self, *args, **options):
+        for assignment in options['activate']:
+            kind, _, version = assignment.partition('=')
+            if kind not in settings.AGENT_MODEL_LOADERS or not version:
+                raise CommandError(f"Expected KIND=VERSION with KIND one of {', '.join(settings.AGENT_MODEL_LOADERS)}")
+            try:
+                registry.activate(kind, version)
+            except Exception as exc:
+                raise CommandError(f'{kind} {version} failed to load, not activated: {exc}')
+            self.stdout.write(self.style.SUCCESS(f'Activated {kind} {version}'))
+
+        if options['warm']:
+            registry.warm()
+
+        self.stdout.write('Active versions:')
+        for kind in settings.AGENT_MODEL_LOADERS:
+            self.stdout.write(f'  {kind:<12} {registry.active_version(kind)}')
+
+        stats = registry.stats()
+        if stats:
+            self.stdout.write('\nLoaded in this process:')
+            for entry in stats:
+                self.stdout.write(
+                    f"  {entry['kind']:<12} {entry['version']:<16} {entry['load_time_ms']:9.1f} ms  "
+                    f"{entry['memory_mb']:8.1f} MB"
+                )
@@ -0,0 +1,72 @@
+"""
+Move old months of agent history out of the database into Parquet files
+
+    python manage.py archive_history
+    python manage.py archive_history --older-than 6 --table core_agentmetrics
+    python manage.py archive_history --dry-run
+    python manage.py archive_history --list
+
+Archives every month before the current one and the --older-than months
+before it (default: ARCHIVE_RETENTION_MONTHS) to
+ARCHIVE_DIR/<table>/<YYYY-MM>.parquet, then drops its partition
+(core.archive). Also creates any missing upcoming
+partitions first, like the daily maintain_partitions task.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.archive import ARCHIVED_MODELS, archivable_months, archive_month, archived_months
+from core.partitioning import ensure_partitions, is_partitioned, partition_months
+
+
+class Command(BaseCommand):
+    help = 'Archive agent history months older than the retention window to Parquet files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=None, metavar='MONTHS',
+                            help='Keep the current month and this many before it (default: ARCHIVE_RETENTION_MONTHS)')
+        parser.add_argument('--table', action='append', choices=list(ARCHIVED_MODELS),
+                            help='Only archive this table (repeatable; default: all)')
+        parser.add_argument('--dry-run', action='store_true', help='Show the months that would be archived')
+        parser.add_argument('--list', action='store_true', help='Show partitions and archived months, then exit')
+
+    def handle(self, *args, **options):
+        models = [ARCHIVED_MODELS[table] for table in options['table'] or ARCHIVED_MODELS]
+        older_than = options['older_than']
+        older_than = settings.ARCHIVE_RETENTION_MONTHS if older_than is None else older_than
+        if older_than < 0:
+            raise CommandError('--older-than must not be negative')
+
+        if options['list']:
+            for model in models:
+                partitions = partition_months(model) if is_partitioned(model) else []
+                self.stdout.write(model._meta.db_table)
+                self.stdout.write(f'  partitions: {_months(partitions) if partitions else "none"}')
+                archived = archived_months(model)
+                self.stdout.write(f'  archived:   {_months(archived) if archived else "none"}')
+            return
+
+        if not options['dry_run']:
+            for name in ensure_partitions():
+                self.stdout.write(f'Created partition {name}')
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise CommandError('Archiving needs pyarrow: pip install pyarrow')
+
+        total = 0
+        for model in models:
+            for month in archivable_months(model, older_than):
+                if options['dry_run']:
+                    self.stdout.write(f'Would archive {model._meta.db_table} {month:%Y-%m}')
+                    continue
+                rows = archive_month(model, month)
+                total += rows
+                if rows:
+                    self.stdout.write(f'Archived {model._meta.db_table} {month:%Y-%m}: {rows} rows')
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'{total} rows archived to {settings.ARCHIVE_DIR}'))
+
+
+def _months(months):
+    return f'{months[0]:%Y-%m} .. {months[-1]:%Y-%m} ({len(months)})'
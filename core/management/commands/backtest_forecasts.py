@@ -0,0 +1,56 @@
+"""
+Score past forecasts against realized demand, e.g. to catch up after an outage
+
+    python manage.py backtest_forecasts
+    python manage.py backtest_forecasts --from 2025-03-01
+    python manage.py backtest_forecasts --report category
+
+Runs the same incremental backtest as the hourly beat task until every
+settled day is scored. --from discards the scores of that day onwards first
+(after changing BACKTEST_DEMAND_REASONS or correcting ledger history).
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from core.backtesting import DIMENSIONS, accuracy_report, discard_backtest, run_backtest
+
+
+class Command(BaseCommand):
+    help = 'Backtest demand forecasts against realized demand and report their accuracy'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='since', metavar='DATE',
+                            help='Recompute scores from this forecast date (YYYY-MM-DD) onwards')
+        parser.add_argument('--report', choices=list(DIMENSIONS),
+                            help='Print accuracy per store, product, category or model_version afterwards')
+        parser.add_argument('--days', type=int, default=28, help='Days covered by --report (default: 28)')
+
+    def handle(self, *args, **options):
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError('--from expects a date, e.g. 2025-03-01')
+            self.stdout.write(f'Discarded {discard_backtest(since)} scored days from {since}')
+
+        scored = 0
+        while days := run_backtest():
+            scored += len(days)
+            self.stdout.write(f'Scored {days[0].forecast_date} .. {days[-1].forecast_date}')
+        self.stdout.write(self.style.SUCCESS(f'{scored} days scored'))
+
+        if options['report']:
+            end = timezone.localdate() - timedelta(days=1)
+            start = end - timedelta(days=options['days'] - 1)
+            self.stdout.write(f"\n{options['report']:<24} {'forecasts':>9} {'WAPE':>7} {'MAPE':>7} {'bias':>7}")
+            for row in accuracy_report(options['report'], start, end):
+                self.stdout.write(
+                    f"{str(row['key']):<24} {row['forecasts']:>9} {_pct(row['wape'])} {_pct(row['mape'])} "
+                    f"{_pct(row['bias'])}"
+                )
+
+
+def _pct(value):
+    return f'{value * 100:6.1f}%' if value is not None else '      -'
@@ -0,0 +1,425 @@
+"""
+Benchmark every API route and agent task, with regression budgets
+
+Run against a dataset from generate_benchmark_data. Each route in
+core/urls.py and core/agent_urls.py is requested in-process through the
+Django test client, with query strings and bodies built from the dataset
+so every route is measured on its successful path (route_inputs); each
+agent task is called directly. Detail routes of tables the dataset
+leaves empty get one sample row first. Latency
+percentiles, throughput, query count and peak memory are written to a
+JSON baseline, and --compare fails when a later run exceeds it.
+
+    python manage.py benchmark_endpoints --output benchmarks/baseline.json
+    python manage.py benchmark_endpoints --compare benchmarks/baseline.json
+"""
+import json
+import random
+import re
+import statistics
+import time
+import tracemalloc
+import uuid
+from contextlib import ExitStack
+from datetime import timedelta
+from pathlib import Path
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, reset_queries, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver
+from django.utils import timezone
+
+from core import agent_tasks
+from core.agent_models import (
+    AgentExplanation, AgentMetrics, CortexCoordination, DemandForecast, EndpointProfile, ExternalDisruption,
+    ForecastCurve, Product, RouteOptimization, StockRebalanceAction, Store, TaskSpan, VisionInspection
+)
+from core.models import AgentLog, DeliveryRoute, Inventory, TransferLog
+
+
+BENCHMARKED_MODULES = ('core.views', 'core.agent_views')
+GROUP_PATTERN = re.compile(r'\(\?P<(\w+)>[^)]*\)')
+PLACEHOLDER_PATTERN = re.compile(r'\{(\w+)\}')
+
+# Rows run-fake-agent moves stock between
+FAKE_AGENT_STORES = ('Walmart Distribution Center - Dallas', 'Walmart Supercenter #1234')
+FAKE_AGENT_PRODUCTS = (('MILK001', 'Great Value Milk'), ('EGGS001', 'Great Value Eggs'), ('BREAD001', 'Wonder Bread'))
+
+
+def percentile(values, pct):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[pct - 1]
+
+
+def discover_routes():
+    """(method, path template, view) for every core API route, format suffixes skipped"""
+    routes = {}
+
+    def walk(patterns, prefix):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                walk(pattern.url_patterns, prefix + str(pattern.pattern))
+                continue
+            callback = pattern.callback
+            route = prefix + str(pattern.pattern)
+            if callback.__module__ not in BENCHMARKED_MODULES or 'format' in pattern.pattern.regex.groupindex:
+                continue
+
+            actions = getattr(callback, 'actions', None)
+            if actions is not None:
+                method = 'GET' if 'get' in actions else 'POST'
+            else:
+                method = 'GET' if hasattr(callback.cls, 'get') else 'POST'
+            template = '/' + GROUP_PATTERN.sub(r'{\1}', route).replace('^', '').replace('$', '')
+            routes.setdefault((method, template), callback)
+
+    walk(get_resolver().url_patterns, '')
+    return routes
+
+
+def measure_queries(func):
+    """Run func once, returning the number of queries it issued across all databases"""
+    # The debug query log is a bounded deque; start empty so counts stay exact
+    reset_queries()
+    with ExitStack() as stack:
+        contexts = [stack.enter_context(CaptureQueriesContext(connections[alias]))
+                    for alias in connections]
+        func()
+    return sum(len(context.captured_queries) for context in contexts)
+
+
+def measure_peak_memory(func):
+    """Peak Python heap allocation (KiB) while running func once"""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def rolled_back(func):
+    """Wrap func so its writes are discarded, keeping the dataset stable"""
+    def run():
+        with transaction.atomic():
+            result = func()
+            transaction.set_rollback(True)
+        return result
+    return run
+
+
+class Command(BaseCommand):
+    help = 'Benchmark API endpoints and agent tasks, write or compare against a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--only', default=None,
+                            help='Only benchmark entries whose name contains this text')
+        parser.add_argument('--skip-tasks', action='store_true')
+        parser.add_argument('--seed', type=int, default=0,
+                            help="Seed for the agents' simulated randomness, so query counts are repeatable")
+        parser.add_argument('--output', default=None, help='Write results to this JSON file')
+        parser.add_argument('--compare', default=None,
+                            help='Baseline JSON to compare against; exits non-zero on regressions')
+        parser.add_argument('--budget', type=float, default=0.25,
+                            help='Allowed relative p95/memory regression (default 0.25 = +25%%)')
+        parser.add_argument('--slack-ms', type=float, default=5.0,
+                            help='Absolute p95 slack so tiny endpoints do not flap')
+
+    def handle(self, *args, **options):
+        self.iterations = options['iterations']
+        self.warmup = options['warmup']
+        self.budget = options['budget']
+        self.seed = options['seed']
+        self.client = Client(HTTP_HOST='localhost')
+
+        results = {
+            'meta': {
+                'generated_at': timezone.now().isoformat(),
+                'iterations': self.iterations,
+                'database': connections['default'].vendor,
+                'row_counts': {
+                    'stores': Store.objects.count(),
+                    'products': Product.objects.count(),
+                },
+            },
+            'endpoints': {},
+            'tasks': {},
+        }
+
+        if not Store.objects.exists() or not Product.objects.exists():
+            raise CommandError('No stores or products to benchmark against; run generate_benchmark_data first')
+        inputs = self._route_inputs()
+        for (method, template), callback in sorted(discover_routes().items(), key=lambda item: item[0][1]):
+            name = f'{method} {template}'
+            if options['only'] and options['only'] not in name:
+                continue
+            path = self._resolve_path(template, callback)
+            params, body = inputs.get((method, template), ({}, None))
+            if params:
+                path = f'{path}?{urlencode(params)}'
+            request = lambda method=method, path=path, body=body: self._request(method, path, body)
+            if method != 'GET':
+                request = rolled_back(request)
+            results['endpoints'][name] = self._benchmark(name, request)
+
+        if not options['skip_tasks']:
+            for name, call in self._task_calls():
+                if options['only'] and options['only'] not in name:
+                    continue
+                results['tasks'][name] = self._benchmark(name, rolled_back(call))
+
+        if options['output']:
+            output = Path(options['output'])
+            output.parent.mkdir(parents=True, exist_ok=True)
+            output.write_text(json.dumps(results, indent=2, sort_keys=True))
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {output}'))
+
+        if options['compare']:
+            baseline = json.loads(Path(options['compare']).read_text())
+            failures = self._compare(results, baseline, options['slack_ms'])
+            if failures:
+                for failure in failures:
+                    self.stdout.write(self.style.ERROR(f'REGRESSION {failure}'))
+                raise CommandError(f'{len(failures)} benchmark regression(s) over budget')
+            self.stdout.write(self.style.SUCCESS('All benchmarks within budget'))
+
+    def _resolve_path(self, template, callback):
+        """Fill in {pk} with an object of the viewset's model, creating a sample one if there is none"""
+        kwargs = {}
+        for group in PLACEHOLDER_PATTERN.findall(template):
+            if group != 'pk':
+                raise CommandError(f'No value for {{{group}}} in {template}')
+            kwargs['pk'] = self._sample_pk(callback.cls.queryset.model)
+        return PLACEHOLDER_PATTERN.sub(lambda match: str(kwargs[match.group(1)]), template)
+
+    def _sample_pk(self, model):
+        pk = model.objects.order_by('pk').values_list('pk', flat=True).first()
+        if pk is None:
+            pk = self._create_sample(model).pk
+            self.stdout.write(self.style.WARNING(f'Created a sample {model.__name__} to fetch'))
+        return pk
+
+    def _create_sample(self, model):
+        """One row of a table the dataset left empty, for its detail routes"""
+        store = Store.objects.order_by('pk').first()
+        other = Store.objects.exclude(pk=store.pk).order_by('pk').first() or store
+        product = Product.objects.order_by('pk').first()
+        now = timezone.now()
+        if model is Inventory:
+            row = Inventory(product_id=product.product_id, product_name=product.name,
+                            store_location=store.name, quantity=100)
+            row.save()
+            return row
+        if model is TransferLog:
+            return TransferLog.objects.create(from_store=store.name, to_store=other.name, quantity=1,
+                                              product_id=self._sample_pk(Inventory), reason='Benchmark')
+        if model is RouteOptimization:
+            return RouteOptimization.objects.create(
+                rebalance_action_id=self._sample_pk(StockRebalanceAction), start_location=store, end_location=other,
+                total_distance_km=12.5, estimated_duration_hours=0.5, estimated_cost=180,
+            )
+        if model is TaskSpan:
+            return TaskSpan.objects.create(
+                trace_id=uuid.uuid4(), coordination_id=self._sample_pk(CortexCoordination),
+                task_name='core.agent_tasks.cortex_manager_task', agent_name='CortexManager', status='success',
+                started_at=now, wall_time_ms=10, db_time_ms=2, query_count=3,
+            )
+        samples = {
+            Store: lambda: Store.objects.create(store_id='BENCH001', name='Benchmark Store', location='Benchmark',
+                                                store_type='store'),
+            DemandForecast: lambda: DemandForecast.objects.create(
+                store=store, product=product, forecast_date=now.date(), predicted_demand=10, confidence_score=0.8),
+            StockRebalanceAction: lambda: StockRebalanceAction.objects.create(
+                source_store=other, target_store=store, product=product, quantity=10, urgency='low',
+                reason='Benchmark', status='completed'),
+            ExternalDisruption: lambda: ExternalDisruption.objects.create(
+                event_type='traffic', title='Benchmark congestion', description='Slow traffic', severity='medium',
+                start_time=now, end_time=now + timedelta(hours=2), affected_areas=[store.location],
+                data_source='benchmark'),
+            VisionInspection: lambda: VisionInspection.objects.create(
+                store=store, image_path='/benchmarks/shelf.jpg', inspection_type='shelf_stock'),
+            AgentExplanation: lambda: AgentExplanation.objects.create(
+                query='Why was this rebalance triggered?', explanation_text='Forecast demand exceeded stock.'),
+            CortexCoordination: lambda: CortexCoordination.objects.create(
+                event_type='system_health_check', priority='low', status='completed'),
+            AgentMetrics: lambda: AgentMetrics.objects.create(
+                agent_name='InventoryAgent', metric_type='accuracy', metric_value=0.9, unit='%'),
+            EndpointProfile: lambda: EndpointProfile.objects.create(
+                method='GET', route='api/agents/stores/', date=now.date(), request_count=1, total_time_ms=5),
+            DeliveryRoute: lambda: DeliveryRoute.objects.create(
+                route_id='benchmark', start_point=other.name, end_point=store.name, eta=now + timedelta(hours=2),
+                status='scheduled'),
+            AgentLog: lambda: AgentLog.objects.create(agent_name='Benchmark', action='Sample log entry'),
+        }
+        if model not in samples:
+            raise CommandError(f'No sample {model.__name__} to benchmark its detail routes with')
+        return samples[model]()
+
+    def _route_inputs(self):
+        """(query params, JSON body) per route that needs input, taken from the dataset"""
+        today = timezone.localdate()
+        row = Inventory.objects.filter(quantity__gt=0).order_by('pk').first() or Inventory.objects.get(
+            pk=self._sample_pk(Inventory))
+        store = row.store or Store.objects.order_by('pk').first()
+        destination = Store.objects.exclude(pk=row.store_id).order_by('pk').first()
+        product = row.catalog_product or Product.objects.order_by('pk').first()
+        curve = ForecastCurve.objects.order_by('pk').values('store_id', 'product_id').first() or {
+            'store_id': store.pk, 'product_id': product.pk}
+        self._prepare_fake_agent()
+
+        inputs = {
+            ('GET', '/api/search/'): ({'q': 'forecast demand'}, None),
+            ('GET', '/api/inventory/stock_at/'): ({'store': store.pk}, None),
+            ('GET', '/api/agents/forecasts/horizon/'): (
+                {'store': curve['store_id'], 'product': curve['product_id'], 'days': 7}, None),
+            ('GET', '/api/agents/metrics/history/'): ({'start': today - timedelta(days=30), 'end': today}, None),
+            ('POST', '/api/agents/rebalances/transition/'): (
+                {}, {'status': 'approved', 'filter': {'status': 'pending'}}),
+            ('POST', '/api/agents/route-optimizations/transition/'): (
+                {}, {'status': 'delayed', 'filter': {'route_status': 'active'}}),
+            # A date past the dataset, so the writes are inserts
+            ('POST', '/api/agents/forecasts/bulk/'): ({}, [
+                {'store': store.pk, 'product': product.pk, 'forecast_date': today + timedelta(days=400 + offset),
+                 'predicted_demand': 20, 'confidence_score': 0.8}
+                for offset in range(50)
+            ]),
+            ('POST', '/api/agents/metrics/bulk/'): ({}, [
+                {'agent_name': 'InventoryAgent', 'metric_type': 'accuracy', 'metric_value': 0.9, 'unit': '%'}
+                for _ in range(50)
+            ]),
+            ('POST', '/api/agents/inspections/bulk/'): ({}, [
+                {'store': store.pk, 'image_path': f'/benchmarks/shelf-{offset}.jpg', 'inspection_type': 'shelf_stock'}
+                for offset in range(50)
+            ]),
+            ('POST', '/api/inventory/bulk/'): ({'upsert': 'true'}, [
+                {'product_id': row.product_id, 'product_name': row.product_name,
+                 'store_location': row.store_location, 'quantity': row.quantity + 1},
+            ]),
+        }
+        if destination is not None:
+            inputs[('POST', '/api/transfers/batch/')] = ({}, [
+                {'product_id': row.product_id, 'from_store': row.store_location, 'to_store': destination.name,
+                 'quantity': 1, 'reason': 'Benchmark'},
+            ])
+        return inputs
+
+    def _prepare_fake_agent(self):
+        """The Walmart rows run-fake-agent moves stock between"""
+        for product_id, product_name in FAKE_AGENT_PRODUCTS:
+            for location in FAKE_AGENT_STORES:
+                if not Inventory.objects.filter(product_name=product_name, store_location=location).exists():
+                    Inventory(product_id=product_id, product_name=product_name, store_location=location,
+                              quantity=1000).save()
+
+    def _request(self, method, path, body=None):
+        if body is None:
+            response = self.client.generic(method, path)
+        else:
+            response = self.client.generic(method, path, json.dumps(body, default=str),
+                                           content_type='application/json')
+        if response.status_code >= 400:
+            raise CommandError(f'{method} {path} returned {response.status_code}: {response.content[:200]!r}')
+        return response
+
+    def _task_calls(self):
+        """Direct calls of each agent task with arguments taken from the dataset"""
+        store = Store.objects.filter(store_type='store').first() or Store.objects.first()
+        # A product without today's forecast, so the forecast insert doesn't conflict
+        product = Product.objects.exclude(id__in=DemandForecast.objects.filter(
+            store=store, forecast_date=timezone.now().date()
+        ).values('product_id')).first()
+        rebalance = StockRebalanceAction.objects.first()
+        calls = [
+            ('rebalancer_agent_task', lambda: agent_tasks.rebalancer_agent_task()),
+            ('delay_monitor_agent_task', lambda: agent_tasks.delay_monitor_agent_task()),
+            ('explainer_agent_task', lambda: agent_tasks.explainer_agent_task(
+                'Why was this rebalance triggered?', {'rebalance': 'benchmark'})),
+            ('cortex_manager_task', lambda: agent_tasks.cortex_manager_task(
+                'system_health_check', ['InventoryAgent', 'RoutePlannerAgent'], {})),
+            ('periodic_system_health_check', lambda: agent_tasks.periodic_system_health_check()),
+        ]
+        if store and product:
+            calls.append(('inventory_agent_forecast_task',
+                          lambda: agent_tasks.inventory_agent_forecast_task(store.id, product.id)))
+        if store:
+            calls.append(('vision_inspector_agent_task',
+                          lambda: agent_tasks.vision_inspector_agent_task(store.id, '/benchmarks/shelf.jpg')))
+        if rebalance:
+            calls.append(('route_planner_agent_task',
+                          lambda: agent_tasks.route_planner_agent_task(rebalance.id)))
+        calls += [
+            ('low_stock_events_task', lambda: agent_tasks.low_stock_events_task()),
+            ('periodic_stock_snapshot', lambda: agent_tasks.periodic_stock_snapshot()),
+            ('periodic_forecast_backtest', lambda: agent_tasks.periodic_forecast_backtest()),
+            ('periodic_forecast_cube', lambda: agent_tasks.periodic_forecast_cube()),
+            ('purge_task_executions', lambda: agent_tasks.purge_task_executions()),
+            ('maintain_partitions', lambda: agent_tasks.maintain_partitions()),
+        ]
+        return calls
+
+    def _benchmark(self, name, func):
+        try:
+            for _ in range(self.warmup):
+                func()
+
+            timings = []
+            started = time.perf_counter()
+            for _ in range(self.iterations):
+                call_started = time.perf_counter()
+                func()
+                timings.append((time.perf_counter() - call_started) * 1000)
+            elapsed = time.perf_counter() - started
+
+            random.seed(self.seed)
+            queries = measure_queries(func)
+            peak_memory_kb = measure_peak_memory(func)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'{name}: failed ({e})'))
+            return {'error': str(e), 'budget': self.budget}
+
+        timings.sort()
+        result = {
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(statistics.fmean(timings), 3),
+            'throughput_rps': round(self.iterations / elapsed, 2),
+            'queries': queries,
+            'peak_memory_kb': round(peak_memory_kb, 1),
+            'budget': self.budget,
+        }
+        self.stdout.write(
+            f"{name}: p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms, "
+            f"{result['throughput_rps']:.0f} req/s, {queries} queries, {result['peak_memory_kb']:.0f} KiB"
+        )
+        return result
+
+    def _compare(self, results, baseline, slack_ms):
+        """Regressions of p95 latency, query count or peak memory beyond each entry's budget"""
+        failures = []
+        for section in ('endpoints', 'tasks'):
+            for name, base in baseline.get(section, {}).items():
+                current = results[section].get(name)
+                if current is None or 'error' in base:
+                    continue
+                if 'error' in current:
+                    failures.append(f"{name}: failed ({current['error']})")
+                    continue
+                budget = base.get('budget', self.budget)
+                p95_limit = base['p95_ms'] * (1 + budget) + slack_ms
+                if current['p95_ms'] > p95_limit:
+                    failures.append(f"{name}: p95 {current['p95_ms']:.1f} ms > {p95_limit:.1f} ms")
+                if current['queries'] > base['queries']:
+                    failures.append(f"{name}: {current['queries']} queries > {base['queries']}")
+                memory_limit = base['peak_memory_kb'] * (1 + budget) + 64
+                if current['peak_memory_kb'] > memory_limit:
+                    failures.append(
+                        f"{name}: peak memory {current['peak_memory_kb']:.0f} KiB > {memory_limit:.0f} KiB"
+                    )
+        return failures
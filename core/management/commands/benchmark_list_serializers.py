@@ -0,0 +1,97 @@
+"""
+Rows/sec of the values() fast path against the regular serializers
+
+For each large listing, one page of --rows rows is serialized and
+rendered twice: ModelSerializer + JSONRenderer, and ValuesSerializer +
+ORJSONRenderer. Serializing includes the queries, so the regular path
+pays for its per-row related lookups. The two outputs must be
+byte-identical or the command fails.
+
+    python manage.py benchmark_list_serializers --rows 10000
+"""
+import json
+import statistics
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from core.agent_views import AgentMetricsViewSet, DemandForecastViewSet
+from core.renderers import ORJSONRenderer
+from core.values_serializers import values_serializer
+from core.views import TransferLogViewSet
+
+
+VIEWSETS = {
+    'AgentMetrics': AgentMetricsViewSet,
+    'DemandForecast': DemandForecastViewSet,
+    'TransferLog': TransferLogViewSet,
+}
+
+
+def timed(func, iterations):
+    """(median seconds per call, last result)"""
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), result
+
+
+class Command(BaseCommand):
+    help = 'Benchmark rows/sec of the values() list fast path against the regular serializers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Rows per page (default 10,000)')
+        parser.add_argument('--iterations', type=int, default=5)
+        parser.add_argument('--output', default=None, help='Write results to this JSON file')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        iterations = options['iterations']
+        results = {'meta': {'generated_at': timezone.now().isoformat(), 'rows': rows, 'iterations': iterations}}
+
+        for name, viewset in VIEWSETS.items():
+            serializer_class = viewset.serializer_class
+            queryset = viewset.queryset.order_by('pk')[:rows]
+            count = queryset.count()
+            if not count:
+                self.stdout.write(self.style.WARNING(f'{name}: skipped (no rows)'))
+                continue
+            compiled = values_serializer(serializer_class())
+
+            regular_serialize, data = timed(lambda: serializer_class(queryset, many=True).data, iterations)
+            regular_render, regular = timed(lambda: JSONRenderer().render(data), iterations)
+            fast_serialize, data = timed(lambda: compiled.rows(queryset), iterations)
+            fast_render, fast = timed(lambda: ORJSONRenderer().render(data), iterations)
+            if fast != regular:
+                raise CommandError(f'{name}: fast path output differs from {serializer_class.__name__}')
+
+            regular_total = regular_serialize + regular_render
+            fast_total = fast_serialize + fast_render
+            results[name] = {
+                'rows': count,
+                'regular_rows_per_sec': round(count / regular_total),
+                'fast_rows_per_sec': round(count / fast_total),
+                'regular_serialize_ms': round(regular_serialize * 1000, 1),
+                'regular_render_ms': round(regular_render * 1000, 1),
+                'fast_serialize_ms': round(fast_serialize * 1000, 1),
+                'fast_render_ms': round(fast_render * 1000, 1),
+                'speedup': round(regular_total / fast_total, 1),
+                'bytes': len(fast),
+            }
+            self.stdout.write(
+                f"{name} ({count} rows): {results[name]['regular_rows_per_sec']:,} -> "
+                f"{results[name]['fast_rows_per_sec']:,} rows/s ({results[name]['speedup']}x); "
+                f"serialize {results[name]['regular_serialize_ms']} -> {results[name]['fast_serialize_ms']} ms, "
+                f"render {results[name]['regular_render_ms']} -> {results[name]['fast_render_ms']} ms"
+            )
+
+        if options['output']:
+            output = Path(options['output'])
+            output.parent.mkdir(parents=True, exist_ok=True)
+            output.write_text(json.dumps(results, indent=2, sort_keys=True))
+            self.stdout.write(self.style.SUCCESS(f'Results written to {output}'))
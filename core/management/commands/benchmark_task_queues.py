@@ -0,0 +1,89 @@
+"""
+Measure critical-path agent latency under a mixed Celery load
+
+Requires a running broker and workers, e.g. the per-queue worker layout
+from the README, or a single `celery -A agentx worker -Q default` when
+comparing against the old shared-queue setup with --single-queue.
+"""
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.agent_models import Store
+from core.agent_tasks import (
+    cortex_manager_task, explainer_agent_task, vision_inspector_agent_task
+)
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[pct - 1]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark critical-path task latency while vision/LLM tasks flood the workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--background', type=int, default=200,
+                            help='Number of slow vision + explainer tasks to enqueue first')
+        parser.add_argument('--critical', type=int, default=20,
+                            help='Number of cortex manager tasks to enqueue behind them')
+        parser.add_argument('--interval', type=float, default=0.1,
+                            help='Seconds between critical task submissions')
+        parser.add_argument('--timeout', type=float, default=300.0,
+                            help='Give up waiting for results after this many seconds')
+        parser.add_argument('--single-queue', action='store_true',
+                            help="Send everything to the 'default' queue (pre-routing baseline)")
+
+    def handle(self, *args, **options):
+        store = Store.objects.first()
+        if store is None:
+            raise CommandError('No stores found - run setup_demo_data first')
+
+        route = {'queue': 'default'} if options['single_queue'] else {}
+
+        background = []
+        for i in range(options['background']):
+            if i % 2:
+                background.append(vision_inspector_agent_task.apply_async(
+                    (store.id, f'/benchmarks/shelf_{i:05d}.jpg'), **route))
+            else:
+                background.append(explainer_agent_task.apply_async(
+                    (f'Benchmark query {i}', {'inventory': i}), **route))
+
+        critical = []
+        for i in range(options['critical']):
+            result = cortex_manager_task.apply_async(
+                ('system_health_check', ['RoutePlannerAgent'], {'priority': 'high', 'benchmark': i}),
+                **route
+            )
+            critical.append((time.perf_counter(), result))
+            time.sleep(options['interval'])
+
+        latencies = self._wait_for(critical, options['timeout'])
+        bg_done = sum(1 for result in background if result.ready())
+
+        self.stdout.write(f"Layout: {'single default queue' if options['single_queue'] else 'per-agent queues'}")
+        self.stdout.write(f"Critical tasks completed: {len(latencies)}/{len(critical)}")
+        if latencies:
+            self.stdout.write(f"  p50: {percentile(latencies, 50) * 1000:.0f} ms")
+            self.stdout.write(f"  p95: {percentile(latencies, 95) * 1000:.0f} ms")
+            self.stdout.write(f"  max: {max(latencies) * 1000:.0f} ms")
+        self.stdout.write(f"Background tasks finished by then: {bg_done}/{len(background)}")
+
+    def _wait_for(self, submitted, timeout):
+        """Poll until every critical task is done, return enqueue->done seconds"""
+        pending = dict(enumerate(submitted))
+        latencies = []
+        deadline = time.perf_counter() + timeout
+        while pending and time.perf_counter() < deadline:
+            for key, (enqueued_at, result) in list(pending.items()):
+                if result.ready():
+                    latencies.append(time.perf_counter() - enqueued_at)
+                    del pending[key]
+            time.sleep(0.01)
+        return sorted(latencies)
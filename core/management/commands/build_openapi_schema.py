@@ -0,0 +1,32 @@
+"""
+Precompute the OpenAPI schema served by /api/schema/
+
+Run at build time (e.g. next to collectstatic) so web processes load the
+schema from the artifact instead of generating it on their first request.
+
+    python manage.py build_openapi_schema
+"""
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from core.schema import write_schema_artifact
+
+
+class Command(BaseCommand):
+    help = "Generate the OpenAPI schema into the code revision's artifact (OPENAPI_SCHEMA_DIR)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None, help='Write here instead of OPENAPI_SCHEMA_DIR')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            path = write_schema_artifact(options['output'])
+        except ImproperlyConfigured as exc:
+            raise CommandError(f'{exc}, or pass --output')
+        self.stdout.write(self.style.SUCCESS(
+            f'Schema written to {path} ({path.stat().st_size / 1024:.0f} KiB) '
+            f'in {time.perf_counter() - started:.1f}s'
+        ))
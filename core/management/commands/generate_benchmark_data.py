@@ -0,0 +1,612 @@
+"""
+Generate a production-scale synthetic dataset for performance testing
+
+Unlike setup_demo_data/seed_demo_data (a handful of rows, one query per
+row), this writes thousands of geolocated stores, tens of thousands of
+products and months of forecasts, metrics, rebalances, routes and
+transfers in batches. Parent tables go through bulk_create (ids are
+needed for foreign keys); the high-volume leaf tables are streamed with
+COPY on PostgreSQL and bulk_create elsewhere. The stock ledger is
+generated so its entries sum to each row's Inventory.quantity, with daily
+snapshots on top, and each row's stock is split into expiry-dated lots. Output is fully determined by --seed and --end-date.
+"""
+import csv
+import io
+import itertools
+import json
+import math
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from statistics import NormalDist
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.agent_models import (
+    Store, Product, DemandForecast, ForecastCurve, StockRebalanceAction,
+    RouteOptimization, ExternalDisruption, VisionInspection,
+    AgentExplanation, CortexCoordination, AgentMetrics
+)
+from core.forecast_store import QUANTILES, pack_curve
+from core.low_stock import refresh_low_stock
+from core.models import (
+    Inventory, LowStockItem, StockLedgerEntry, StockLevelEvent, StockLot, StockSnapshot, TransferLog
+)
+from core.stock_ledger import take_snapshots
+
+
+# stores, products, products stocked per store, days of history,
+# rebalances, metrics, stock ledger entries. 'large' is ~12M rows in total.
+PRESETS = {
+    'small': {'stores': 50, 'products': 500, 'assortment': 20, 'days': 14,
+              'rebalances': 2000, 'metrics': 10000, 'ledger': 20000},
+    'medium': {'stores': 500, 'products': 5000, 'assortment': 40, 'days': 30,
+               'rebalances': 20000, 'metrics': 100000, 'ledger': 200000},
+    'large': {'stores': 2000, 'products': 20000, 'assortment': 50, 'days': 90,
+              'rebalances': 200000, 'metrics': 300000, 'ledger': 2000000},
+}
+
+CITIES = [
+    ('Bangalore', 12.9716, 77.5946),
+    ('Mumbai', 19.0760, 72.8777),
+    ('Delhi', 28.7041, 77.1025),
+    ('Chennai', 13.0827, 80.2707),
+    ('Hyderabad', 17.3850, 78.4867),
+    ('Pune', 18.5204, 73.8567),
+    ('Kolkata', 22.5726, 88.3639),
+    ('Ahmedabad', 23.0225, 72.5714),
+]
+
+STORE_TYPES = [
+    ('store', 0.85, (300, 800)),
+    ('warehouse', 0.07, (5000, 20000)),
+    ('fulfillment_center', 0.05, (2000, 8000)),
+    ('distribution_center', 0.03, (3000, 10000)),
+]
+
+# category: (shelf life range in days, unit price range, unit weight range)
+CATEGORIES = {
+    'Dairy': ((2, 14), (30, 400), (0.2, 2.0)),
+    'Bakery': ((2, 5), (20, 250), (0.1, 1.0)),
+    'Produce': ((3, 10), (10, 300), (0.1, 5.0)),
+    'Grains': ((180, 365), (40, 900), (0.5, 25.0)),
+    'Snacks': ((60, 180), (10, 200), (0.05, 1.0)),
+    'Beverages': ((180, 730), (20, 600), (0.2, 2.5)),
+    'Essentials': ((180, 365), (30, 700), (0.2, 5.0)),
+    'Frozen': ((90, 365), (80, 800), (0.3, 2.0)),
+    'Personal Care': ((365, 1095), (25, 900), (0.05, 1.0)),
+}
+
+AGENT_METRICS = [
+    ('InventoryAgent', 'response_time', 'ms', (200, 500)),
+    ('RebalancerAgent', 'throughput', 'actions', (0, 40)),
+    ('RoutePlannerAgent', 'response_time', 'ms', (800, 1500)),
+    ('DelayMonitorAgent', 'throughput', 'disruptions', (0, 2)),
+    ('VisionInspectorAgent', 'response_time', 'ms', (1500, 3000)),
+    ('ExplainerAgent', 'response_time', 'ms', (1500, 3500)),
+    ('CortexManager', 'response_time', 'ms', (100, 300)),
+    ('InventoryAgent', 'success_rate', '%', (95, 100)),
+    ('RoutePlannerAgent', 'error_rate', '%', (0, 3)),
+]
+
+REBALANCE_STATUSES = [
+    ('completed', 0.70), ('rejected', 0.10), ('in_progress', 0.07),
+    ('approved', 0.06), ('pending', 0.07),
+]
+
+URGENCIES = [('low', 0.3), ('medium', 0.45), ('high', 0.2), ('critical', 0.05)]
+
+SYNTHETIC_TABLES = [
+    RouteOptimization, StockRebalanceAction, DemandForecast, ForecastCurve, VisionInspection,
+    AgentExplanation, CortexCoordination, AgentMetrics, ExternalDisruption,
+    StockSnapshot, StockLedgerEntry, StockLot, LowStockItem, StockLevelEvent, TransferLog, Inventory,
+    Store, Product,
+]
+
+
+def weighted_choice(rng, options):
+    roll = rng.random()
+    for value, weight, *rest in options:
+        roll -= weight
+        if roll <= 0:
+            return (value, *rest) if rest else value
+    last = options[-1]
+    return (last[0], *last[2:]) if len(last) > 2 else last[0]
+
+
+def seeded_uuid(rng):
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
+
+
+def copy_value(value):
+    """Format a Python value for COPY ... FORMAT csv"""
+    if value is None:
+        return None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, bytes):
+        return '\\x' + value.hex()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+@contextmanager
+def explicit_timestamps(model):
+    """Let bulk_create keep the historical created_at/timestamp values we set"""
+    fields = [f for f in model._meta.concrete_fields if getattr(f, 'auto_now_add', False)]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = 'Generate a large, reproducible synthetic dataset for performance tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(PRESETS), default='small',
+                            help="Dataset size preset ('large' is ~10M rows)")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--end-date', type=date.fromisoformat, default=None,
+                            help='Last day of generated history (default: today)')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--flush', action='store_true',
+                            help='Delete all existing agent and inventory data first')
+        for key in PRESETS['small']:
+            parser.add_argument(f'--{key}', type=int, default=None,
+                                help=f'Override the preset {key} count')
+
+    def handle(self, *args, **options):
+        self.config = dict(PRESETS[options['scale']])
+        for key in self.config:
+            if options[key] is not None:
+                self.config[key] = options[key]
+        self.seed = options['seed']
+        self.batch_size = options['batch_size']
+        self.end_date = options['end_date'] or date.today()
+        self.use_copy = connection.vendor == 'postgresql'
+        self.totals = {}
+
+        if self.config['assortment'] > self.config['products']:
+            raise CommandError('--assortment cannot exceed --products')
+
+        if options['flush']:
+            self._flush()
+        elif Store.objects.filter(store_id__startswith='BS').exists():
+            raise CommandError('Synthetic data already present - rerun with --flush')
+
+        started = time.perf_counter()
+        self.stdout.write(
+            f"Generating '{options['scale']}' dataset (seed={self.seed}, "
+            f"{'COPY' if self.use_copy else 'bulk_create'} writes)..."
+        )
+
+        stores = self._generate_stores()
+        products = self._generate_products()
+        assortments = self._generate_assortments(stores, products)
+        inventory = self._generate_inventory(stores, products, assortments)
+        self._generate_lots(inventory)
+        self._generate_low_stock(inventory)
+        self._generate_forecasts(stores, products, assortments)
+        self._generate_forecast_curves(stores, products, assortments)
+        rebalances = self._generate_rebalances(stores, products, assortments)
+        self._generate_routes(rebalances)
+        self._generate_transfers(rebalances, inventory)
+        self._generate_metrics()
+        self._generate_ledger(inventory)
+        self._generate_snapshots()
+
+        elapsed = time.perf_counter() - started
+        total_rows = sum(self.totals.values())
+        for table, count in self.totals.items():
+            self.stdout.write(f'  {table}: {count:,} rows')
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {total_rows:,} rows in {elapsed:.1f}s ({total_rows / elapsed:,.0f} rows/s)'
+        ))
+
+    # Writers
+
+    def _flush(self):
+        self.stdout.write('Flushing existing data...')
+        if self.use_copy:
+            tables = ', '.join(connection.ops.quote_name(m._meta.db_table) for m in SYNTHETIC_TABLES)
+            with connection.cursor() as cursor:
+                cursor.execute(f'TRUNCATE {tables} RESTART IDENTITY CASCADE')
+        else:
+            for model in SYNTHETIC_TABLES:
+                model.objects.all().delete()
+
+    def _bulk_create(self, model, objects):
+        """Insert parent rows in batches and return them with primary keys set"""
+        with explicit_timestamps(model), transaction.atomic():
+            created = model.objects.bulk_create(objects, batch_size=self.batch_size)
+        self._count(model, len(created))
+        return created
+
+    def _stream(self, model, fields, rows):
+        """Write an iterator of row tuples (in `fields` order) in batches"""
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self._write_batch(model, fields, batch)
+                batch = []
+        if batch:
+            self._write_batch(model, fields, batch)
+
+    def _write_batch(self, model, fields, batch):
+        if self.use_copy:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in batch:
+                writer.writerow([copy_value(value) for value in row])
+            buffer.seek(0)
+            columns = ', '.join(
+                connection.ops.quote_name(model._meta.get_field(name).column) for name in fields
+            )
+            with connection.cursor() as cursor:
+                cursor.copy_expert(
+                    f'COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) '
+                    f'FROM STDIN WITH (FORMAT csv)',
+                    buffer
+                )
+        else:
+            objects = [model(**dict(zip(fields, row))) for row in batch]
+            with explicit_timestamps(model), transaction.atomic():
+                model.objects.bulk_create(objects, batch_size=self.batch_size)
+        self._count(model, len(batch))
+
+    def _count(self, model, rows):
+        name = model.__name__
+        self.totals[name] = self.totals.get(name, 0) + rows
+
+    def _rng(self, table):
+        # One stream per table so changing one table's size doesn't reshuffle the others
+        return random.Random(f'{self.seed}:{table}')
+
+    def _timestamp(self, rng, day_offset=None):
+        """Random moment within the history window (or on a given day offset)"""
+        if day_offset is None:
+            day_offset = rng.randrange(self.config['days'])
+        day = self.end_date - timedelta(days=day_offset)
+        moment = datetime.combine(day, dt_time(0, 0), tzinfo=dt_timezone.utc)
+        return moment + timedelta(seconds=rng.randrange(86400))
+
+    # Generators
+
+    def _generate_stores(self):
+        rng = self._rng('stores')
+        stores = []
+        for n in range(1, self.config['stores'] + 1):
+            city, lat, lon = CITIES[rng.randrange(len(CITIES))]
+            store_type, capacity_range = weighted_choice(rng, STORE_TYPES)
+            stores.append(Store(
+                store_id=f'BS{n:05d}',
+                name=f'{city} {store_type.replace("_", " ").title()} {n}',
+                location=f'{city} Zone {n}',
+                store_type=store_type,
+                latitude=round(rng.gauss(lat, 0.08), 6),
+                longitude=round(rng.gauss(lon, 0.08), 6),
+                capacity=rng.randint(*capacity_range),
+                created_at=self._timestamp(rng, self.config['days'] - 1),
+            ))
+        return self._bulk_create(Store, stores)
+
+    def _generate_products(self):
+        rng = self._rng('products')
+        categories = list(CATEGORIES.items())
+        products = []
+        for n in range(1, self.config['products'] + 1):
+            category, (shelf_life, price, weight) = categories[rng.randrange(len(categories))]
+            minimum = rng.randint(5, 40)
+            products.append(Product(
+                product_id=f'BP{n:06d}',
+                name=f'{category} Item {n}',
+                category=category,
+                unit_price=Decimal(f'{rng.uniform(*price):.2f}'),
+                unit_weight=round(rng.uniform(*weight), 2),
+                shelf_life_days=rng.randint(*shelf_life),
+                minimum_stock_level=minimum,
+                maximum_stock_level=minimum * rng.randint(4, 10),
+                created_at=self._timestamp(rng, self.config['days'] - 1),
+            ))
+        return self._bulk_create(Product, products)
+
+    def _generate_assortments(self, stores, products):
+        """Pick the products each store carries, favouring popular ones"""
+        rng = self._rng('assortments')
+        # Zipf-like popularity: low product indexes are stocked far more often
+        cum_weights = list(itertools.accumulate(1.0 / (i + 1) ** 0.8 for i in range(len(products))))
+        size = self.config['assortment']
+        assortments = {}
+        for store in stores:
+            chosen = set()
+            while len(chosen) < size:
+                chosen.update(rng.choices(range(len(products)), cum_weights=cum_weights, k=size - len(chosen)))
+            assortments[store.id] = sorted(chosen)
+        return assortments
+
+    def _generate_inventory(self, stores, products, assortments):
+        rng = self._rng('inventory')
+        inventory = []
+        for store in stores:
+            low, high = (500, 2000) if store.store_type != 'store' else (0, 120)
+            for index in assortments[store.id]:
+                product = products[index]
+                inventory.append(Inventory(
+                    product_id=product.product_id,
+                    product_name=product.name,
+                    store_location=store.location,
+                    store=store,
+                    catalog_product=product,
+                    quantity=rng.randint(low, high),
+                    expiry_date=self.end_date + timedelta(days=rng.randint(0, product.shelf_life_days)),
+                    last_updated=self._timestamp(rng, rng.randrange(3)),
+                ))
+        return self._bulk_create(Inventory, inventory)
+
+    def _generate_lots(self, inventory):
+        """Split each row's stock into 1-3 lots, the first expiring on the row's expiry_date"""
+        rng = self._rng('lots')
+        fields = ['inventory_id', 'store_id', 'lot_number', 'quantity', 'expiry_date', 'received_at']
+
+        def rows():
+            for item in inventory:
+                remaining = item.quantity
+                lots = min(remaining, rng.randint(1, 3))
+                spacing = max(1, item.catalog_product.shelf_life_days // 3)
+                for n in range(lots):
+                    quantity = remaining if n == lots - 1 else rng.randint(1, remaining - (lots - n - 1))
+                    remaining -= quantity
+                    yield (
+                        item.id, item.store_id, f'L{item.id}-{n + 1}', quantity,
+                        item.expiry_date + timedelta(days=n * spacing), item.last_updated,
+                    )
+
+        self._stream(StockLot, fields, rows())
+
+    def _generate_low_stock(self, inventory):
+        """Seed the low-stock index as the stock movement services would have kept it"""
+        with transaction.atomic():
+            refresh_low_stock([item.id for item in inventory], publish=False)
+        self._count(LowStockItem, LowStockItem.objects.count())
+
+    def _generate_forecasts(self, stores, products, assortments):
+        rng = self._rng('forecasts')
+        fields = [
+            'forecast_id', 'store_id', 'product_id', 'forecast_date', 'predicted_demand',
+            'confidence_score', 'forecast_horizon_days', 'model_version', 'external_factors',
+            'created_by_agent', 'created_at',
+        ]
+        days = self.config['days']
+        popularity = [rng.lognormvariate(3.0, 0.8) for _ in products]
+
+        def rows():
+            for day_offset in range(days - 1, -1, -1):
+                forecast_date = self.end_date - timedelta(days=day_offset)
+                weekend = 1.3 if forecast_date.weekday() >= 5 else 1.0
+                created_at = datetime.combine(
+                    forecast_date - timedelta(days=1), dt_time(2, 0), tzinfo=dt_timezone.utc
+                )
+                for store in stores:
+                    store_factor = 0.4 if store.store_type == 'store' else 3.0
+                    for index in assortments[store.id]:
+                        external_factors = {}
+                        event_boost = 1.0
+                        if rng.random() < 0.1:
+                            external_factors = {
+                                'weather': rng.choice(['sunny', 'rainy', 'cloudy']),
+                                'event': rng.choice(['cricket_match', 'festival', 'normal']),
+                            }
+                            if external_factors['event'] != 'normal':
+                                event_boost = 1.5
+                        demand = popularity[index] * store_factor * weekend * event_boost
+                        yield (
+                            seeded_uuid(rng), store.id, products[index].id, forecast_date,
+                            max(0, int(rng.gauss(demand, demand * 0.15))),
+                            round(rng.uniform(0.6, 0.98), 3), 7,
+                            'LNN_v2' if rng.random() < 0.4 else 'LNN_v1',
+                            external_factors, 'InventoryAgent', created_at,
+                        )
+
+        self._stream(DemandForecast, fields, rows())
+
+    def _generate_forecast_curves(self, stores, products, assortments):
+        """A weekly forecaster run per stocked product, each covering FORECAST_HORIZON_DAYS"""
+        rng = self._rng('forecast_curves')
+        fields = [
+            'store_id', 'product_id', 'run_date', 'horizon_days', 'points', 'confidence_score',
+            'model_version', 'created_at',
+        ]
+        horizon = settings.FORECAST_HORIZON_DAYS
+        z_scores = [NormalDist().inv_cdf(level) for level in QUANTILES]
+        popularity = [rng.lognormvariate(3.0, 0.8) for _ in products]
+
+        def rows():
+            for day_offset in range(self.config['days'] - 1, -1, -7):
+                run_date = self.end_date - timedelta(days=day_offset)
+                created_at = datetime.combine(run_date - timedelta(days=1), dt_time(2, 0), tzinfo=dt_timezone.utc)
+                weekend = [1.3 if (run_date + timedelta(days=day)).weekday() >= 5 else 1.0 for day in range(horizon)]
+                for store in stores:
+                    store_factor = 0.4 if store.store_type == 'store' else 3.0
+                    for index in assortments[store.id]:
+                        demand = popularity[index] * store_factor
+                        mean = [demand * boost * rng.uniform(0.9, 1.1) for boost in weekend]
+                        confidence = rng.uniform(0.6, 0.98)
+                        quantiles = {
+                            level: [max(0.0, value + z * (1 - confidence) * value * math.sqrt(day + 1))
+                                    for day, value in enumerate(mean)]
+                            for level, z in zip(QUANTILES, z_scores)
+                        }
+                        yield (
+                            store.id, products[index].id, run_date, horizon, pack_curve(mean, quantiles),
+                            round(confidence, 3), 'LNN_v2' if rng.random() < 0.4 else 'LNN_v1', created_at,
+                        )
+
+        self._stream(ForecastCurve, fields, rows())
+
+    def _generate_rebalances(self, stores, products, assortments):
+        rng = self._rng('rebalances')
+        sources = [s for s in stores if s.store_type != 'store']
+        targets = [s for s in stores if s.store_type == 'store']
+        if not sources or not targets:
+            return []
+
+        open_pairs = set()
+        actions = []
+        for _ in range(self.config['rebalances']):
+            source = sources[rng.randrange(len(sources))]
+            target = targets[rng.randrange(len(targets))]
+            product = products[rng.choice(assortments[target.id])]
+            status = weighted_choice(rng, REBALANCE_STATUSES)
+            if status in ('pending', 'approved', 'in_progress'):
+                # Respect the one-open-action-per-(target, product) constraint
+                if (target.id, product.id) in open_pairs:
+                    status = 'completed'
+                else:
+                    open_pairs.add((target.id, product.id))
+            quantity = rng.randint(10, 200)
+            created_at = self._timestamp(rng)
+            actions.append(StockRebalanceAction(
+                action_id=seeded_uuid(rng),
+                source_store=source,
+                target_store=target,
+                product=product,
+                quantity=quantity,
+                urgency=weighted_choice(rng, URGENCIES),
+                reason=f'Forecast demand exceeds stock at {target.name} by {quantity} units',
+                status=status,
+                estimated_cost=Decimal(f'{quantity * float(product.unit_weight) * 2.5:.2f}'),
+                created_at=created_at,
+                completed_at=created_at + timedelta(hours=rng.randint(2, 48)) if status == 'completed' else None,
+            ))
+        return self._bulk_create(StockRebalanceAction, actions)
+
+    def _generate_routes(self, rebalances):
+        rng = self._rng('routes')
+        fields = [
+            'route_id', 'rebalance_action_id', 'start_location_id', 'end_location_id', 'waypoints',
+            'total_distance_km', 'estimated_duration_hours', 'estimated_cost', 'traffic_conditions',
+            'route_status', 'alternative_routes', 'created_by_agent', 'created_at',
+        ]
+        route_status = {
+            'completed': 'completed', 'in_progress': 'active', 'approved': 'planned',
+        }
+
+        def rows():
+            for action in rebalances:
+                if action.status not in route_status:
+                    continue
+                source, target = action.source_store, action.target_store
+                distance = haversine_km(source.latitude, source.longitude,
+                                        target.latitude, target.longitude) * 1.3 + 2.0
+                traffic = rng.choice(['light', 'medium', 'heavy'])
+                duration = distance / 30.0 * {'light': 1.0, 'medium': 1.2, 'heavy': 1.5}[traffic]
+                status = route_status[action.status]
+                if status == 'active' and rng.random() < 0.2:
+                    status = 'delayed'
+                yield (
+                    seeded_uuid(rng), action.id, source.id, target.id, [],
+                    round(distance, 1), round(duration, 2), f'{distance * 15.0:.2f}', traffic,
+                    status, [], 'RoutePlannerAgent', action.created_at + timedelta(minutes=5),
+                )
+
+        self._stream(RouteOptimization, fields, rows())
+
+    def _generate_transfers(self, rebalances, inventory):
+        inventory_ids = {(item.store_location, item.product_id): item.id for item in inventory}
+        fields = ['from_store', 'to_store', 'source_store_id', 'target_store_id', 'product_id',
+                  'quantity', 'timestamp', 'reason']
+
+        def rows():
+            for action in rebalances:
+                if action.status != 'completed':
+                    continue
+                inventory_id = inventory_ids.get((action.target_store.location, action.product.product_id))
+                if inventory_id is None:
+                    continue
+                yield (
+                    action.source_store.location, action.target_store.location,
+                    action.source_store_id, action.target_store_id, inventory_id,
+                    action.quantity, action.completed_at, action.reason,
+                )
+
+        self._stream(TransferLog, fields, rows())
+
+    def _generate_metrics(self):
+        rng = self._rng('metrics')
+        fields = ['metric_id', 'agent_name', 'metric_type', 'metric_value', 'unit',
+                  'timestamp', 'additional_data']
+
+        def rows():
+            for _ in range(self.config['metrics']):
+                agent_name, metric_type, unit, value_range = AGENT_METRICS[rng.randrange(len(AGENT_METRICS))]
+                yield (
+                    seeded_uuid(rng), agent_name, metric_type, round(rng.uniform(*value_range), 2),
+                    unit, self._timestamp(rng), {},
+                )
+
+        self._stream(AgentMetrics, fields, rows())
+
+    def _generate_ledger(self, inventory):
+        """
+        Opening balances at the start of the window followed by sales,
+        netting to each row's current quantity.
+
+        Two passes over the same seeded stream: the first only sums each
+        row's changes so the opening balance can be set without holding
+        millions of entries in memory, the second writes them.
+        """
+        if not inventory:
+            return
+        fields = ['inventory_id', 'store_id', 'delta', 'reason', 'created_at']
+
+        def changes():
+            rng = self._rng('ledger')
+            for _ in range(self.config['ledger']):
+                item = inventory[rng.randrange(len(inventory))]
+                yield item, -rng.randint(1, 10), self._timestamp(rng)
+
+        net = {}
+        for item, delta, _ in changes():
+            net[item.id] = net.get(item.id, 0) + delta
+
+        opened_at = datetime.combine(
+            self.end_date - timedelta(days=self.config['days'] - 1), dt_time(0, 0), tzinfo=dt_timezone.utc
+        )
+
+        def rows():
+            for item in inventory:
+                opening = item.quantity - net.get(item.id, 0)
+                if opening:
+                    yield item.id, item.store_id, opening, 'opening', opened_at
+            for item, delta, created_at in changes():
+                yield item.id, item.store_id, delta, 'adjustment', created_at
+
+        self._stream(StockLedgerEntry, fields, rows())
+
+    def _generate_snapshots(self):
+        """Daily snapshots, as the periodic_stock_snapshot task would have taken them"""
+        written = 0
+        for day_offset in range(self.config['days'] - 1, -1, -1):
+            day = self.end_date - timedelta(days=day_offset)
+            written += take_snapshots(until=datetime.combine(day, dt_time(23, 59, 59), tzinfo=dt_timezone.utc))
+        self._count(StockSnapshot, written)
@@ -0,0 +1,100 @@
+"""
+Import-time profile of a cold web or worker process
+
+Starts a fresh interpreter under `python -X importtime`, loads what a
+web process (WSGI app and URLconf) or a Celery worker (app and task
+modules) loads at startup, and reports the slowest modules and packages.
+Heavy ML/data packages don't belong in web processes - the agents load
+them lazily - so --fail-on-heavy exits non-zero if any were imported.
+
+    python manage.py profile_startup --target web --fail-on-heavy
+    python manage.py profile_startup --target worker --limit 40
+"""
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+STARTUP_CODE = {
+    'web': (
+        'import agentx.wsgi\n'
+        'from django.urls import get_resolver\n'
+        'get_resolver().url_patterns\n'
+    ),
+    'worker': (
+        'from agentx.celery import app\n'
+        'import django\n'
+        'django.setup()\n'
+        'app.loader.import_default_modules()\n'
+    ),
+}
+
+# Packages from requirements.txt that take seconds (or gigabytes) to import
+HEAVY_PACKAGES = ('ultralytics', 'torch', 'cv2', 'langchain', 'crewai', 'pandas', 'numpy', 'openai', 'neo4j', 'py2neo')
+
+IMPORTTIME_PATTERN = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def parse_importtime(stderr):
+    """[(module, self us, cumulative us, depth)] from -X importtime output"""
+    modules = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            modules.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return modules
+
+
+class Command(BaseCommand):
+    help = 'Profile import time of a cold web or worker process, per module and package'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=sorted(STARTUP_CODE), default='web')
+        parser.add_argument('--limit', type=int, default=25, help='Modules/packages to list')
+        parser.add_argument('--fail-on-heavy', action='store_true',
+                            help=f"Exit non-zero if any of {', '.join(HEAVY_PACKAGES)} was imported")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP_CODE[options['target']]],
+            capture_output=True, text=True, env=os.environ.copy()
+        )
+        elapsed = time.perf_counter() - started
+        modules = parse_importtime(result.stderr)
+        if result.returncode != 0:
+            errors = [line for line in result.stderr.splitlines() if not line.startswith('import time:')]
+            raise CommandError('Startup failed:\n' + '\n'.join(errors[-20:]))
+
+        packages = defaultdict(int)
+        for module, self_us, _, _ in modules:
+            packages[module.split('.')[0]] += self_us
+        total_us = sum(packages.values())
+
+        limit = options['limit']
+        self.stdout.write(
+            f"{options['target']} startup: {elapsed:.2f}s wall, {total_us / 1e6:.2f}s importing "
+            f"{len(modules)} modules"
+        )
+        self.stdout.write('\nSlowest packages (self time):')
+        for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:limit]:
+            self.stdout.write(f'  {self_us / 1000:9.1f} ms  {100 * self_us / total_us:5.1f}%  {package}')
+        self.stdout.write('\nSlowest top-level imports (cumulative):')
+        top_level = [module for module in modules if module[3] == 0]
+        for module, _, cumulative_us, _ in sorted(top_level, key=lambda item: -item[2])[:limit]:
+            self.stdout.write(f'  {cumulative_us / 1000:9.1f} ms  {module}')
+
+        heavy = sorted({module.split('.')[0] for module, *_ in modules} & set(HEAVY_PACKAGES))
+        if heavy:
+            message = f"Heavy packages imported at startup: {', '.join(heavy)}"
+            if options['fail_on_heavy']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS('\nNo heavy packages imported at startup'))
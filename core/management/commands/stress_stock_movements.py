@@ -0,0 +1,145 @@
+"""
+Concurrency stress test for the stock movement service
+
+Seeds one throwaway product across a few stores, then has many threads
+move stock between them at once. Afterwards the total must be unchanged
+and every store's quantity must equal its starting stock plus the
+transfers actually logged - any difference is a lost update.
+
+    python manage.py stress_stock_movements --threads 16 --transfers 500
+    python manage.py stress_stock_movements --naive   # the old save() path, for comparison
+"""
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.models import Sum
+
+from core.models import Inventory, StockLedgerEntry, TransferLog
+from core.stock_movements import InsufficientStock, apply_movements
+
+
+class Command(BaseCommand):
+    help = 'Hammer the stock movement service from many threads and check for lost updates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--transfers', type=int, default=200, help='Transfers per thread')
+        parser.add_argument('--stores', type=int, default=4)
+        parser.add_argument('--initial', type=int, default=1000, help='Starting stock per store')
+        parser.add_argument('--batch-size', type=int, default=1,
+                            help='Movements per apply_movements() call')
+        parser.add_argument('--naive', action='store_true',
+                            help='Use read-modify-write save() instead of the service')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true', help='Keep the stress rows afterwards')
+
+    def handle(self, *args, **options):
+        product_id = f'STRESS-{uuid.uuid4().hex[:8]}'
+        stores = [f'Stress Store {n}' for n in range(options['stores'])]
+        initial = options['initial']
+        Inventory.objects.bulk_create([
+            Inventory(product_id=product_id, product_name='Stress test item', store_location=store, quantity=initial)
+            for store in stores
+        ])
+
+        counts = Counter()
+        lock = threading.Lock()
+
+        def worker(index):
+            rng = random.Random(f"{options['seed']}:{index}")
+            try:
+                for _ in range(0, options['transfers'], options['batch_size']):
+                    batch = []
+                    for _ in range(options['batch_size']):
+                        from_store, to_store = rng.sample(stores, 2)
+                        batch.append({
+                            'product_id': product_id,
+                            'from_store': from_store,
+                            'to_store': to_store,
+                            'quantity': rng.randint(1, 20),
+                            'reason': 'stress test',
+                        })
+                    outcome = self._move(batch, options['naive'])
+                    with lock:
+                        counts[outcome] += len(batch)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        final = dict(Inventory.objects.filter(product_id=product_id).values_list('store_location', 'quantity'))
+        logs = TransferLog.objects.filter(product__product_id=product_id)
+        expected = {store: initial for store in stores}
+        for row in logs.values('from_store', 'to_store').annotate(total=Sum('quantity')):
+            expected[row['from_store']] -= row['total']
+            expected[row['to_store']] += row['total']
+
+        self.stdout.write(
+            f"{sum(counts.values())} movements in {elapsed:.2f}s "
+            f"({sum(counts.values()) / elapsed:.0f}/s): {dict(counts)}"
+        )
+        drift = {store: final[store] - expected[store] for store in stores if final[store] != expected[store]}
+        # The ledger must tell the same story: the rows were seeded without opening entries
+        ledger = dict(StockLedgerEntry.objects.filter(
+            inventory__product_id=product_id
+        ).values_list('inventory__store_location').annotate(total=Sum('delta')).order_by())
+        ledger_drift = {store: final[store] - initial - ledger.get(store, 0) for store in stores
+                        if final[store] - initial != ledger.get(store, 0)}
+        total_drift = sum(final.values()) - initial * len(stores)
+        negative = [store for store, quantity in final.items() if quantity < 0]
+
+        if not options['keep']:
+            Inventory.objects.filter(product_id=product_id).delete()
+
+        if drift or total_drift or negative or ledger_drift:
+            message = (f'Lost updates: per-store drift {drift}, total drift {total_drift}, '
+                       f'negative stock {negative}, ledger drift {ledger_drift}')
+            if options['naive']:
+                self.stdout.write(self.style.WARNING(message))
+                return
+            raise CommandError(message)
+        self.stdout.write(self.style.SUCCESS('No lost updates: every store matches its logged transfers and ledger'))
+
+    def _move(self, batch, naive, attempts=20):
+        for attempt in range(attempts):
+            try:
+                if naive:
+                    self._naive_move(batch)
+                else:
+                    apply_movements(batch)
+                return 'applied'
+            except InsufficientStock:
+                return 'insufficient'
+            except OperationalError:
+                # Lock timeouts / SQLite "database is locked": the transaction rolled back, retry it
+                time.sleep(0.01 * (attempt + 1))
+        return 'gave_up'
+
+    def _naive_move(self, batch):
+        for movement in batch:
+            source = Inventory.objects.get(product_id=movement['product_id'], store_location=movement['from_store'])
+            target = Inventory.objects.get(product_id=movement['product_id'], store_location=movement['to_store'])
+            if source.quantity < movement['quantity']:
+                raise InsufficientStock([])
+            source.quantity -= movement['quantity']
+            target.quantity += movement['quantity']
+            source.save()
+            target.save()
+            TransferLog.objects.create(
+                from_store=movement['from_store'],
+                to_store=movement['to_store'],
+                product=source,
+                quantity=movement['quantity'],
+                reason=movement['reason']
+            )
@@ -0,0 +1,172 @@
+"""
+Request middleware for the AgentX API
+"""
+import random
+import time
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .agent_models import EndpointProfile
+from .db_routers import is_pinned_to_primary, primary_only, replica_reads
+from .profiling import QueryRecorder, cprofile_stacks, profile_request, pyinstrument_stacks
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Let read-only requests use the read replicas.
+
+    Unsafe methods always run on the primary. After a request writes, a
+    short-lived cookie pins the client's following requests to the primary
+    so it reads its own writes while the replicas catch up.
+    """
+    cookie_name = 'agentx_primary_pin'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method not in SAFE_METHODS:
+            with primary_only():
+                response = self.get_response(request)
+            self._set_pin_cookie(response)
+            return response
+
+        pinned = self.cookie_name in request.COOKIES
+        with replica_reads(pinned=pinned):
+            response = self.get_response(request)
+            wrote = is_pinned_to_primary() and not pinned
+        if wrote:
+            self._set_pin_cookie(response)
+        return response
+
+    def _set_pin_cookie(self, response):
+        response.set_cookie(
+            self.cookie_name,
+            '1',
+            max_age=settings.REPLICA_STICKY_SECONDS,
+            httponly=True,
+            samesite='Lax',
+        )
+
+
+class ProfilingMiddleware:
+    """
+    Profile sampled or explicitly requested API requests.
+
+    A request is profiled when it sends an `X-Profile` header (honoured when
+    PROFILING_HEADER_ENABLED) or falls within PROFILING_SAMPLE_RATE. Query
+    count, DB time, repeated statements, serializer time (serializers with
+    TimedSerializerMixin) and render time are returned as Server-Timing
+    headers and aggregated per endpoint and day in EndpointProfile. `X-Profile: cprofile` or `X-Profile: pyinstrument`
+    also captures the hottest call stacks.
+    """
+    header = 'X-Profile'
+    stack_profilers = {
+        'cprofile': cprofile_stacks,
+        'pyinstrument': pyinstrument_stacks,
+    }
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = self._profile_mode(request)
+        if mode is None:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        request._profile_timings = {}
+        request._profile_recorder = recorder
+        stacks = None
+        started = time.perf_counter()
+        with recorder.record(), profile_request(request):
+            if mode in self.stack_profilers:
+                response, stacks = self.stack_profilers[mode](lambda: self.get_response(request))
+            else:
+                response = self.get_response(request)
+        total_ms = (time.perf_counter() - started) * 1000
+
+        db_ms = recorder.duration * 1000
+        render_ms = request._profile_timings.get('render', 0.0) * 1000
+        # Queries run while serializing count as db time, not serialize time
+        serialize_ms = max(
+            request._profile_timings.get('serialize', 0.0) - request._profile_timings.get('serialize_db', 0.0), 0.0
+        ) * 1000
+        app_ms = max(total_ms - db_ms - serialize_ms - render_ms, 0.0)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={db_ms:.1f};desc="{recorder.count} queries, {recorder.duplicate_count} repeated"',
+            f'serialize;dur={serialize_ms:.1f}',
+            f'render;dur={render_ms:.1f}',
+            f'app;dur={app_ms:.1f}',
+            f'total;dur={total_ms:.1f}',
+        ])
+
+        sample = {
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'db_ms': round(db_ms, 2),
+            'serialize_ms': round(serialize_ms, 2),
+            'render_ms': round(render_ms, 2),
+            'queries': recorder.count,
+            'repeated_queries': recorder.repeated(settings.PROFILING_REPEATED_QUERY_THRESHOLD),
+        }
+        if stacks:
+            sample['stacks'] = stacks
+        self._store(request, recorder, total_ms, db_ms, serialize_ms, render_ms, sample)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered (encoded as JSON) right after this hook; building
+        # the data happened earlier, in the view (TimedSerializerMixin)
+        timings = getattr(request, '_profile_timings', None)
+        if timings is not None:
+            render_started = time.perf_counter()
+
+            def rendered(response):
+                timings['render'] = time.perf_counter() - render_started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def _profile_mode(self, request):
+        requested = request.headers.get(self.header)
+        if requested and settings.PROFILING_HEADER_ENABLED:
+            requested = requested.lower()
+            return requested if requested in self.stack_profilers else 'basic'
+        if settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE:
+            return 'basic'
+        return None
+
+    def _store(self, request, recorder, total_ms, db_ms, serialize_ms, render_ms, sample):
+        match = request.resolver_match
+        if match is None:
+            return
+        try:
+            profile, _ = EndpointProfile.objects.get_or_create(
+                method=request.method,
+                route=match.route[:255],
+                date=timezone.now().date()
+            )
+            EndpointProfile.objects.filter(pk=profile.pk).update(
+                request_count=F('request_count') + 1,
+                total_time_ms=F('total_time_ms') + total_ms,
+                max_time_ms=Greatest(F('max_time_ms'), total_ms),
+                db_time_ms=F('db_time_ms') + db_ms,
+                query_count=F('query_count') + recorder.count,
+                duplicate_query_count=F('duplicate_query_count') + recorder.duplicate_count,
+                serialize_time_ms=F('serialize_time_ms') + serialize_ms,
+                render_time_ms=F('render_time_ms') + render_ms,
+                last_profile=sample,
+                updated_at=timezone.now()
+            )
+        except DatabaseError:
+            # Profiling must never fail the request it measured
+            pass
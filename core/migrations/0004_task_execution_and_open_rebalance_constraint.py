@@ -0,0 +1,52 @@
+# Generated by Django 5.1.7 on 2026-10-19 08:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+OPEN_STATUSES = ['pending', 'approved', 'in_progress']
+
+
+def reject_duplicate_open_rebalances(apps, schema_editor):
+    """Keep the oldest open action per (target_store, product), reject the rest"""
+    StockRebalanceAction = apps.get_model('core', 'StockRebalanceAction')
+    seen = set()
+    duplicate_ids = []
+    open_actions = StockRebalanceAction.objects.filter(
+        status__in=OPEN_STATUSES
+    ).order_by('created_at', 'id').values_list('id', 'target_store_id', 'product_id')
+    for action_id, target_store_id, product_id in open_actions.iterator():
+        if (target_store_id, product_id) in seen:
+            duplicate_ids.append(action_id)
+        else:
+            seen.add((target_store_id, product_id))
+    for start in range(0, len(duplicate_ids), 1000):
+        StockRebalanceAction.objects.filter(id__in=duplicate_ids[start:start + 1000]).update(status='rejected')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_agentexplanation_cortexcoordination_product_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskExecution',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=128, unique=True)),
+                ('task_name', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='running', max_length=20)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('lease_expires_at', models.DateTimeField(help_text='Another run may take over after this')),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(reject_duplicate_open_rebalances, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='stockrebalanceaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'approved', 'in_progress'])), fields=('target_store', 'product'), name='unique_open_rebalance_per_target_product'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.7 on 2026-10-19 08:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_task_execution_and_open_rebalance_constraint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EndpointProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('method', models.CharField(max_length=10)),
+                ('route', models.CharField(help_text='URL pattern, not the concrete path', max_length=255)),
+                ('date', models.DateField()),
+                ('request_count', models.IntegerField(default=0)),
+                ('total_time_ms', models.FloatField(default=0)),
+                ('max_time_ms', models.FloatField(default=0)),
+                ('db_time_ms', models.FloatField(default=0)),
+                ('query_count', models.IntegerField(default=0)),
+                ('duplicate_query_count', models.IntegerField(default=0)),
+                ('render_time_ms', models.FloatField(default=0)),
+                ('last_profile', models.JSONField(blank=True, default=dict, help_text='Most recent sample incl. repeated queries/stacks')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('method', 'route', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.7 on 2026-10-19 08:35
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_endpointprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskSpan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('span_id', models.UUIDField(default=uuid.uuid4, unique=True)),
+                ('trace_id', models.UUIDField(db_index=True, help_text='Shared by every task of one workflow')),
+                ('parent_span_id', models.UUIDField(blank=True, null=True)),
+                ('task_name', models.CharField(max_length=255)),
+                ('agent_name', models.CharField(max_length=100)),
+                ('celery_task_id', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(choices=[('success', 'Success'), ('error', 'Error'), ('deduplicated', 'Deduplicated'), ('duplicate', 'Duplicate (already running)')], max_length=20)),
+                ('error', models.TextField(blank=True)),
+                ('enqueued_at', models.DateTimeField(blank=True, null=True)),
+                ('started_at', models.DateTimeField()),
+                ('wall_time_ms', models.FloatField()),
+                ('db_time_ms', models.FloatField()),
+                ('query_count', models.IntegerField()),
+                ('queue_wait_ms', models.FloatField(blank=True, help_text='Enqueue to start; empty for direct calls', null=True)),
+                ('coordination', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='spans', to='core.cortexcoordination')),
+            ],
+            options={
+                'ordering': ['started_at'],
+                'indexes': [models.Index(fields=['agent_name', 'started_at'], name='core_tasksp_agent_n_e148e5_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.1.7 on 2026-10-19 08:39
+#
+# Adds nullable Store/Product foreign keys to the legacy Inventory and
+# TransferLog tables. Nullable columns without a default are a metadata-only
+# change; the FK indexes are built separately, CONCURRENTLY on PostgreSQL, so
+# writes to large tables aren't blocked while they build. The rows are filled
+# in by 0008.
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# (model, field) pairs whose indexes are built outside AddField
+INDEXED_FIELDS = [
+    ('inventory', 'store'),
+    ('inventory', 'catalog_product'),
+    ('transferlog', 'source_store'),
+    ('transferlog', 'target_store'),
+]
+
+
+def _index_name(model, field):
+    return f'{model._meta.db_table}_{field.column}_idx'
+
+
+def create_fk_indexes(apps, schema_editor):
+    concurrently = 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+    quote = schema_editor.quote_name
+    for model_name, field_name in INDEXED_FIELDS:
+        model = apps.get_model('core', model_name)
+        field = model._meta.get_field(field_name)
+        schema_editor.execute(
+            f'CREATE INDEX {concurrently}IF NOT EXISTS {quote(_index_name(model, field))} '
+            f'ON {quote(model._meta.db_table)} ({quote(field.column)})'
+        )
+
+
+def drop_fk_indexes(apps, schema_editor):
+    concurrently = 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+    for model_name, field_name in INDEXED_FIELDS:
+        model = apps.get_model('core', model_name)
+        field = model._meta.get_field(field_name)
+        schema_editor.execute(
+            f'DROP INDEX {concurrently}IF EXISTS {schema_editor.quote_name(_index_name(model, field))}'
+        )
+
+
+def fk_field(to, related_name, db_index=True):
+    return models.ForeignKey(
+        blank=True, null=True, db_index=db_index,
+        on_delete=django.db.models.deletion.SET_NULL,
+        related_name=related_name, to=to
+    )
+
+
+FIELDS = [
+    ('inventory', 'store', 'core.store', 'legacy_inventory'),
+    ('inventory', 'catalog_product', 'core.product', 'legacy_inventory'),
+    ('transferlog', 'source_store', 'core.store', 'legacy_transfers_out'),
+    ('transferlog', 'target_store', 'core.store', 'legacy_transfers_in'),
+]
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0006_task_span'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(model_name=model_name, name=name, field=fk_field(to, related_name))
+                for model_name, name, to, related_name in FIELDS
+            ],
+            database_operations=[
+                migrations.AddField(model_name=model_name, name=name, field=fk_field(to, related_name, db_index=False))
+                for model_name, name, to, related_name in FIELDS
+            ] + [
+                migrations.RunPython(create_fk_indexes, drop_fk_indexes),
+            ],
+        ),
+    ]
@@ -0,0 +1,182 @@
+# Generated by Django 5.1.7 on 2026-10-19 08:40
+#
+# Backfills the Store/Product links added in 0007 and then enforces one
+# Inventory row per (store, product). The backfill walks the tables in
+# primary-key batches, each in its own short transaction, so it holds row
+# locks only briefly and can be re-run after an interruption. The unique
+# index is built CONCURRENTLY on PostgreSQL and then attached as the
+# constraint.
+
+import hashlib
+
+from django.db import migrations, models, transaction
+from django.db.models import Count, Max, Min, Sum
+
+
+BATCH_SIZE = 10000
+CONSTRAINT_NAME = 'unique_inventory_store_product'
+
+
+def legacy_store_id(store_location):
+    # Same scheme as core.models.legacy_store_id
+    return 'LEGACY-' + hashlib.sha1(store_location.encode('utf-8')).hexdigest()[:12].upper()
+
+
+def legacy_store_type(store_location):
+    lowered = store_location.lower()
+    if 'distribution center' in lowered:
+        return 'distribution_center'
+    if 'warehouse' in lowered:
+        return 'warehouse'
+    if 'fulfillment' in lowered:
+        return 'fulfillment_center'
+    return 'store'
+
+
+class Resolver:
+    """Cached lookups from legacy strings to Store/Product ids, creating what's missing"""
+
+    def __init__(self, apps):
+        self.Store = apps.get_model('core', 'Store')
+        self.Product = apps.get_model('core', 'Product')
+        # Legacy strings hold a store's name or its location; names win, then the lowest pk
+        self.stores = {}
+        for store_id, location in self.Store.objects.order_by('-pk').values_list('pk', 'location'):
+            self.stores[location] = store_id
+        for store_id, name in self.Store.objects.order_by('-pk').values_list('pk', 'name'):
+            self.stores[name] = store_id
+        self.products = dict(self.Product.objects.values_list('product_id', 'pk'))
+
+    def store(self, store_location):
+        # Same matching as core.models.legacy_store
+        if store_location not in self.stores:
+            store, _ = self.Store.objects.get_or_create(
+                store_id=legacy_store_id(store_location),
+                defaults={
+                    'name': store_location,
+                    'location': store_location,
+                    'store_type': legacy_store_type(store_location),
+                }
+            )
+            self.stores[store_location] = store.pk
+        return self.stores[store_location]
+
+    def product(self, product_id, product_name):
+        if product_id not in self.products:
+            product, _ = self.Product.objects.get_or_create(
+                product_id=product_id,
+                defaults={'name': product_name, 'category': 'uncategorized', 'unit_price': 0, 'unit_weight': 0}
+            )
+            self.products[product_id] = product.pk
+        return self.products[product_id]
+
+
+def pk_batches(model):
+    """[low, high) primary-key ranges covering the table"""
+    bounds = model.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return
+    for low in range(bounds['low'], bounds['high'] + 1, BATCH_SIZE):
+        yield low, low + BATCH_SIZE
+
+
+def link_by_string(queryset, string_field, fk_field, resolve):
+    """One UPDATE per distinct legacy string in the batch instead of one per row"""
+    pending = queryset.filter(**{f'{fk_field}__isnull': True})
+    for value in pending.values_list(string_field, flat=True).distinct():
+        pending.filter(**{string_field: value}).update(**{fk_field: resolve(value)})
+
+
+def backfill(apps, schema_editor):
+    Inventory = apps.get_model('core', 'Inventory')
+    TransferLog = apps.get_model('core', 'TransferLog')
+    resolver = Resolver(apps)
+
+    for low, high in pk_batches(Inventory):
+        with transaction.atomic():
+            batch = Inventory.objects.filter(pk__gte=low, pk__lt=high)
+            link_by_string(batch, 'store_location', 'store_id', resolver.store)
+            pending = batch.filter(catalog_product__isnull=True)
+            for product_id, product_name in pending.values_list('product_id', 'product_name').distinct():
+                pending.filter(product_id=product_id).update(
+                    catalog_product_id=resolver.product(product_id, product_name)
+                )
+
+    for low, high in pk_batches(TransferLog):
+        with transaction.atomic():
+            batch = TransferLog.objects.filter(pk__gte=low, pk__lt=high)
+            link_by_string(batch, 'from_store', 'source_store_id', resolver.store)
+            link_by_string(batch, 'to_store', 'target_store_id', resolver.store)
+
+    merge_duplicate_inventory(Inventory, TransferLog)
+
+
+def merge_duplicate_inventory(Inventory, TransferLog):
+    """Fold duplicate (store, product) rows into the oldest one so the constraint can be added"""
+    duplicates = Inventory.objects.filter(
+        store__isnull=False, catalog_product__isnull=False
+    ).values('store_id', 'catalog_product_id').annotate(
+        rows=Count('id'), keep_id=Min('id'), total=Sum('quantity')
+    ).filter(rows__gt=1)
+    for group in list(duplicates):
+        with transaction.atomic():
+            extra = Inventory.objects.filter(
+                store_id=group['store_id'], catalog_product_id=group['catalog_product_id']
+            ).exclude(pk=group['keep_id'])
+            TransferLog.objects.filter(product__in=extra).update(product_id=group['keep_id'])
+            Inventory.objects.filter(pk=group['keep_id']).update(quantity=group['total'])
+            extra.delete()
+
+
+def add_unique_constraint(apps, schema_editor):
+    Inventory = apps.get_model('core', 'Inventory')
+    quote = schema_editor.quote_name
+    table = quote(Inventory._meta.db_table)
+    if schema_editor.connection.vendor != 'postgresql':
+        # A unique index is how SQLite represents the constraint
+        schema_editor.execute(
+            f'CREATE UNIQUE INDEX {quote(CONSTRAINT_NAME)} ON {table} ({quote("store_id")}, {quote("catalog_product_id")})'
+        )
+        return
+    schema_editor.execute(
+        f'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {quote(CONSTRAINT_NAME)} '
+        f'ON {table} ({quote("store_id")}, {quote("catalog_product_id")})'
+    )
+    schema_editor.execute(
+        f'ALTER TABLE {table} ADD CONSTRAINT {quote(CONSTRAINT_NAME)} UNIQUE USING INDEX {quote(CONSTRAINT_NAME)}'
+    )
+
+
+def remove_unique_constraint(apps, schema_editor):
+    Inventory = apps.get_model('core', 'Inventory')
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {schema_editor.quote_name(CONSTRAINT_NAME)}')
+        return
+    schema_editor.remove_constraint(
+        Inventory, models.UniqueConstraint(fields=['store', 'catalog_product'], name=CONSTRAINT_NAME)
+    )
+
+
+class Migration(migrations.Migration):
+
+    # Each backfill batch commits on its own
+    atomic = False
+
+    dependencies = [
+        ('core', '0007_inventory_transferlog_store_product_fks'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='inventory',
+                    constraint=models.UniqueConstraint(fields=('store', 'catalog_product'), name=CONSTRAINT_NAME),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(add_unique_constraint, remove_unique_constraint),
+            ],
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.1.7 on 2026-10-19 08:42
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models, transaction
+from django.db.models import Max, Min
+
+
+BATCH_SIZE = 10000
+
+
+def open_ledger(apps, schema_editor):
+    """Start the ledger with each existing row's current quantity as its opening balance"""
+    Inventory = apps.get_model('core', 'Inventory')
+    StockLedgerEntry = apps.get_model('core', 'StockLedgerEntry')
+    opened_at = django.utils.timezone.now()
+    bounds = Inventory.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return
+    for low in range(bounds['low'], bounds['high'] + 1, BATCH_SIZE):
+        rows = Inventory.objects.filter(pk__gte=low, pk__lt=low + BATCH_SIZE).exclude(quantity=0)
+        with transaction.atomic():
+            StockLedgerEntry.objects.bulk_create([
+                StockLedgerEntry(
+                    inventory_id=pk, store_id=store_id, delta=quantity, reason='opening', created_at=opened_at
+                )
+                for pk, store_id, quantity in rows.values_list('pk', 'store_id', 'quantity')
+            ])
+
+
+class Migration(migrations.Migration):
+
+    # Opening balances are written in batches, each committed on its own
+    atomic = False
+
+    dependencies = [
+        ('core', '0008_backfill_legacy_store_product'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField()),
+                ('reason', models.CharField(choices=[('opening', 'Opening Balance'), ('transfer_out', 'Transfer Out'), ('transfer_in', 'Transfer In'), ('adjustment', 'Adjustment'), ('correction', 'Manual Correction'), ('removed', 'Inventory Row Removed')], max_length=20)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('inventory', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='ledger_entries', to='core.inventory')),
+                ('store', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.store')),
+                ('transfer', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.transferlog')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['store', 'created_at'], name='core_stockl_store_i_ee5866_idx'), models.Index(fields=['inventory', 'created_at'], name='core_stockl_invento_8d48ca_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('quantities', models.JSONField(default=dict, help_text='{inventory_id: quantity}')),
+                ('entries_applied', models.IntegerField(default=0, help_text='Ledger rows folded in since the previous snapshot')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='core.store')),
+            ],
+            options={
+                'unique_together': {('store', 'taken_at')},
+            },
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
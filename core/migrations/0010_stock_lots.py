@@ -0,0 +1,62 @@
+# Generated by Django 5.1.7 on 2026-10-19 08:48
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models, transaction
+from django.db.models import Max, Min
+
+
+BATCH_SIZE = 10000
+
+
+def open_lots(apps, schema_editor):
+    Inventory = apps.get_model('core', 'Inventory')
+    StockLot = apps.get_model('core', 'StockLot')
+    received_at = django.utils.timezone.now()
+    bounds = Inventory.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return
+    for low in range(bounds['low'], bounds['high'] + 1, BATCH_SIZE):
+        rows = Inventory.objects.filter(pk__gte=low, pk__lt=low + BATCH_SIZE, quantity__gt=0)
+        with transaction.atomic():
+            StockLot.objects.bulk_create([
+                StockLot(
+                    inventory_id=pk, store_id=store_id, quantity=quantity,
+                    expiry_date=expiry_date, received_at=received_at
+                )
+                for pk, store_id, quantity, expiry_date in rows.values_list('pk', 'store_id', 'quantity', 'expiry_date')
+            ])
+
+
+class Migration(migrations.Migration):
+
+    # Lots are written in batches, each committed on its own
+    atomic = False
+
+    dependencies = [
+        ('core', '0009_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockledgerentry',
+            name='reason',
+            field=models.CharField(choices=[('opening', 'Opening Balance'), ('transfer_out', 'Transfer Out'), ('transfer_in', 'Transfer In'), ('adjustment', 'Adjustment'), ('correction', 'Manual Correction'), ('received', 'Lot Received'), ('removed', 'Inventory Row Removed')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='StockLot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lot_number', models.CharField(blank=True, max_length=100)),
+                ('quantity', models.PositiveIntegerField()),
+                ('expiry_date', models.DateField(blank=True, help_text='Blank for non-perishable stock', null=True)),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('inventory', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='lots', to='core.inventory')),
+                ('store', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.store')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('quantity__gt', 0)), fields=['expiry_date', 'store', 'quantity'], name='stocklot_expiring_idx'), models.Index(fields=['inventory', 'expiry_date'], name='core_stockl_invento_182e6a_idx')],
+            },
+        ),
+        migrations.RunPython(open_lots, migrations.RunPython.noop),
+    ]
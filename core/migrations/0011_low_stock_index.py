@@ -0,0 +1,85 @@
+# Generated by Django 5.1.7 on 2026-10-19 08:50
+#
+# Adds the low-stock index (rows below their product's minimum) and its
+# crossing events. The index is seeded from current stock in primary-key
+# batches; seeding publishes no events.
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models, transaction
+from django.db.models import F, Max, Min
+
+
+BATCH_SIZE = 10000
+
+
+def seed_low_stock(apps, schema_editor):
+    Inventory = apps.get_model('core', 'Inventory')
+    LowStockItem = apps.get_model('core', 'LowStockItem')
+    now = django.utils.timezone.now()
+    bounds = Inventory.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return
+    for low in range(bounds['low'], bounds['high'] + 1, BATCH_SIZE):
+        rows = Inventory.objects.filter(
+            pk__gte=low, pk__lt=low + BATCH_SIZE, quantity__lt=F('catalog_product__minimum_stock_level')
+        ).values_list(
+            'pk', 'store_id', 'catalog_product_id', 'quantity',
+            'catalog_product__minimum_stock_level', 'catalog_product__maximum_stock_level'
+        )
+        with transaction.atomic():
+            LowStockItem.objects.bulk_create([
+                LowStockItem(
+                    inventory_id=pk, store_id=store_id, product_id=product_id, quantity=quantity,
+                    minimum_stock_level=minimum, maximum_stock_level=maximum, below_since=now
+                )
+                for pk, store_id, product_id, quantity, minimum, maximum in rows
+            ])
+
+
+class Migration(migrations.Migration):
+
+    # The index is seeded in batches, each committed on its own
+    atomic = False
+
+    dependencies = [
+        ('core', '0010_stock_lots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LowStockItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('minimum_stock_level', models.IntegerField()),
+                ('maximum_stock_level', models.IntegerField()),
+                ('below_since', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('inventory', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='low_stock', to='core.inventory')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.product')),
+                ('store', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.store')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['store', 'below_since'], name='core_lowsto_store_i_3405f6_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockLevelEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('below_minimum', 'Fell Below Minimum'), ('recovered', 'Back At Minimum')], max_length=20)),
+                ('quantity', models.IntegerField()),
+                ('minimum_stock_level', models.IntegerField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('inventory', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.inventory')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.product')),
+                ('store', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.store')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['created_at'], name='stocklevelevent_pending_idx')],
+            },
+        ),
+        migrations.RunPython(seed_low_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.7 on 2026-10-19 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_low_stock_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActiveAgentModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('forecaster', 'Demand forecaster (InventoryAgent)'), ('detector', 'Object detector (VisionInspectorAgent)'), ('llm', 'Language model (ExplainerAgent)')], max_length=20, unique=True)),
+                ('version', models.CharField(help_text='model_version / processed_by_model / language_model value', max_length=100)),
+                ('activated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
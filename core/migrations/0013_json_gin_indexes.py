@@ -0,0 +1,59 @@
+# Generated by Django 5.1.7 on 2026-10-19 09:40
+#
+# GIN indexes (jsonb_path_ops) for the `@>` containment filters in
+# core.json_filters. They're PostgreSQL-only, so they are created here
+# rather than declared on the models - SQLite has no GIN and falls back to
+# scanning. Built CONCURRENTLY so writes aren't blocked while they build.
+
+from django.db import migrations
+
+
+# (model, JSON field) pairs filtered by containment
+GIN_FIELDS = [
+    ('demandforecast', 'external_factors'),
+    ('visioninspection', 'anomalies_found'),
+    ('externaldisruption', 'affected_areas'),
+    ('cortexcoordination', 'involved_agents'),
+]
+
+
+def _index_name(model, field):
+    return f'{model._meta.db_table}_{field.column}_gin'
+
+
+def create_gin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    quote = schema_editor.quote_name
+    for model_name, field_name in GIN_FIELDS:
+        model = apps.get_model('core', model_name)
+        field = model._meta.get_field(field_name)
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {quote(_index_name(model, field))} '
+            f'ON {quote(model._meta.db_table)} USING gin ({quote(field.column)} jsonb_path_ops)'
+        )
+
+
+def drop_gin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name, field_name in GIN_FIELDS:
+        model = apps.get_model('core', model_name)
+        field = model._meta.get_field(field_name)
+        schema_editor.execute(
+            f'DROP INDEX CONCURRENTLY IF EXISTS {schema_editor.quote_name(_index_name(model, field))}'
+        )
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0012_active_agent_model'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_gin_indexes, drop_gin_indexes),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.1.7 on 2026-10-19 10:05
+#
+# PostgreSQL full-text search for core.search: a `search_vector` tsvector
+# column on each searched table, kept current by the built-in
+# tsvector_update_trigger and GIN-indexed. The column is added empty (no
+# table rewrite), backfilled in primary-key batches each committed on its
+# own, and indexed CONCURRENTLY. It isn't a model field - only raw search
+# queries read it - so other databases skip this migration.
+
+from django.db import migrations
+from django.db.models import Max, Min
+
+
+BATCH_SIZE = 10000
+SEARCH_CONFIG = 'pg_catalog.english'
+
+# model -> text fields, as in core.search.SEARCH_TARGETS
+SEARCH_FIELDS = {
+    'agentexplanation': ('query', 'explanation_text'),
+    'externaldisruption': ('title', 'description'),
+    'stockrebalanceaction': ('reason',),
+    'transferlog': ('reason',),
+}
+
+
+def add_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    quote = schema_editor.quote_name
+    for model_name, field_names in SEARCH_FIELDS.items():
+        model = apps.get_model('core', model_name)
+        table = quote(model._meta.db_table)
+        columns = [model._meta.get_field(name).column for name in field_names]
+        document = " || ' ' || ".join(f"coalesce({quote(column)}, '')" for column in columns)
+        trigger = quote(model._meta.db_table + '_search_vector')
+
+        schema_editor.execute(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector')
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {trigger} ON {table}')
+        schema_editor.execute(
+            f'CREATE TRIGGER {trigger} '
+            f'BEFORE INSERT OR UPDATE ON {table} FOR EACH ROW EXECUTE FUNCTION '
+            f"tsvector_update_trigger(search_vector, '{SEARCH_CONFIG}', {', '.join(quote(c) for c in columns)})"
+        )
+
+        bounds = model.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is not None:
+            for low in range(bounds['low'], bounds['high'] + 1, BATCH_SIZE):
+                schema_editor.execute(
+                    f"UPDATE {table} SET search_vector = to_tsvector('{SEARCH_CONFIG}', {document}) "
+                    f'WHERE {quote(model._meta.pk.column)} >= %s AND {quote(model._meta.pk.column)} < %s',
+                    (low, low + BATCH_SIZE)
+                )
+
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {quote(model._meta.db_table + "_search_vector_gin")} '
+            f'ON {table} USING gin (search_vector)'
+        )
+
+
+def drop_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    quote = schema_editor.quote_name
+    for model_name in SEARCH_FIELDS:
+        table = apps.get_model('core', model_name)._meta.db_table
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {quote(table + "_search_vector")} ON {quote(table)}')
+        schema_editor.execute(f'ALTER TABLE {quote(table)} DROP COLUMN IF EXISTS search_vector')
+
+
+class Migration(migrations.Migration):
+
+    # Batched backfill and CREATE INDEX CONCURRENTLY can't run inside one transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0013_json_gin_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_vectors, drop_search_vectors),
+    ]
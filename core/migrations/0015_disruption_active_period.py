@@ -0,0 +1,58 @@
+# Generated by Django 5.1.7 on 2026-10-19 10:30
+#
+# Disruption coordinates and updated_at for core.disruption_index, and on
+# PostgreSQL an `active_period` tstzrange column - [start_time, end_time],
+# unbounded while end_time is null - with a GiST index, so "in effect
+# during [a, b]" is one range-overlap index scan. It's a generated column
+# rather than a model field, so other databases skip it. The disruptions
+# table is small, so the rewrite from adding a stored column is brief.
+
+from django.db import migrations, models
+
+
+def add_active_period(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'ALTER TABLE core_externaldisruption ADD COLUMN IF NOT EXISTS active_period tstzrange '
+        "GENERATED ALWAYS AS (tstzrange(start_time, end_time, '[]')) STORED"
+    )
+    schema_editor.execute(
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS core_externaldisruption_active_period_gist '
+        'ON core_externaldisruption USING gist (active_period)'
+    )
+
+
+def drop_active_period(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('ALTER TABLE core_externaldisruption DROP COLUMN IF EXISTS active_period')
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0014_full_text_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='externaldisruption',
+            name='latitude',
+            field=models.FloatField(blank=True, help_text='Centre of the impact radius', null=True),
+        ),
+        migrations.AddField(
+            model_name='externaldisruption',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='externaldisruption',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(add_active_period, drop_active_period),
+    ]
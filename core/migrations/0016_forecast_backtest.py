@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-19 09:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_disruption_active_period'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ForecastBacktestDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('forecast_date', models.DateField(unique=True)),
+                ('forecasts', models.IntegerField(default=0)),
+                ('forecast_units', models.IntegerField(default=0)),
+                ('actual_units', models.IntegerField(default=0, help_text='Realized demand of the forecast store/products')),
+                ('wape', models.FloatField(blank=True, null=True)),
+                ('mape', models.FloatField(blank=True, null=True)),
+                ('bias', models.FloatField(blank=True, help_text='Over (+) or under (-) forecast, relative to demand', null=True)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.7 on 2026-10-19 09:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_forecast_backtest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ForecastCurve',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_date', models.DateField(help_text='First forecast day; day n of the horizon is run_date + n')),
+                ('horizon_days', models.SmallIntegerField()),
+                ('points', models.BinaryField(help_text='Mean, then each forecast_store.QUANTILES level, horizon_days values each')),
+                ('confidence_score', models.FloatField(help_text='0-1 confidence level')),
+                ('model_version', models.CharField(default='LNN_v1', max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.product')),
+                ('store', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='core.store')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['run_date'], name='core_foreca_run_dat_1e905e_idx')],
+                'constraints': [models.UniqueConstraint(fields=('store', 'product', 'run_date', 'model_version'), name='unique_forecast_curve_run')],
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.7 on 2026-10-19 09:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_forecast_curves'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ForecastCubeBuild',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('forecast_date', models.DateField()),
+                ('method', models.CharField(choices=[('bottom_up', 'Bottom-up'), ('mint', 'MinT (structural scaling)')], max_length=20)),
+                ('forecasts', models.IntegerField(default=0, help_text='DemandForecast rows the cube was built from')),
+                ('last_forecast_at', models.DateTimeField(blank=True, null=True)),
+                ('build_ms', models.FloatField(default=0)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('forecast_date', 'method')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ForecastAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('store_level', models.CharField(max_length=20)),
+                ('store_key', models.CharField(max_length=255)),
+                ('product_level', models.CharField(max_length=20)),
+                ('product_key', models.CharField(max_length=255)),
+                ('region', models.CharField(blank=True, max_length=255)),
+                ('store_type', models.CharField(blank=True, max_length=50)),
+                ('category', models.CharField(blank=True, max_length=100)),
+                ('series', models.IntegerField(help_text='Store/product forecasts summed into this node')),
+                ('base_demand', models.FloatField(blank=True, help_text='Independent estimate from recent demand', null=True)),
+                ('forecast_demand', models.FloatField(help_text='Sum of the unreconciled forecasts')),
+                ('demand', models.FloatField(help_text='Reconciled demand; coherent across all levels')),
+                ('build', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cells', to='core.forecastcubebuild')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['build', 'store_level', 'product_level'], name='core_foreca_build_i_c5a0b3_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,163 @@
+# Generated by Django 5.1.7 on 2026-10-19 09:24
+#
+# Monthly range partitioning of the append-heavy agent history tables on
+# PostgreSQL (see core.partitioning). Each table is rebuilt as a
+# partitioned table: same columns and defaults, one partition per month
+# from its oldest row to PREMAKE_MONTHS ahead plus a default partition,
+# the rows copied over, then the old table dropped and its indexes,
+# constraints and triggers (the 0013 GIN indexes, the 0014 search trigger)
+# recreated on the new one. PostgreSQL requires the partition column in
+# every primary key and unique constraint, so it is appended to them, and
+# the id sequence replaces the identity column. TaskSpan's foreign key to
+# CortexCoordination is dropped first: it can't reference a partitioned
+# table's (id) alone.
+#
+# The copy runs in the migration's transaction and blocks writes to the
+# four tables while it runs. Other databases keep plain tables.
+
+import re
+from datetime import date
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+PREMAKE_MONTHS = 3
+
+# model -> partition column, as in core.partitioning.PARTITIONED_MODELS
+PARTITIONED = {
+    'agentmetrics': 'timestamp',
+    'demandforecast': 'forecast_date',
+    'agentexplanation': 'created_at',
+    'cortexcoordination': 'created_at',
+}
+
+KEY_CONSTRAINT = re.compile(r'^(UNIQUE) \((.*?)\)(.*)$')
+UNIQUE_INDEX = re.compile(r'^(CREATE UNIQUE INDEX .* USING \w+ )\((.*?)\)(.*)$')
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def with_column(columns, column, present):
+    """A key's column list with the partition column appended (present) or removed"""
+    names = [name.strip() for name in columns.split(',')]
+    names = [name for name in names if name.strip('"') != column]
+    if present:
+        names.append(f'"{column}"')
+    return ', '.join(names)
+
+
+def definitions(cursor, table):
+    """(constraints, indexes, triggers) of a table as SQL, constraint-backed indexes excluded"""
+    cursor.execute(
+        "SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f', 'c') "
+        "ORDER BY CASE contype WHEN 'p' THEN 0 WHEN 'u' THEN 1 ELSE 2 END",
+        [table]
+    )
+    constraints = cursor.fetchall()
+    cursor.execute(
+        'SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i WHERE i.indrelid = %s::regclass '
+        'AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)',
+        [table]
+    )
+    indexes = [definition for definition, in cursor.fetchall()]
+    cursor.execute(
+        'SELECT pg_get_triggerdef(oid) FROM pg_trigger WHERE tgrelid = %s::regclass AND NOT tgisinternal',
+        [table]
+    )
+    triggers = [definition for definition, in cursor.fetchall()]
+    return constraints, indexes, triggers
+
+
+def rebuild(schema_editor, model, column, partitioned):
+    """Copy `model`'s table into a new (un)partitioned table of the same name"""
+    quote = schema_editor.quote_name
+    table = model._meta.db_table
+    pk = model._meta.pk.column
+    new = f'{table}_rebuild'
+    with schema_editor.connection.cursor() as cursor:
+        constraints, indexes, triggers = definitions(cursor, table)
+
+        schema_editor.execute(
+            f'CREATE TABLE {quote(new)} (LIKE {quote(table)} INCLUDING DEFAULTS INCLUDING STORAGE INCLUDING COMMENTS)'
+            + (f' PARTITION BY RANGE ({quote(column)})' if partitioned else '')
+        )
+        if partitioned:
+            cursor.execute(f'SELECT min({quote(column)}) FROM {quote(table)}')
+            oldest = cursor.fetchone()[0] or date.today()
+            month = date(oldest.year, oldest.month, 1)
+            last = add_months(date.today().replace(day=1), PREMAKE_MONTHS)
+            while month <= last:
+                # Named after the final table; partitions keep their names when the parent is renamed
+                schema_editor.execute(
+                    f'CREATE TABLE {quote(f"{table}_p{month.year:04d}_{month.month:02d}")} PARTITION OF {quote(new)} '
+                    f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') "
+                    f"TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+                )
+                month = add_months(month, 1)
+            schema_editor.execute(f'CREATE TABLE {quote(table + "_default")} PARTITION OF {quote(new)} DEFAULT')
+
+        schema_editor.execute(f'INSERT INTO {quote(new)} SELECT * FROM {quote(table)}')
+        cursor.execute(f'SELECT max({quote(pk)}) FROM {quote(table)}')
+        last_id = cursor.fetchone()[0]
+        schema_editor.execute(f'DROP TABLE {quote(table)}')
+        schema_editor.execute(f'ALTER TABLE {quote(new)} RENAME TO {quote(table)}')
+
+        sequence = quote(f'{table}_{pk}_seq')
+        schema_editor.execute(f'CREATE SEQUENCE IF NOT EXISTS {sequence} OWNED BY {quote(table)}.{quote(pk)}')
+        if last_id is not None:
+            schema_editor.execute('SELECT setval(%s, %s)', [f'{table}_{pk}_seq', last_id])
+        schema_editor.execute(
+            f"ALTER TABLE {quote(table)} ALTER COLUMN {quote(pk)} SET DEFAULT nextval('{table}_{pk}_seq')"
+        )
+
+        for name, kind, definition in constraints:
+            if kind == 'p':
+                definition = f'PRIMARY KEY ({quote(pk)}{", " + quote(column) if partitioned else ""})'
+            elif kind == 'u':
+                keyword, columns, rest = KEY_CONSTRAINT.match(definition).groups()
+                definition = f'{keyword} ({with_column(columns, column, partitioned)}){rest}'
+            schema_editor.execute(f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}')
+        for definition in indexes:
+            match = UNIQUE_INDEX.match(definition)
+            if match:
+                head, columns, rest = match.groups()
+                definition = f'{head}({with_column(columns, column, partitioned)}){rest}'
+            schema_editor.execute(definition)
+        for definition in triggers:
+            schema_editor.execute(definition)
+        schema_editor.execute(f'ANALYZE {quote(table)}')
+
+
+def partition_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name, column in PARTITIONED.items():
+        rebuild(schema_editor, apps.get_model('core', model_name), column, partitioned=True)
+
+
+def unpartition_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name, column in PARTITIONED.items():
+        rebuild(schema_editor, apps.get_model('core', model_name), column, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_forecast_cube'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='taskspan',
+            name='coordination',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='spans', to='core.cortexcoordination'),
+        ),
+        migrations.RunPython(partition_tables, unpartition_tables),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 09:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_partition_agent_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='endpointprofile',
+            name='serialize_time_ms',
+            field=models.FloatField(default=0, help_text='serializer.data, excluding its queries'),
+        ),
+    ]
@@ -0,0 +1,217 @@
+"""
+Process-local registry of the ML models behind the agents
+
+Loading a forecaster, detector or LLM client takes seconds, so each
+worker process loads a model at most once - on first use, or at worker
+start for the kinds in AGENT_MODEL_WARMUP - and keeps it keyed by
+(kind, version), where the version is the same string the agents store
+in DemandForecast.model_version, VisionInspection.processed_by_model and
+AgentExplanation.language_model. AGENT_MODEL_LOADERS names the function
+that loads each kind.
+
+The version to use is the kind's ActiveAgentModel row (AGENT_MODEL_DEFAULTS
+until one is set). Each process re-reads it at most every
+AGENT_MODEL_CHECK_SECONDS, so activating a new version hot-swaps every
+worker without a restart: the new model is loaded before it is used and
+the old one dropped. Every load records its time and memory growth.
+
+If the active version can't be loaded in a process (its artifact is
+missing on that host, say), the process keeps serving the version it
+already has, else the kind's default, records the failure, and retries
+after AGENT_MODEL_CHECK_SECONDS.
+"""
+import os
+import resource
+import threading
+import time
+from dataclasses import dataclass, field
+
+from celery.signals import worker_process_init
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .agent_models import ActiveAgentModel, AgentMetrics
+
+
+# kind -> agent whose metrics the loads are recorded under
+AGENT_NAMES = {
+    'forecaster': 'InventoryAgent',
+    'detector': 'VisionInspectorAgent',
+    'llm': 'ExplainerAgent',
+}
+
+
+def _rss_bytes():
+    """Current resident set size; peak RSS where /proc isn't available"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@dataclass
+class LoadedModel:
+    kind: str
+    version: str
+    model: object
+    load_seconds: float
+    memory_bytes: int
+    loaded_at: object = field(default_factory=timezone.now)
+    uses: int = 0
+
+
+class ModelRegistry:
+    """Loaded models of this process; use the module-level `registry`"""
+
+    def __init__(self):
+        self._models = {}  # (kind, version) -> LoadedModel
+        self._active = {}  # kind -> (checked at, version)
+        self._failed = {}  # (kind, version) -> when it last failed to load
+        self._lock = threading.Lock()
+
+    def active_version(self, kind):
+        """The version this kind should use, re-read every AGENT_MODEL_CHECK_SECONDS"""
+        checked = self._active.get(kind)
+        now = time.monotonic()
+        if checked and now - checked[0] < settings.AGENT_MODEL_CHECK_SECONDS:
+            return checked[1]
+        version = ActiveAgentModel.objects.filter(kind=kind).values_list('version', flat=True).first()
+        version = version or settings.AGENT_MODEL_DEFAULTS[kind]
+        self._active[kind] = (now, version)
+        return version
+
+    def get(self, kind, version=None):
+        """
+        The LoadedModel for `version` (default: the active one), loading it
+        on first use. An explicit version that fails to load raises; the
+        active one falls back (see _fallback).
+        """
+        if kind not in settings.AGENT_MODEL_LOADERS:
+            raise KeyError(f'No loader configured for {kind} models')
+        requested = version
+        version = version or self.active_version(kind)
+        entry = self._models.get((kind, version))
+        if entry is None:
+            failed_at = self._failed.get((kind, version))
+            if requested is None and failed_at and time.monotonic() - failed_at < settings.AGENT_MODEL_CHECK_SECONDS:
+                return self._fallback(kind, version)
+            try:
+                entry = self._load(kind, version)
+            except Exception as exc:
+                self._failed[(kind, version)] = time.monotonic()
+                if requested is not None:
+                    raise
+                self._record_failure(kind, version, exc)
+                return self._fallback(kind, version)
+            self._failed.pop((kind, version), None)
+            if version == self.active_version(kind):
+                self._drop_inactive(kind, version)
+        entry.uses += 1
+        return entry
+
+    def _fallback(self, kind, failed):
+        """The most recently loaded other version of `kind`, else its default"""
+        loaded = [entry for (loaded_kind, version), entry in self._models.items()
+                  if loaded_kind == kind and version != failed]
+        if loaded:
+            entry = max(loaded, key=lambda entry: entry.loaded_at)
+            entry.uses += 1
+            return entry
+        default = settings.AGENT_MODEL_DEFAULTS[kind]
+        if default == failed:
+            raise RuntimeError(f'The default {kind} model {failed} could not be loaded')
+        return self.get(kind, default)
+
+    def _record_failure(self, kind, version, exc):
+        AgentMetrics.objects.create(
+            agent_name=AGENT_NAMES[kind],
+            metric_type='error_rate',
+            metric_value=1,
+            unit='count',
+            additional_data={
+                'event': 'model_load_failed',
+                'model': version,
+                'error': f'{type(exc).__name__}: {exc}',
+                'pid': os.getpid(),
+            }
+        )
+
+    def _load(self, kind, version):
+        with self._lock:
+            # Another thread may have loaded it while we waited
+            if (kind, version) in self._models:
+                return self._models[(kind, version)]
+            rss_before = _rss_bytes()
+            started = time.perf_counter()
+            model = import_string(settings.AGENT_MODEL_LOADERS[kind])(version)
+            entry = LoadedModel(
+                kind=kind,
+                version=version,
+                model=model,
+                load_seconds=time.perf_counter() - started,
+                memory_bytes=max(_rss_bytes() - rss_before, 0),
+            )
+            self._models[(kind, version)] = entry
+
+        AgentMetrics.objects.create(
+            agent_name=AGENT_NAMES[kind],
+            metric_type='resource_usage',
+            metric_value=round(entry.memory_bytes / 2 ** 20, 2),
+            unit='MB',
+            additional_data={
+                'event': 'model_load',
+                'model': version,
+                'load_time_ms': round(entry.load_seconds * 1000, 2),
+                'pid': os.getpid(),
+            }
+        )
+        return entry
+
+    def _drop_inactive(self, kind, active):
+        """Free the versions a hot-swap replaced"""
+        with self._lock:
+            for key in [key for key in self._models if key[0] == kind and key[1] != active]:
+                del self._models[key]
+
+    def warm(self, kinds=None):
+        """Load the active version of each kind now rather than on first use"""
+        return [self.get(kind) for kind in (kinds or settings.AGENT_MODEL_LOADERS)]
+
+    def activate(self, kind, version):
+        """
+        Make `version` the one every process uses.
+
+        It's loaded here first, so a version that fails to load is never
+        activated; other processes switch within AGENT_MODEL_CHECK_SECONDS.
+        """
+        entry = self.get(kind, version)
+        ActiveAgentModel.objects.update_or_create(kind=kind, defaults={'version': version})
+        self._active[kind] = (time.monotonic(), version)
+        self._drop_inactive(kind, version)
+        return entry
+
+    def stats(self):
+        return [
+            {
+                'kind': entry.kind,
+                'version': entry.version,
+                'load_time_ms': round(entry.load_seconds * 1000, 2),
+                'memory_mb': round(entry.memory_bytes / 2 ** 20, 2),
+                'loaded_at': entry.loaded_at.isoformat(),
+                'uses': entry.uses,
+                'pid': os.getpid(),
+            }
+            for entry in self._models.values()
+        ]
+
+
+registry = ModelRegistry()
+
+
+@worker_process_init.connect(dispatch_uid='agentx_model_warmup')
+def warm_models(**kwargs):
+    """Load the AGENT_MODEL_WARMUP kinds as each worker process starts"""
+    if settings.AGENT_MODEL_WARMUP:
+        registry.warm(settings.AGENT_MODEL_WARMUP)
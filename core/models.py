@@ -1,22 +1,132 @@
-from django.db import models
+import hashlib
+
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 
+from .agent_models import Store, Product
+
+
+def legacy_store_id(store_location):
+    """Stable Store.store_id for a free-text legacy location"""
+    return 'LEGACY-' + hashlib.sha1(store_location.encode('utf-8')).hexdigest()[:12].upper()
+
+
+def legacy_store_type(store_location):
+    lowered = store_location.lower()
+    if 'distribution center' in lowered:
+        return 'distribution_center'
+    if 'warehouse' in lowered:
+        return 'warehouse'
+    if 'fulfillment' in lowered:
+        return 'fulfillment_center'
+    return 'store'
+
+
+def matching_store(store_location):
+    """The Store of that name, else the Store at that location (legacy rows hold either); None if neither"""
+    return (Store.objects.filter(name=store_location).order_by('pk').first()
+            or Store.objects.filter(location=store_location).order_by('pk').first())
+
+
+def legacy_store(store_location):
+    """Store for a legacy location: matching_store(), else one created for it"""
+    store = matching_store(store_location)
+    if store is None:
+        store, _ = Store.objects.get_or_create(
+            store_id=legacy_store_id(store_location),
+            defaults={
+                'name': store_location,
+                'location': store_location,
+                'store_type': legacy_store_type(store_location),
+            }
+        )
+    return store
+
+
+def legacy_product(product_id, product_name):
+    """Catalog Product for a legacy product ID, created if the catalog doesn't have it"""
+    product, _ = Product.objects.get_or_create(
+        product_id=product_id,
+        defaults={
+            'name': product_name,
+            'category': 'uncategorized',
+            'unit_price': 0,
+            'unit_weight': 0,
+        }
+    )
+    return product
+
+
 class Inventory(models.Model):
     product_id = models.CharField(max_length=100)
     product_name = models.CharField(max_length=255)
     store_location = models.CharField(max_length=255)
+    # Normalized links to the agent catalog, kept in sync from the strings above
+    store = models.ForeignKey(Store, on_delete=models.SET_NULL, null=True, blank=True,
+                              related_name='legacy_inventory')
+    catalog_product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True,
+                                        related_name='legacy_inventory')
     quantity = models.IntegerField()
     expiry_date = models.DateField(null=True, blank=True)
     last_updated = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['store', 'catalog_product'], name='unique_inventory_store_product'),
+        ]
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            previous, store_location, product_id = 0, None, None
+            if not adding:
+                previous, store_location, product_id = Inventory.objects.select_for_update().filter(
+                    pk=self.pk
+                ).values_list('quantity', 'store_location', 'product_id').first() or (0, None, None)
+            # Quantity edits keep their links; only new or renamed strings are resolved again
+            if self.store_id is None or self.store_location != store_location:
+                self.store = legacy_store(self.store_location)
+            if self.catalog_product_id is None or self.product_id != product_id:
+                self.catalog_product = legacy_product(self.product_id, self.product_name)
+            super().save(*args, **kwargs)
+            # Direct edits of quantity go on the ledger like any other movement
+            if self.quantity != previous:
+                StockLedgerEntry.objects.create(
+                    inventory=self,
+                    store_id=self.store_id,
+                    delta=self.quantity - previous,
+                    reason='opening' if adding else 'correction'
+                )
+                # Imported here: stock_lots builds on these models
+                from .stock_lots import LotBook
+                book = LotBook([self.pk])
+                if self.quantity > previous:
+                    book.receive(self.pk, self.store_id, self.quantity - previous, self.expiry_date)
+                else:
+                    book.withdraw(self.pk, previous - self.quantity)
+                book.save()
+            from .low_stock import refresh_low_stock
+            refresh_low_stock([self.pk])
+
 class TransferLog(models.Model):
     from_store = models.CharField(max_length=255)
     to_store = models.CharField(max_length=255)
+    source_store = models.ForeignKey(Store, on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='legacy_transfers_out')
+    target_store = models.ForeignKey(Store, on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='legacy_transfers_in')
     product = models.ForeignKey(Inventory, on_delete=models.CASCADE)
     quantity = models.IntegerField()
     timestamp = models.DateTimeField(auto_now_add=True)
     reason = models.TextField()
 
+    def save(self, *args, **kwargs):
+        self.source_store = legacy_store(self.from_store)
+        self.target_store = legacy_store(self.to_store)
+        super().save(*args, **kwargs)
+
 class DeliveryRoute(models.Model):
     route_id = models.CharField(max_length=100)
     start_point = models.CharField(max_length=255)
@@ -33,3 +143,129 @@ class AgentLog(models.Model):
     agent_name = models.CharField(max_length=255)
     action = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
+
+
+class StockLedgerEntry(models.Model):
+    """Append-only record of one stock change; stock at any time is the sum of entries"""
+    # No FK constraint: history outlives deleted inventory rows
+    # Indexed through the composite indexes below; single-column FK indexes would only slow inserts
+    inventory = models.ForeignKey(Inventory, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+                                  related_name='ledger_entries')
+    store = models.ForeignKey(Store, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+                              null=True, blank=True, related_name='+')
+    delta = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=[
+        ('opening', 'Opening Balance'),
+        ('transfer_out', 'Transfer Out'),
+        ('transfer_in', 'Transfer In'),
+        ('adjustment', 'Adjustment'),
+        ('correction', 'Manual Correction'),
+        ('received', 'Lot Received'),
+        ('removed', 'Inventory Row Removed')
+    ])
+    transfer = models.ForeignKey(TransferLog, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+                                 null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'created_at']),
+            models.Index(fields=['inventory', 'created_at']),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Stock ledger entries are append-only')
+        super().save(*args, **kwargs)
+
+
+class StockSnapshot(models.Model):
+    """Per-store stock levels as of taken_at, rolled forward from the ledger"""
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='stock_snapshots')
+    taken_at = models.DateTimeField()
+    quantities = models.JSONField(default=dict, help_text="{inventory_id: quantity}")
+    entries_applied = models.IntegerField(default=0, help_text="Ledger rows folded in since the previous snapshot")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['store', 'taken_at']
+
+
+class StockLot(models.Model):
+    """Part of an inventory row's stock sharing one expiry date; a row's lots sum to its quantity"""
+    # Indexed through (inventory, expiry_date) below
+    inventory = models.ForeignKey(Inventory, on_delete=models.CASCADE, db_index=False, related_name='lots')
+    # Copied from the inventory row so the expiring-stock index covers it
+    store = models.ForeignKey(Store, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    lot_number = models.CharField(max_length=100, blank=True)
+    quantity = models.PositiveIntegerField()
+    expiry_date = models.DateField(null=True, blank=True, help_text="Blank for non-perishable stock")
+    received_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # "Expiring within N days" for the whole network is one range scan over this index
+            models.Index(fields=['expiry_date', 'store', 'quantity'], condition=models.Q(quantity__gt=0),
+                         name='stocklot_expiring_idx'),
+            models.Index(fields=['inventory', 'expiry_date']),
+        ]
+
+
+class LowStockItem(models.Model):
+    """An inventory row currently below its product's minimum stock level, kept up to date by core.low_stock"""
+    inventory = models.OneToOneField(Inventory, on_delete=models.CASCADE, related_name='low_stock')
+    store = models.ForeignKey(Store, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    quantity = models.IntegerField()
+    minimum_stock_level = models.IntegerField()
+    maximum_stock_level = models.IntegerField()
+    below_since = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'below_since']),
+        ]
+
+
+class StockLevelEvent(models.Model):
+    """A low-stock threshold crossing, published for the low-stock agent task to act on"""
+    # No FK constraint: events outlive deleted inventory rows
+    inventory = models.ForeignKey(Inventory, on_delete=models.DO_NOTHING, db_constraint=False,
+                                  related_name='+')
+    store = models.ForeignKey(Store, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    kind = models.CharField(max_length=20, choices=[
+        ('below_minimum', 'Fell Below Minimum'),
+        ('recovered', 'Back At Minimum')
+    ])
+    quantity = models.IntegerField()
+    minimum_stock_level = models.IntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], condition=models.Q(processed_at__isnull=True),
+                         name='stocklevelevent_pending_idx'),
+        ]
+
+
+@receiver(post_delete, sender=Inventory)
+def record_removed_inventory(sender, instance, **kwargs):
+    # Take the row's last balance off the ledger so store totals stay right
+    if instance.quantity:
+        StockLedgerEntry.objects.create(
+            inventory_id=instance.pk,
+            store_id=instance.store_id,
+            delta=-instance.quantity,
+            reason='removed'
+        )
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_low_stock(sender, instance, created, **kwargs):
+    # A changed minimum_stock_level moves every store's row of the product across the threshold at once
+    if not created:
+        from .low_stock import refresh_product
+        refresh_product(instance.pk)
@@ -0,0 +1,141 @@
+"""
+Monthly partitions of the append-heavy agent history tables
+
+On PostgreSQL, migration 0019 turns each table below into a table
+partitioned by range of its time column, one partition per calendar
+month (UTC) named <table>_pYYYY_MM, plus a <table>_default partition that
+catches rows outside them. Queries filtering on the time column only
+touch the months they need, vacuum works month by month, and old months
+leave the database by dropping a partition (core.archive) instead of a
+slow DELETE.
+
+The primary key and unique constraints include the partition column, as
+PostgreSQL requires; the UUID columns are unique per month. Other
+databases keep plain tables; the same functions then do nothing.
+"""
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .agent_models import AgentExplanation, AgentMetrics, CortexCoordination, DemandForecast
+
+
+# model -> partition column; migration 0019 partitions the same tables
+PARTITIONED_MODELS = {
+    AgentMetrics: 'timestamp',
+    DemandForecast: 'forecast_date',
+    AgentExplanation: 'created_at',
+    CortexCoordination: 'created_at',
+}
+
+# How long detaching a partition may wait for the parent's lock
+DETACH_LOCK_TIMEOUT = '5s'
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bounds(model, month):
+    """[start, end) of a month as values of the model's partition field"""
+    start, end = month, add_months(month, 1)
+    if model._meta.get_field(PARTITIONED_MODELS[model]).get_internal_type() == 'DateTimeField':
+        start, end = (datetime.combine(day, datetime.min.time(), tzinfo=dt_timezone.utc) for day in (start, end))
+    return start, end
+
+
+def partition_name(model, month):
+    return f'{model._meta.db_table}_p{month.year:04d}_{month.month:02d}'
+
+
+def is_partitioned(model):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [model._meta.db_table]
+        )
+        return cursor.fetchone() is not None
+
+
+def partition_months(model):
+    """Months that have a partition, oldest first"""
+    prefix = f'{model._meta.db_table}_p'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = to_regclass(%s)', [model._meta.db_table]
+        )
+        names = [name for name, in cursor.fetchall() if name.startswith(prefix)]
+    return sorted(date(int(name[-7:-3]), int(name[-2:]), 1) for name in names)
+
+
+def create_partition(model, month):
+    """
+    Add the month's partition. Rows of that month already in the default
+    partition (the month wasn't created in time) are moved into it.
+    """
+    quote = connection.ops.quote_name
+    table = model._meta.db_table
+    column = quote(model._meta.get_field(PARTITIONED_MODELS[model]).column)
+    default = quote(f'{table}_default')
+    start, end = month_bounds(model, month)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'SELECT 1 FROM {default} WHERE {column} >= %s AND {column} < %s LIMIT 1', [start, end])
+        stranded = cursor.fetchone() is not None
+        if stranded:
+            cursor.execute(f'ALTER TABLE {quote(table)} DETACH PARTITION {default}')
+        cursor.execute(
+            f'CREATE TABLE {quote(partition_name(model, month))} PARTITION OF {quote(table)} '
+            f'FOR VALUES FROM (%s) TO (%s)', [start, end]
+        )
+        if stranded:
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM {default} WHERE {column} >= %s AND {column} < %s RETURNING *) '
+                f'INSERT INTO {quote(table)} SELECT * FROM moved', [start, end]
+            )
+            cursor.execute(f'ALTER TABLE {quote(table)} ATTACH PARTITION {default} DEFAULT')
+
+
+def ensure_partitions(months_ahead=None):
+    """Create any missing partitions from this month to PARTITION_PREMAKE_MONTHS ahead; returns their names"""
+    months_ahead = settings.PARTITION_PREMAKE_MONTHS if months_ahead is None else months_ahead
+    this_month = month_start(timezone.now().astimezone(dt_timezone.utc))
+    created = []
+    for model in PARTITIONED_MODELS:
+        if not is_partitioned(model):
+            continue
+        existing = set(partition_months(model))
+        for offset in range(months_ahead + 1):
+            month = add_months(this_month, offset)
+            if month not in existing:
+                create_partition(model, month)
+                created.append(partition_name(model, month))
+    return created
+
+
+def detach_partition(model, month):
+    """
+    Detach a month's partition and return its table name; the table stays,
+    out of the parent's reads and writes, to be archived and dropped. A
+    partition left detached by an interrupted archive run is returned again.
+    None if the month has neither.
+    """
+    quote = connection.ops.quote_name
+    name = partition_name(model, month)
+    if month in partition_months(model):
+        with transaction.atomic(), connection.cursor() as cursor:
+            # DETACH briefly locks the parent; give up rather than queue every query behind it
+            cursor.execute(f"SET LOCAL lock_timeout = '{DETACH_LOCK_TIMEOUT}'")
+            cursor.execute(f'ALTER TABLE {quote(model._meta.db_table)} DETACH PARTITION {quote(name)}')
+        return name
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [name])
+        return name if cursor.fetchone()[0] is not None else None
@@ -0,0 +1,131 @@
+"""
+Query and timing instrumentation shared by the request profiler and task tracing
+"""
+import contextvars
+import cProfile
+import io
+import pstats
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper that counts queries, DB time and repeated statements.
+
+    Statements are keyed by their SQL with placeholders, so the same query
+    run for every row of a list (an N+1 in a nested serializer) shows up as
+    one statement with a high count.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+    @contextmanager
+    def record(self):
+        """Record queries on every configured database for the duration of the block"""
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    @property
+    def duplicate_count(self):
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+    def repeated(self, threshold):
+        """Statements run at least `threshold` times, most frequent first"""
+        return [
+            {'sql': sql[:500], 'count': count}
+            for sql, count in self.statements.most_common()
+            if count >= threshold
+        ]
+
+
+def cprofile_stacks(func, limit=25):
+    """Run func under cProfile, returning (result, top functions by cumulative time)"""
+    profiler = cProfile.Profile()
+    result = profiler.runcall(func)
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(limit)
+    return result, output.getvalue()
+
+
+def pyinstrument_stacks(func):
+    """Run func under pyinstrument if it's installed, falling back to cProfile"""
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        return cprofile_stacks(func)
+    profiler = Profiler()
+    profiler.start()
+    try:
+        result = func()
+    finally:
+        profiler.stop()
+    return result, profiler.output_text(unicode=True, color=False)
+
+
+# The request ProfilingMiddleware is profiling in this context, if any
+_profiled_request = contextvars.ContextVar('profiled_request', default=None)
+
+
+@contextmanager
+def profile_request(request):
+    """Report serializer_timing() blocks run inside this one to `request`"""
+    request._profile_serializing = False
+    token = _profiled_request.set(request)
+    try:
+        yield
+    finally:
+        _profiled_request.reset(token)
+
+
+@contextmanager
+def serializer_timing():
+    """
+    Add the block's time - and the DB time spent inside it, e.g. a nested
+    serializer's N+1 queries - to the profiled request's serialize timings.
+    Blocks nested in another one are already counted by it.
+    """
+    request = _profiled_request.get()
+    if request is None or request._profile_serializing:
+        yield
+        return
+    timings, recorder = request._profile_timings, request._profile_recorder
+    started, db_started = time.perf_counter(), recorder.duration
+    request._profile_serializing = True
+    try:
+        yield
+    finally:
+        request._profile_serializing = False
+        timings['serialize'] = timings.get('serialize', 0.0) + time.perf_counter() - started
+        timings['serialize_db'] = timings.get('serialize_db', 0.0) + recorder.duration - db_started
+
+
+class TimedSerializerMixin:
+    """
+    Serializer side of request profiling: on profiled requests, time spent
+    in to_representation - where a serializer builds its output and runs
+    any per-row queries - is reported as serialize time, apart from the
+    view's own code (app) and JSON rendering (render), however the view
+    built the serializer
+    """
+
+    def to_representation(self, instance):
+        with serializer_timing():
+            return super().to_representation(instance)
@@ -0,0 +1,116 @@
+"""
+Precomputed OpenAPI schema, served from memory with an ETag
+
+Generating the schema walks every view and extend_schema decorator,
+which takes seconds. `manage.py build_openapi_schema` writes it once
+at build time to an artifact keyed by the code revision
+(OPENAPI_SCHEMA_DIR/openapi-<VERSION>-<revision>.json, see
+source_revision()), so an artifact from other code is never served;
+each process loads the one for its revision on first request - or
+generates the schema once if there's none - and keeps the rendered YAML
+and JSON in memory. Responses carry an ETag, so clients and the
+Swagger/Redoc pages revalidate with a 304 instead of downloading it
+again.
+
+With DEBUG on, or a ?lang=/?version= request, the schema is generated
+per request as before, so code edits show up immediately.
+"""
+import hashlib
+import json
+import subprocess
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse, HttpResponseNotModified
+from drf_spectacular.generators import SchemaGenerator
+from drf_spectacular.renderers import OpenApiJsonRenderer
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.views import SpectacularAPIView
+
+
+_schema = None
+_rendered = {}  # renderer class -> (body, etag)
+_revision = None  # '' once looked up and not found
+
+
+def source_revision():
+    """The code's revision: OPENAPI_SCHEMA_REVISION, else the git HEAD commit; None if neither is known"""
+    global _revision
+    if _revision is None:
+        _revision = settings.OPENAPI_SCHEMA_REVISION or _git_head() or ''
+    return _revision or None
+
+
+def _git_head():
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True,
+                                text=True, timeout=5, check=True)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def schema_artifact_path():
+    """Where this revision's artifact lives; None when the revision isn't known"""
+    revision = source_revision()
+    if revision is None:
+        return None
+    return Path(settings.OPENAPI_SCHEMA_DIR) / f'openapi-{spectacular_settings.VERSION}-{revision[:12]}.json'
+
+
+def generate_schema():
+    return SchemaGenerator().get_schema(request=None, public=True)
+
+
+def write_schema_artifact(path=None):
+    """Generate the schema and write it to this revision's artifact (or `path`); returns the path"""
+    path = path or schema_artifact_path()
+    if path is None:
+        raise ImproperlyConfigured('No code revision to key the schema artifact by: set SOURCE_REVISION')
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(OpenApiJsonRenderer().render(generate_schema(), renderer_context={}))
+    return path
+
+
+def cached_schema():
+    """This process's schema: the artifact of its revision if there is one, else generated once"""
+    global _schema
+    if _schema is None:
+        path = schema_artifact_path()
+        _schema = json.loads(path.read_bytes()) if path and path.exists() else generate_schema()
+    return _schema
+
+
+def clear_schema_cache():
+    global _schema, _revision
+    _schema = None
+    _revision = None
+    _rendered.clear()
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    """SpectacularAPIView serving the cached schema with an ETag"""
+
+    def _get_schema_response(self, request):
+        if settings.DEBUG or request.GET.keys() - {'format'} or self.api_version or request.version:
+            return super()._get_schema_response(request)
+
+        renderer = request.accepted_renderer
+        if type(renderer) not in _rendered:
+            body = renderer.render(cached_schema(), renderer_context={})
+            _rendered[type(renderer)] = (body, f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+        body, etag = _rendered[type(renderer)]
+
+        if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+            response = HttpResponseNotModified()
+        else:
+            content_type = renderer.media_type
+            if renderer.charset:
+                content_type = f'{content_type}; charset={renderer.charset}'
+            response = HttpResponse(body, content_type=content_type)
+            response['Content-Disposition'] = f'inline; filename="{self._get_filename(request, None)}"'
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
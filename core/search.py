@@ -0,0 +1,183 @@
+"""
+Full-text search over the free-text fields support staff look through
+
+    GET /api/search/?q=cold+chain+delay&type=explanations,disruptions
+
+On PostgreSQL each searched table has a `search_vector` tsvector column,
+kept up to date by a trigger and GIN-indexed (migration 0014), so a
+search is an index lookup plus ts_rank over the matches instead of an
+`icontains` scan of the whole history. The query uses websearch syntax
+("quoted phrases", -excluded, or).
+
+Other databases (SQLite in development) search an inverted index kept in
+process memory: built on first search, extended with newer rows on each
+search, and rebuilt every SEARCH_FALLBACK_REBUILD_SECONDS to pick up
+edits and deletes. It ANDs the query's words and ranks by BM25.
+"""
+import heapq
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+from django.db import connections
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+
+from .agent_models import AgentExplanation, ExternalDisruption, StockRebalanceAction
+from .models import TransferLog
+
+
+SEARCH_CONFIG = 'english'
+SEARCH_COLUMN = 'search_vector'
+
+# A query needs a word at least this long (one-letter words match most of the history)
+MIN_QUERY_LENGTH = 2
+
+
+@dataclass(frozen=True)
+class SearchTarget:
+    model: type
+    fields: tuple
+    timestamp_field: str
+
+
+# type -> what is searched; migration 0014 indexes the same fields
+SEARCH_TARGETS = {
+    'explanations': SearchTarget(AgentExplanation, ('query', 'explanation_text'), 'created_at'),
+    'disruptions': SearchTarget(ExternalDisruption, ('title', 'description'), 'created_at'),
+    'rebalances': SearchTarget(StockRebalanceAction, ('reason',), 'created_at'),
+    'transfers': SearchTarget(TransferLog, ('reason',), 'timestamp'),
+}
+
+
+def searchable(text):
+    """Whether `text` has a word of at least MIN_QUERY_LENGTH characters that isn't a stopword"""
+    return any(len(token) >= MIN_QUERY_LENGTH for token in tokenize(text))
+
+
+def search(text, types=None, limit=20):
+    """Best `limit` matches for `text` across `types` (default: all), highest rank first"""
+    hits = []
+    for name in types or SEARCH_TARGETS:
+        target = SEARCH_TARGETS[name]
+        queryset = target.model.objects.all()
+        if connections[queryset.db].vendor == 'postgresql':
+            rows = _postgres_matches(queryset, target, text, limit)
+        else:
+            rows = _fallback_matches(queryset, name, target, text, limit)
+        hits.extend({'type': name, **row} for row in rows)
+    return heapq.nlargest(limit, hits, key=lambda hit: hit['rank'])
+
+
+def _postgres_matches(queryset, target, text, limit):
+    query = SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+    rows = queryset.alias(
+        vector=RawSQL(SEARCH_COLUMN, (), output_field=SearchVectorField())
+    ).filter(vector=query).annotate(
+        rank=SearchRank(F('vector'), query)
+    ).order_by('-rank').values('pk', 'rank', target.timestamp_field, *target.fields)[:limit]
+    return [_hit(row, target) for row in rows]
+
+
+def _fallback_matches(queryset, name, target, text, limit):
+    scores = _fallback_index(name, target).search(tokenize(text), limit)
+    rows = queryset.filter(pk__in=scores).values('pk', target.timestamp_field, *target.fields)
+    return [_hit({**row, 'rank': scores[row['pk']]}, target) for row in rows]
+
+
+def _hit(row, target):
+    return {
+        'id': row['pk'],
+        'rank': round(row['rank'], 6),
+        'timestamp': row[target.timestamp_field],
+        **{field: row[field] for field in target.fields},
+    }
+
+
+# SQLite fallback
+
+TOKEN_PATTERN = re.compile(r'\w+')
+STOPWORDS = frozenset(
+    'a an and are as at be by for from has in is it of on or that the this to was were will with'.split()
+)
+SUFFIXES = ('ing', 'ed')
+
+
+def tokenize(text):
+    """Lowercased words minus stopwords, with plural and -ing/-ed endings stripped"""
+    tokens = []
+    for word in TOKEN_PATTERN.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        for suffix in SUFFIXES:
+            if len(word) > len(suffix) + 3 and word.endswith(suffix):
+                word = word[:-len(suffix)]
+                break
+        tokens.append(word)
+    return tokens
+
+
+class InvertedIndex:
+    """Term -> {pk: term frequency} over one model's search fields"""
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, target):
+        self.target = target
+        self._lock = threading.Lock()
+        self._built_at = None
+        self.postings = defaultdict(dict)
+        self.lengths = {}
+        self.last_pk = None
+
+    def refresh(self):
+        with self._lock:
+            queryset = self.target.model.objects.order_by('pk')
+            if self._built_at is None or time.monotonic() - self._built_at > settings.SEARCH_FALLBACK_REBUILD_SECONDS:
+                self.postings = defaultdict(dict)
+                self.lengths = {}
+                self.last_pk = None
+                self._built_at = time.monotonic()
+            elif self.last_pk is not None:
+                queryset = queryset.filter(pk__gt=self.last_pk)
+            for pk, *texts in queryset.values_list('pk', *self.target.fields).iterator(chunk_size=5000):
+                tokens = tokenize(' '.join(text or '' for text in texts))
+                for term, count in Counter(tokens).items():
+                    self.postings[term][pk] = count
+                self.lengths[pk] = len(tokens)
+                self.last_pk = pk
+
+    def search(self, terms, limit):
+        """{pk: BM25 score} of the best `limit` rows containing every term"""
+        self.refresh()
+        postings = [self.postings.get(term) for term in dict.fromkeys(terms)]
+        if not postings or not all(postings):
+            return {}
+        postings.sort(key=len)
+        matches = set(postings[0]).intersection(*postings[1:])
+        total = len(self.lengths)
+        average_length = sum(self.lengths.values()) / total
+        scores = {}
+        for pk in matches:
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[pk] / average_length)
+            scores[pk] = sum(
+                math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5)) * docs[pk] * (self.k1 + 1) / (docs[pk] + norm)
+                for docs in postings
+            )
+        return dict(heapq.nlargest(limit, scores.items(), key=lambda item: item[1]))
+
+
+_indexes = {}
+
+
+def _fallback_index(name, target):
+    if name not in _indexes:
+        _indexes[name] = InvertedIndex(target)
+    return _indexes[name]
@@ -1,9 +1,10 @@
 from rest_framework import serializers
-from .models import Inventory, TransferLog, DeliveryRoute, AgentLog
+from .models import Inventory, TransferLog, DeliveryRoute, AgentLog, StockLot, matching_store
+from .profiling import TimedSerializerMixin
 from drf_spectacular.utils import extend_schema_field
 
 
-class InventorySerializer(serializers.ModelSerializer):
+class InventorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for Inventory model.
     Handles product inventory data including quantities and expiry dates.
@@ -37,9 +38,24 @@ class InventorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Inventory
         fields = '__all__'
+        read_only_fields = ['store', 'catalog_product']
 
+    def validate(self, data):
+        product_id = data.get('product_id', getattr(self.instance, 'product_id', None))
+        store_location = data.get('store_location', getattr(self.instance, 'store_location', None))
+        # The same (store, catalog product) as the unique constraint, however the store is named
+        store = matching_store(store_location)
+        duplicates = Inventory.objects.filter(store=store, catalog_product__product_id=product_id)
+        if self.instance is not None:
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        if store is not None and duplicates.exists():
+            raise serializers.ValidationError(
+                f"{store_location} already has an inventory row for {product_id}"
+            )
+        return data
 
-class TransferLogSerializer(serializers.ModelSerializer):
+
+class TransferLogSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for TransferLog model.
     Tracks product transfers between stores.
@@ -71,9 +87,72 @@ class TransferLogSerializer(serializers.ModelSerializer):
     class Meta:
         model = TransferLog
         fields = '__all__'
+        read_only_fields = ['source_store', 'target_store']
+
+
+class StockMovementSerializer(TimedSerializerMixin, serializers.Serializer):
+    """
+    Serializer for one stock movement in a batch transfer.
+    Identifies stock by product ID and store location.
+    """
+    product_id = serializers.CharField(
+        max_length=100,
+        help_text="Product being moved"
+    )
+    from_store = serializers.CharField(
+        max_length=255,
+        help_text="Source store location"
+    )
+    to_store = serializers.CharField(
+        max_length=255,
+        help_text="Destination store location"
+    )
+    quantity = serializers.IntegerField(
+        min_value=1,
+        help_text="Quantity to move"
+    )
+    reason = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        default='',
+        help_text="Reason for the transfer"
+    )
+
+    def validate(self, data):
+        if data['from_store'] == data['to_store']:
+            raise serializers.ValidationError("Source and destination store must differ")
+        return data
+
+
+class StockLotSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """
+    Serializer for StockLot model.
+    One expiry-dated lot of an inventory row's stock.
+    """
+    quantity = serializers.IntegerField(
+        min_value=1,
+        help_text="Units in the lot"
+    )
+    expiry_date = serializers.DateField(
+        required=False,
+        allow_null=True,
+        help_text="Lot expiry date (blank for non-perishable stock)"
+    )
+    lot_number = serializers.CharField(
+        max_length=100,
+        required=False,
+        allow_blank=True,
+        default='',
+        help_text="Supplier lot or batch number"
+    )
+
+    class Meta:
+        model = StockLot
+        fields = '__all__'
+        read_only_fields = ['inventory', 'store', 'received_at']
 
 
-class DeliveryRouteSerializer(serializers.ModelSerializer):
+class DeliveryRouteSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for DeliveryRoute model.
     Manages delivery route information and tracking.
@@ -112,7 +191,7 @@ class DeliveryRouteSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class AgentLogSerializer(serializers.ModelSerializer):
+class AgentLogSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for AgentLog model.
     Records actions performed by automated agents.
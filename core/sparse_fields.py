@@ -0,0 +1,160 @@
+"""
+Sparse fieldsets for the agent API: ?fields= and ?expand=
+
+`?fields=id,status` returns only the named fields; `?expand=` adds fields
+a serializer lists in Meta.expandable_fields - nested objects and large
+JSON blobs - which list responses leave out by default (detail
+responses keep them). The viewset side narrows the SQL to match: the
+selected fields' sources become an only() column list plus
+select_related() for the relations they follow, so unrequested JSON
+columns are never fetched.
+
+Both only apply to read requests serialized with the request in their
+context; writes, and serializers used elsewhere (the dashboard, agent
+tasks), always see every field.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def _names(value):
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    Serializer side: drops fields not selected by ?fields= / ?expand=.
+
+    Meta.expandable_fields are left out of many=True output unless
+    expanded or named in ?fields=. Meta.method_field_sources maps a
+    SerializerMethodField to the model fields it reads, so the viewset
+    can still narrow the query when one is selected.
+    """
+
+    def __init__(self, *args, collapse=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.collapse = collapse
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        kwargs['collapse'] = True
+        return super().many_init(*args, **kwargs)
+
+    def _sparse_params(self):
+        """The request's query params if this is the top-level serializer of a read, else None"""
+        request = self.context.get('request')
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if request is None or request.method not in SAFE_METHODS or parent is not None:
+            return None
+        return request.query_params
+
+    def get_fields(self):
+        fields = super().get_fields()
+        params = self._sparse_params()
+        if params is None:
+            return fields
+
+        expandable = set(getattr(self.Meta, 'expandable_fields', []))
+        requested = _names(params.get('fields'))
+        expand = _names(params.get('expand'))
+        if expand - expandable:
+            raise serializers.ValidationError({
+                'expand': f"Can't expand {', '.join(sorted(expand - expandable))}; "
+                          f"expandable fields are {', '.join(sorted(expandable)) or 'none'}"
+            })
+        if requested - fields.keys():
+            raise serializers.ValidationError({
+                'fields': f"Unknown field(s) {', '.join(sorted(requested - fields.keys()))}"
+            })
+
+        if requested:
+            keep = requested | expand
+        elif self.collapse:
+            keep = fields.keys() - (expandable - expand)
+        else:
+            return fields
+        return {name: field for name, field in fields.items() if name in keep}
+
+
+def field_sources(serializer, model, prefix=''):
+    """
+    (columns, relations) a serializer's fields read, as only()/select_related() lookups.
+
+    None when a field reads something that isn't a model field (a
+    property, a reverse relation, an unmapped method field), in which
+    case the whole row has to be loaded.
+    """
+    method_sources = getattr(getattr(serializer, 'Meta', None), 'method_field_sources', {})
+    # Related rows' keys are added by select_related itself
+    columns = set() if prefix else {model._meta.pk.name}
+    relations = set()
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.SerializerMethodField):
+            if name not in method_sources:
+                return None
+            columns.update(prefix + source for source in method_sources[name])
+            continue
+        if field.source == '*' or isinstance(field, serializers.ManyRelatedField):
+            return None
+
+        current = model
+        path = prefix
+        for position, attr in enumerate(field.source_attrs):
+            try:
+                model_field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                return None
+            if not model_field.concrete or model_field.many_to_many:
+                return None
+            last = position == len(field.source_attrs) - 1
+            if not last or isinstance(field, serializers.BaseSerializer):
+                if not (model_field.many_to_one or model_field.one_to_one):
+                    return None
+                relations.add(path + attr)
+            if last and isinstance(field, serializers.BaseSerializer):
+                nested = field_sources(field, model_field.related_model, f'{path}{attr}__')
+                if nested is None:
+                    # Load the whole related row
+                    columns.add(path + attr)
+                else:
+                    columns.update(nested[0])
+                    relations.update(nested[1])
+            elif last:
+                columns.add(path + attr)
+            current = model_field.related_model
+            path = f'{path}{attr}__'
+    return columns, relations
+
+
+class SparseQuerysetMixin:
+    """
+    Viewset side: fetch only the columns the selected fields need.
+
+    Applies to list, retrieve and the list-style GET actions, which all
+    serialize with the viewset's serializer class.
+    """
+
+    def sparse_serializer(self):
+        if self.action == 'retrieve':
+            return self.get_serializer()
+        return self.get_serializer(many=True).child
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = getattr(self, 'request', None)
+        if request is None or request.method not in SAFE_METHODS:
+            return queryset
+        if getattr(self, 'detail', False) and self.action != 'retrieve':
+            return queryset
+        sources = field_sources(self.sparse_serializer(), queryset.model)
+        if sources is None:
+            return queryset
+        columns, relations = sources
+        if relations:
+            queryset = queryset.select_related(*relations)
+        return queryset.only(*columns)
@@ -0,0 +1,93 @@
+"""
+Point-in-time stock levels from the append-only ledger
+
+Every stock change is a StockLedgerEntry. Periodic StockSnapshots store
+each store's levels as of a moment, rolled forward from the previous
+snapshot, so the stock at any time is the nearest earlier snapshot plus
+the entries since - a scan bounded by the snapshot interval, however
+long the ledger grows.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from .models import Inventory, StockLedgerEntry, StockSnapshot
+
+
+# Stores per grouped ledger query when snapshotting
+STORE_CHUNK_SIZE = 200
+
+
+def stock_at(store_id, at=None):
+    """
+    Stock of every inventory row at a store as of `at` (default: now).
+
+    Returns (quantities {inventory_id: quantity}, snapshot used or None).
+    """
+    at = at or timezone.now()
+    snapshot = StockSnapshot.objects.filter(store_id=store_id, taken_at__lte=at).order_by('-taken_at').first()
+    quantities = defaultdict(int)
+    entries = StockLedgerEntry.objects.filter(store_id=store_id, created_at__lte=at)
+    if snapshot is not None:
+        quantities.update({int(pk): quantity for pk, quantity in snapshot.quantities.items()})
+        entries = entries.filter(created_at__gt=snapshot.taken_at)
+    for row in entries.values('inventory_id').annotate(delta=Sum('delta')).order_by():
+        quantities[row['inventory_id']] += row['delta']
+    return dict(quantities), snapshot
+
+
+def take_snapshots(until=None):
+    """
+    Snapshot every store whose stock changed since its last snapshot.
+
+    `until` defaults to now minus STOCK_SNAPSHOT_SETTLE_SECONDS, so
+    transactions still in flight when the snapshot is taken - whose
+    entries carry an earlier created_at - are already committed and
+    counted. Returns the number of snapshots written.
+    """
+    until = until or timezone.now() - timedelta(seconds=settings.STOCK_SNAPSHOT_SETTLE_SECONDS)
+    store_ids = Inventory.objects.exclude(store=None).values_list('store_id', flat=True).distinct().order_by()
+
+    latest_taken_at = StockSnapshot.objects.filter(
+        store=OuterRef('store'), taken_at__lte=until
+    ).order_by('-taken_at').values('taken_at')[:1]
+    previous = {
+        snapshot.store_id: snapshot
+        for snapshot in StockSnapshot.objects.filter(taken_at=Subquery(latest_taken_at))
+    }
+
+    # Stores usually share a snapshot cadence, so group them by where their scan starts
+    by_since = defaultdict(list)
+    for store_id in store_ids:
+        snapshot = previous.get(store_id)
+        if snapshot is None or snapshot.taken_at < until:
+            by_since[snapshot.taken_at if snapshot else None].append(store_id)
+
+    snapshots = []
+    for since, stores in by_since.items():
+        for start in range(0, len(stores), STORE_CHUNK_SIZE):
+            chunk = stores[start:start + STORE_CHUNK_SIZE]
+            entries = StockLedgerEntry.objects.filter(store_id__in=chunk, created_at__lte=until)
+            if since is not None:
+                entries = entries.filter(created_at__gt=since)
+            changes = defaultdict(dict)
+            for row in entries.values('store_id', 'inventory_id').annotate(delta=Sum('delta'), rows=Count('id')).order_by():
+                changes[row['store_id']][row['inventory_id']] = (row['delta'], row['rows'])
+
+            for store_id, store_changes in changes.items():
+                quantities = dict(previous[store_id].quantities) if store_id in previous else {}
+                for inventory_id, (delta, _) in store_changes.items():
+                    key = str(inventory_id)
+                    quantities[key] = quantities.get(key, 0) + delta
+                snapshots.append(StockSnapshot(
+                    store_id=store_id,
+                    taken_at=until,
+                    quantities=quantities,
+                    entries_applied=sum(rows for _, rows in store_changes.values()),
+                ))
+
+    StockSnapshot.objects.bulk_create(snapshots, batch_size=500, ignore_conflicts=True)
+    return len(snapshots)
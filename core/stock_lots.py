@@ -0,0 +1,134 @@
+"""
+Lot-level stock with first-expired-first-out (FEFO) allocation
+
+An inventory row's quantity is split into StockLots by expiry date.
+Stock leaving a row is taken from its earliest-expiring lots first, and a
+transfer carries those lots - expiry dates intact - to the destination.
+Inventory.expiry_date is kept at the row's earliest expiry.
+
+Callers must hold the inventory rows' locks (stock_movements does), so
+lots are read without locking them again.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import Case, Count, Exists, F, Min, OuterRef, Subquery, Sum, When
+from django.utils import timezone
+
+from .models import Inventory, StockLot
+
+
+# Rows per lot SELECT / expiry UPDATE statement
+CHUNK_SIZE = 500
+
+# Earliest expiry first; non-perishable lots last; then oldest receipt
+FEFO_ORDER = [F('expiry_date').asc(nulls_last=True), 'received_at', 'pk']
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class LotBook:
+    """
+    In-memory view of some inventory rows' lots.
+
+    withdraw()/receive() change it in FEFO order; save() writes the
+    difference back with a few bulk statements.
+    """
+
+    def __init__(self, inventory_ids):
+        self.lots = defaultdict(list)
+        # Keyed by id(): unsaved model instances aren't hashable
+        self.changed = {}
+        for chunk in _chunks(sorted(set(inventory_ids))):
+            for lot in StockLot.objects.filter(inventory_id__in=chunk, quantity__gt=0).order_by(
+                'inventory_id', *FEFO_ORDER
+            ):
+                self.lots[lot.inventory_id].append(lot)
+
+    def withdraw(self, inventory_id, quantity):
+        """
+        Take `quantity` from the row's earliest-expiring lots.
+
+        Returns the [(expiry_date, lot_number, quantity)] taken. Stock not
+        covered by lots (rows bulk-loaded without them) leaves untracked.
+        """
+        taken = []
+        for lot in self.lots[inventory_id]:
+            if not quantity:
+                break
+            take = min(lot.quantity, quantity)
+            if take:
+                lot.quantity -= take
+                quantity -= take
+                taken.append((lot.expiry_date, lot.lot_number, take))
+                self.changed[id(lot)] = lot
+        return taken
+
+    def receive(self, inventory_id, store_id, quantity, expiry_date, lot_number=''):
+        """Add stock to the row's lot with this expiry and lot number, creating it if needed; returns the lot"""
+        if quantity <= 0:
+            return None
+        for lot in self.lots[inventory_id]:
+            if lot.expiry_date == expiry_date and lot.lot_number == lot_number:
+                break
+        else:
+            lot = StockLot(inventory_id=inventory_id, store_id=store_id, lot_number=lot_number,
+                           quantity=0, expiry_date=expiry_date)
+            self.lots[inventory_id].append(lot)
+        lot.quantity += quantity
+        self.changed[id(lot)] = lot
+        return lot
+
+    def transfer(self, source_id, target_id, target_store_id, quantity):
+        """Move `quantity` FEFO from one row to another, keeping lot expiry dates"""
+        for expiry_date, lot_number, taken in self.withdraw(source_id, quantity):
+            self.receive(target_id, target_store_id, taken, expiry_date, lot_number)
+
+    def save(self):
+        lots = list(self.changed.values())
+        created = [lot for lot in lots if lot.pk is None and lot.quantity > 0]
+        updated = [lot for lot in lots if lot.pk is not None and lot.quantity > 0]
+        emptied = [lot.pk for lot in lots if lot.pk is not None and not lot.quantity]
+        StockLot.objects.bulk_create(created, batch_size=1000)
+        StockLot.objects.bulk_update(updated, ['quantity'], batch_size=1000)
+        for chunk in _chunks(emptied):
+            StockLot.objects.filter(pk__in=chunk).delete()
+        sync_expiry_dates({lot.inventory_id for lot in lots})
+        self.changed.clear()
+
+
+def sync_expiry_dates(inventory_ids):
+    """
+    Set each row's expiry_date to its earliest lot (blank when only
+    non-perishable lots are left); rows without lots keep theirs
+    """
+    lots = StockLot.objects.filter(inventory=OuterRef('pk'), quantity__gt=0)
+    earliest = lots.order_by(*FEFO_ORDER).values('expiry_date')[:1]
+    for chunk in _chunks(sorted(inventory_ids)):
+        Inventory.objects.filter(pk__in=chunk).update(
+            expiry_date=Case(When(Exists(lots), then=Subquery(earliest)), default=F('expiry_date'))
+        )
+
+
+def expiring_stock(days, store_id=None, include_expired=False, today=None):
+    """
+    Stock expiring within `days` days, per store, in one range query.
+
+    Served from the partial (expiry_date, store, quantity) index on
+    StockLot. Returns rows of store_id, store__name, quantity, lots and
+    earliest_expiry, soonest first.
+    """
+    today = today or timezone.localdate()
+    lots = StockLot.objects.filter(quantity__gt=0, expiry_date__lte=today + timedelta(days=days))
+    if not include_expired:
+        lots = lots.filter(expiry_date__gte=today)
+    if store_id is not None:
+        lots = lots.filter(store_id=store_id)
+    return lots.values('store_id', 'store__name').annotate(
+        quantity=Sum('quantity'),
+        lots=Count('id'),
+        earliest_expiry=Min('expiry_date'),
+    ).order_by('earliest_expiry', 'store_id')
@@ -0,0 +1,254 @@
+"""
+Atomic stock movements for the legacy Inventory model
+
+Every movement is applied with F() expressions inside one transaction:
+the source row is decremented, the destination row incremented and the
+TransferLog and its two StockLedgerEntry rows written together, so
+concurrent agents can't lose updates the way a read-modify-write save()
+does. Stock leaves a row earliest-expiry first (see stock_lots), and the
+touched rows are re-checked against their low-stock minimums (low_stock). Rows are locked in primary-key order
+so concurrent batches queue behind each other instead of deadlocking.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .agent_models import Product
+from .models import Inventory, StockLedgerEntry, TransferLog, legacy_store
+from .low_stock import refresh_low_stock
+from .stock_lots import LotBook
+
+
+# Rows per locking SELECT / CASE UPDATE statement
+CHUNK_SIZE = 500
+
+
+class InsufficientStock(Exception):
+    """A movement would take an inventory row below zero"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        super().__init__(', '.join(
+            f"{row['product_id']} at {row['store_location']} would be {row['quantity']}"
+            for row in rows
+        ))
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _resolve_rows(movements):
+    """
+    Map each (product_id, store_location) in the movements to (Inventory pk, store id).
+
+    Strings are resolved to their Store and catalog Product first and rows
+    looked up by (store, catalog_product), the unique key, so a store named
+    by its location finds the row filed under its name. Missing destination
+    rows are created with quantity 0; a missing source row raises
+    Inventory.DoesNotExist.
+    """
+    locations = {m['from_store'] for m in movements} | {m['to_store'] for m in movements}
+    store_ids = {location: legacy_store(location).pk for location in locations}
+    # A product without a catalog entry has no inventory rows to move stock from
+    product_ids = dict(Product.objects.filter(
+        product_id__in={m['product_id'] for m in movements}
+    ).values_list('product_id', 'pk'))
+
+    def lookup():
+        return {
+            (catalog_product_id, store_id): (pk, product_name)
+            for pk, store_id, catalog_product_id, product_name in Inventory.objects.filter(
+                store_id__in=set(store_ids.values()), catalog_product_id__in=set(product_ids.values())
+            ).values_list('pk', 'store_id', 'catalog_product_id', 'product_name')
+        }
+
+    def key(product_id, location):
+        return product_ids.get(product_id), store_ids[location]
+
+    rows = lookup()
+    missing_sources = {(m['product_id'], m['from_store']) for m in movements
+                       if key(m['product_id'], m['from_store']) not in rows}
+    if missing_sources:
+        product_id, store_location = sorted(missing_sources)[0]
+        raise Inventory.DoesNotExist(f'No inventory of {product_id} at {store_location}')
+
+    missing = {}
+    for movement in movements:
+        target = key(movement['product_id'], movement['to_store'])
+        if target not in rows and target not in missing:
+            _, product_name = rows[key(movement['product_id'], movement['from_store'])]
+            missing[target] = Inventory(
+                product_id=movement['product_id'],
+                product_name=product_name,
+                store_location=movement['to_store'],
+                store_id=target[1],
+                catalog_product_id=target[0],
+                quantity=0
+            )
+    if missing:
+        # A concurrent batch creating the same row hits the (store, product) constraint; keep theirs
+        Inventory.objects.bulk_create(missing.values(), ignore_conflicts=True)
+        rows = lookup()
+    return {
+        (m['product_id'], location): (rows[key(m['product_id'], location)][0], store_ids[location])
+        for m in movements for location in (m['from_store'], m['to_store'])
+    }
+
+
+def _apply_deltas(deltas):
+    """Add each {pk: delta} to its row's quantity; raise InsufficientStock if any row goes negative"""
+    pks = sorted(pk for pk, delta in deltas.items() if delta)
+    now = timezone.now()
+    for chunk in _chunks(pks):
+        # Lock in a consistent order so concurrent batches can't deadlock
+        list(Inventory.objects.select_for_update().filter(pk__in=chunk).order_by('pk').values_list('pk'))
+    for chunk in _chunks(pks):
+        Inventory.objects.filter(pk__in=chunk).update(
+            quantity=F('quantity') + Case(
+                *[When(pk=pk, then=Value(deltas[pk])) for pk in chunk],
+                output_field=IntegerField()
+            ),
+            last_updated=now
+        )
+
+    # Checked after the update, against our own locked rows, so it can't be stale
+    decremented = [pk for pk in pks if deltas[pk] < 0]
+    short = []
+    for chunk in _chunks(decremented):
+        short += Inventory.objects.filter(pk__in=chunk, quantity__lt=0).values(
+            'product_id', 'store_location', 'quantity'
+        )
+    if short:
+        raise InsufficientStock(short)
+
+
+def apply_movements(movements):
+    """
+    Apply a batch of transfers in one transaction, all or nothing.
+
+    `movements` is an iterable of dicts with product_id, from_store,
+    to_store, quantity and an optional reason. Net changes are summed per
+    inventory row first, so thousands of movements cost a handful of
+    UPDATE statements rather than two each. Returns the TransferLog rows.
+    """
+    movements = list(movements)
+    for movement in movements:
+        if movement['quantity'] <= 0:
+            raise ValueError('Transfer quantity must be positive')
+        if movement['from_store'] == movement['to_store']:
+            raise ValueError('Source and destination store must differ')
+    if not movements:
+        return []
+
+    with transaction.atomic():
+        rows = _resolve_rows(movements)
+        for movement in movements:
+            # Two names of one store
+            source = rows[(movement['product_id'], movement['from_store'])]
+            if source == rows[(movement['product_id'], movement['to_store'])]:
+                raise ValueError(f"{movement['from_store']} and {movement['to_store']} are the same store")
+        deltas = defaultdict(int)
+        for movement in movements:
+            deltas[rows[(movement['product_id'], movement['from_store'])][0]] -= movement['quantity']
+            deltas[rows[(movement['product_id'], movement['to_store'])][0]] += movement['quantity']
+        _apply_deltas(deltas)
+
+        # The rows are locked now; carry the earliest-expiring lots along with each movement
+        book = LotBook(deltas)
+        for movement in movements:
+            source_id, _ = rows[(movement['product_id'], movement['from_store'])]
+            target_id, target_store_id = rows[(movement['product_id'], movement['to_store'])]
+            book.transfer(source_id, target_id, target_store_id, movement['quantity'])
+        book.save()
+        refresh_low_stock(deltas)
+
+        now = timezone.now()
+        transfers = TransferLog.objects.bulk_create([
+            TransferLog(
+                from_store=movement['from_store'],
+                to_store=movement['to_store'],
+                source_store_id=rows[(movement['product_id'], movement['from_store'])][1],
+                target_store_id=rows[(movement['product_id'], movement['to_store'])][1],
+                product_id=rows[(movement['product_id'], movement['from_store'])][0],
+                quantity=movement['quantity'],
+                reason=movement.get('reason', '')
+            )
+            for movement in movements
+        ], batch_size=1000)
+
+        entries = []
+        for movement, transfer in zip(movements, transfers):
+            source_id, source_store_id = rows[(movement['product_id'], movement['from_store'])]
+            target_id, target_store_id = rows[(movement['product_id'], movement['to_store'])]
+            entries += [
+                StockLedgerEntry(inventory_id=source_id, store_id=source_store_id, delta=-movement['quantity'],
+                                 reason='transfer_out', transfer_id=transfer.pk, created_at=now),
+                StockLedgerEntry(inventory_id=target_id, store_id=target_store_id, delta=movement['quantity'],
+                                 reason='transfer_in', transfer_id=transfer.pk, created_at=now),
+            ]
+        StockLedgerEntry.objects.bulk_create(entries, batch_size=1000)
+        return transfers
+
+
+def transfer_stock(product_id, from_store, to_store, quantity, reason=''):
+    """Move stock of one product between stores; returns the TransferLog"""
+    return apply_movements([{
+        'product_id': product_id,
+        'from_store': from_store,
+        'to_store': to_store,
+        'quantity': quantity,
+        'reason': reason,
+    }])[0]
+
+
+def adjust_stock(inventory_id, delta, reason='adjustment'):
+    """Add `delta` (negative for sales/consumption) to one row without going below zero"""
+    with transaction.atomic():
+        updated = Inventory.objects.filter(pk=inventory_id, quantity__gte=-delta).update(
+            quantity=F('quantity') + delta,
+            last_updated=timezone.now()
+        )
+        row = Inventory.objects.filter(pk=inventory_id).values(
+            'product_id', 'store_location', 'store_id', 'quantity', 'expiry_date'
+        ).first()
+        if row is None:
+            raise Inventory.DoesNotExist(f'No inventory row {inventory_id}')
+        if not updated:
+            row['quantity'] += delta
+            raise InsufficientStock([row])
+        StockLedgerEntry.objects.create(
+            inventory_id=inventory_id, store_id=row['store_id'], delta=delta, reason=reason
+        )
+        book = LotBook([inventory_id])
+        if delta < 0:
+            book.withdraw(inventory_id, -delta)
+        else:
+            book.receive(inventory_id, row['store_id'], delta, row['expiry_date'])
+        book.save()
+        refresh_low_stock([inventory_id])
+
+
+def receive_stock(inventory_id, quantity, expiry_date, lot_number=''):
+    """Add a received lot to an inventory row; returns the StockLot"""
+    if quantity <= 0:
+        raise ValueError('Received quantity must be positive')
+    with transaction.atomic():
+        updated = Inventory.objects.filter(pk=inventory_id).update(
+            quantity=F('quantity') + quantity,
+            last_updated=timezone.now()
+        )
+        if not updated:
+            raise Inventory.DoesNotExist(f'No inventory row {inventory_id}')
+        store_id = Inventory.objects.filter(pk=inventory_id).values_list('store_id', flat=True).get()
+        StockLedgerEntry.objects.create(
+            inventory_id=inventory_id, store_id=store_id, delta=quantity, reason='received'
+        )
+        book = LotBook([inventory_id])
+        lot = book.receive(inventory_id, store_id, quantity, expiry_date, lot_number)
+        book.save()
+        refresh_low_stock([inventory_id])
+        return lot
@@ -0,0 +1,126 @@
+"""
+Celery queue layout and priority routing for the AI agents
+
+Each agent class gets its own queue so that slow CPU-bound (vision) or
+I/O-bound (LLM) work can't hold up the latency-critical route planner and
+cortex manager. Within a queue, tasks are ordered by a 0-9 priority derived
+from the `urgency`/`priority` values the agent models already use; as on
+the Redis broker, 0 runs first.
+"""
+from kombu import Exchange, Queue
+
+
+MAX_PRIORITY = 9
+
+# urgency (StockRebalanceAction, ExternalDisruption.severity) and
+# priority (VisionInspection, CortexCoordination) levels -> importance,
+# 0 (least) to MAX_PRIORITY (most urgent)
+LEVEL_IMPORTANCE = {
+    'low': 2,
+    'medium': 4,
+    'high': 7,
+    'urgent': 9,
+    'critical': 9,
+}
+DEFAULT_IMPORTANCE = 4
+
+
+def broker_priority(importance):
+    """
+    Celery priority for an importance. The Redis transport keeps one list
+    per priority step and reads queue:0 first, so 0 is served first and the
+    scale runs the other way.
+    """
+    return MAX_PRIORITY - importance
+
+
+DEFAULT_PRIORITY = broker_priority(DEFAULT_IMPORTANCE)
+
+# queue name -> workload type, used by the worker recommendations in README
+AGENT_QUEUES = {
+    'critical': 'latency',      # route planning, cortex coordination
+    'forecasting': 'cpu',       # inventory forecasts, rebalancing
+    'monitoring': 'io',         # disruption feeds, health checks
+    'vision': 'cpu',            # YOLO inspections
+    'llm': 'io',                # explainer LLM calls
+}
+
+TASK_QUEUES = {
+    'core.agent_tasks.route_planner_agent_task': 'critical',
+    'core.agent_tasks.cortex_manager_task': 'critical',
+    'core.agent_tasks.inventory_agent_forecast_task': 'forecasting',
+    'core.agent_tasks.rebalancer_agent_task': 'forecasting',
+    'core.agent_tasks.low_stock_events_task': 'forecasting',
+    'core.agent_tasks.periodic_forecast_backtest': 'forecasting',
+    'core.agent_tasks.periodic_forecast_cube': 'forecasting',
+    'core.agent_tasks.delay_monitor_agent_task': 'monitoring',
+    'core.agent_tasks.periodic_system_health_check': 'monitoring',
+    'core.agent_tasks.periodic_stock_snapshot': 'monitoring',
+    'core.agent_tasks.maintain_partitions': 'monitoring',
+    'core.agent_tasks.purge_task_executions': 'monitoring',
+    'core.agent_tasks.vision_inspector_agent_task': 'vision',
+    'core.agent_tasks.explainer_agent_task': 'llm',
+}
+
+# Baseline importance per task when the payload carries no level
+TASK_IMPORTANCE = {
+    'core.agent_tasks.route_planner_agent_task': 7,
+    'core.agent_tasks.cortex_manager_task': 7,
+    'core.agent_tasks.periodic_system_health_check': 2,
+    'core.agent_tasks.periodic_stock_snapshot': 2,
+    'core.agent_tasks.periodic_forecast_backtest': 2,
+    'core.agent_tasks.periodic_forecast_cube': 2,
+    'core.agent_tasks.maintain_partitions': 2,
+    'core.agent_tasks.purge_task_executions': 2,
+}
+
+
+def build_queues():
+    """kombu queue declarations for CELERY_TASK_QUEUES"""
+    queues = [Queue('default', Exchange('default'), routing_key='default',
+                    queue_arguments={'x-max-priority': MAX_PRIORITY})]
+    for name in AGENT_QUEUES:
+        queues.append(Queue(name, Exchange(name), routing_key=name,
+                            queue_arguments={'x-max-priority': MAX_PRIORITY}))
+    return tuple(queues)
+
+
+def priority_for(level, default=DEFAULT_IMPORTANCE):
+    """Map an urgency/priority/severity label to a Celery priority"""
+    importance = LEVEL_IMPORTANCE.get(str(level).lower(), default) if level else default
+    return broker_priority(importance)
+
+
+def _level_from_payload(args, kwargs):
+    """Find an urgency/priority label in the task kwargs or a dict argument"""
+    for key in ('urgency', 'priority', 'severity'):
+        if kwargs and kwargs.get(key):
+            return kwargs[key]
+    for value in list(args or ()) + list((kwargs or {}).values()):
+        if isinstance(value, dict):
+            for key in ('urgency', 'priority', 'severity'):
+                if value.get(key):
+                    return value[key]
+    return None
+
+
+def route_agent_task(name, args, kwargs, options, task=None, **kw):
+    """
+    Celery task router (CELERY_TASK_ROUTES).
+
+    Sends agent tasks to their dedicated queue. An explicit `priority`
+    passed to apply_async (0 first) wins; otherwise it's derived from any
+    urgency/priority label in the payload, then the per-task baseline.
+    """
+    queue = TASK_QUEUES.get(name)
+    if queue is None:
+        return None
+
+    route = {'queue': queue}
+    if options.get('priority') is None:
+        level = _level_from_payload(args, kwargs)
+        if level:
+            route['priority'] = priority_for(level)
+        else:
+            route['priority'] = broker_priority(TASK_IMPORTANCE.get(name, DEFAULT_IMPORTANCE))
+    return route
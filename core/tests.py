@@ -1,3 +1,1347 @@
-from django.test import TestCase
+import io
+import json
+import random
+import uuid
+import re
+import tempfile
+import threading
+import time
+import unittest
+from array import array
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from importlib.util import find_spec
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import DatabaseError, OperationalError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.db.models import F, Sum, Value
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .agent_models import (
+    REBALANCE_TRANSITIONS, ActiveAgentModel, AgentExplanation, AgentMetrics, CortexCoordination, DemandForecast,
+    EndpointProfile, ExternalDisruption, ForecastBacktestDay, Product, RouteOptimization, StockRebalanceAction, Store,
+    TaskExecution, TaskSpan, VisionInspection
+)
+from .agent_tasks import low_stock_events_task, route_planner_agent_task
+from .agent_serializers import (
+    AgentMetricsSerializer, DemandForecastSerializer, EndpointProfileSerializer, StoreSerializer
+)
+from .agent_views import _run_workflow_simulation
+from .archive import archive_month, archived_months, read_archive
+from .backtesting import accuracy_report, evaluate_day, run_backtest
+from .bulk import AgentMetricsBulkWriter, DemandForecastBulkWriter, InventoryBulkWriter
+from .db_routers import ReplicaRouter, _lag_cache, replica_reads
+from .disruption_index import DisruptionInterval, IntervalTree, active_disruption_ids, disruption_index
+from .forecast_hierarchy import _mint, compute_cube
+from .forecast_store import QUANTILES, curve_values, demand_between, pack_curve, save_curve
+from .idempotency import purge_executions
+from .json_filters import JSONArrayContains, json_contains
+from .model_registry import ModelRegistry
+from .models import (
+    Inventory, LowStockItem, StockLedgerEntry, StockLevelEvent, StockLot, StockSnapshot, TransferLog, legacy_store
+)
+from .schema import clear_schema_cache, schema_artifact_path, source_revision, write_schema_artifact
+from .search import _indexes as search_indexes, search, tokenize
+from .serializers import TransferLogSerializer
+from .stock_ledger import stock_at, take_snapshots
+from .stock_lots import FEFO_ORDER, LotBook
+from .stock_movements import InsufficientStock, adjust_stock, receive_stock, transfer_stock
+from .task_routing import DEFAULT_PRIORITY, MAX_PRIORITY, route_agent_task
+from .tracing import traced_task
+from .transitions import bulk_transition
+from .values_serializers import ValuesSerializer
+
+
+def make_network():
+    """A warehouse, a store and a product"""
+    warehouse = Store.objects.create(store_id='WH001', name='Central Warehouse', location='Electronic City',
+                                     store_type='warehouse')
+    store = Store.objects.create(store_id='ST001', name='Koramangala Store', location='Koramangala',
+                                 store_type='store')
+    product = Product.objects.create(product_id='P001', name='Milk', category='Dairy', unit_price=30,
+                                     unit_weight=1.0)
+    return warehouse, store, product
+
+
+class TaskRoutingTests(SimpleTestCase):
+    """Redis serves priority 0 first, so more urgent work gets lower numbers"""
+
+    def route(self, name, *args, **kwargs):
+        return route_agent_task(f'core.agent_tasks.{name}', args, kwargs, {})
+
+    def test_urgent_before_low(self):
+        urgent = self.route('rebalancer_agent_task', {'urgency': 'urgent'})
+        low = self.route('rebalancer_agent_task', {'urgency': 'low'})
+        self.assertEqual(urgent['queue'], 'forecasting')
+        self.assertLess(urgent['priority'], low['priority'])
+        self.assertEqual(urgent['priority'], 0)
+
+    def test_critical_path_before_periodic(self):
+        planner = self.route('route_planner_agent_task', 1)
+        health = self.route('periodic_system_health_check')
+        self.assertLess(planner['priority'], DEFAULT_PRIORITY)
+        self.assertLess(planner['priority'], health['priority'])
+        self.assertLessEqual(health['priority'], MAX_PRIORITY)
+
+    def test_explicit_priority_wins(self):
+        route = route_agent_task('core.agent_tasks.rebalancer_agent_task', (), {'urgency': 'urgent'}, {'priority': 6})
+        self.assertNotIn('priority', route)
+
+    def test_unrouted_task(self):
+        self.assertIsNone(route_agent_task('other.task', (), {}, {}))
+
+
+class WorkflowSimulationTests(TestCase):
+
+    def setUp(self):
+        self.warehouse, self.store, self.product = make_network()
+
+    def test_reuses_open_rebalance(self):
+        # As if a concurrent run had created it between our check and insert
+        existing = StockRebalanceAction.objects.create(
+            source_store=self.warehouse, target_store=self.store, product=self.product,
+            quantity=10, urgency='low', reason='Earlier run', created_by_agent='RebalancerAgent'
+        )
+        result = _run_workflow_simulation()
+        self.assertEqual(result['status'], 'success')
+        self.assertIn("✅ RebalancerAgent: Reused open rebalance action", result['simulation_log'])
+        self.assertEqual(list(StockRebalanceAction.objects.values_list('pk', flat=True)), [existing.pk])
+
+
+class TransitionTests(TestCase):
+
+    def setUp(self):
+        self.warehouse, self.store, self.product = make_network()
+
+    def rebalance(self, status, product=None):
+        return StockRebalanceAction.objects.create(
+            source_store=self.warehouse, target_store=self.store, product=product or self.product,
+            quantity=10, urgency='low', reason='Test', created_by_agent='RebalancerAgent', status=status
+        )
+
+    def other_product(self, number):
+        return Product.objects.create(product_id=f'P10{number}', name=f'Product {number}', category='Dairy',
+                                      unit_price=1, unit_weight=1.0)
+
+    def test_allowed_and_rejected(self):
+        pending = self.rebalance('pending')
+        rejected = self.rebalance('rejected', self.other_product(1))
+        completed = self.rebalance('completed', self.other_product(2))
+        updated, refused, matched = bulk_transition(
+            StockRebalanceAction.objects.all(), 'status', 'approved', REBALANCE_TRANSITIONS
+        )
+        self.assertEqual(updated, 1)
+        self.assertEqual(refused, [
+            {'id': rejected.pk, 'status': 'rejected'}, {'id': completed.pk, 'status': 'completed'}
+        ])
+        self.assertEqual(matched, {pending.pk, rejected.pk, completed.pk})
+        self.assertEqual(
+            dict(StockRebalanceAction.objects.values_list('pk', 'status')),
+            {pending.pk: 'approved', rejected.pk: 'rejected', completed.pk: 'completed'}
+        )
+
+    def transition(self, body):
+        return self.client.post('/api/agents/rebalances/transition/', body, content_type='application/json')
+
+    def test_endpoint(self):
+        pending = self.rebalance('pending')
+        response = self.transition({'status': 'in_progress', 'ids': [pending.pk, 999]})
+        self.assertEqual(response.json()['rejected'], [{'id': pending.pk, 'status': 'pending'}])
+        self.assertEqual(response.json()['not_found'], [999])
+        self.assertEqual(self.transition({'status': 'approved', 'filter': {'status': 'pending'}}).json()['updated'], 1)
+        self.assertEqual(self.transition({'status': 'shipped', 'ids': [pending.pk]}).status_code, 400)
+        self.assertEqual(self.transition({'status': 'approved', 'filter': {'quantity': 10}}).status_code, 400)
+
+    def test_route_planner_approves_pending_only(self):
+        pending = self.rebalance('pending')
+        self.assertEqual(route_planner_agent_task(pending.pk)['status'], 'success')
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, 'approved')
+        self.assertTrue(RouteOptimization.objects.filter(rebalance_action=pending).exists())
+
+        rejected = self.rebalance('rejected', self.other_product(1))
+        self.assertEqual(route_planner_agent_task(rejected.pk),
+                         {'status': 'skipped', 'reason': 'Rebalance action is rejected'})
+        rejected.refresh_from_db()
+        self.assertEqual(rejected.status, 'rejected')
+        self.assertFalse(RouteOptimization.objects.filter(rebalance_action=rejected).exists())
+
+
+class TaskExecutionPurgeTests(TestCase):
+
+    def execution(self, key, status, age_hours):
+        at = timezone.now() - timedelta(hours=age_hours)
+        return TaskExecution.objects.create(
+            idempotency_key=key, task_name='t', status=status, lease_expires_at=at, started_at=at,
+            completed_at=at if status != 'running' else None,
+        )
+
+    def test_purges_old_finished_and_abandoned_leases(self):
+        self.execution('old-completed', 'completed', 200)
+        self.execution('old-failed', 'failed', 200)
+        self.execution('abandoned', 'running', 200)
+        self.execution('recent', 'completed', 1)
+        self.execution('in-flight', 'running', -1)
+        self.assertEqual(purge_executions(retention_hours=168), 3)
+        self.assertEqual(
+            set(TaskExecution.objects.values_list('idempotency_key', flat=True)), {'recent', 'in-flight'}
+        )
+
+
+@override_settings(PROFILING_HEADER_ENABLED=True, PROFILING_SAMPLE_RATE=0.0)
+class RequestProfilingTests(TestCase):
+
+    def setUp(self):
+        make_network()
+
+    def timings(self, response):
+        timings = re.findall(r'(\w+);dur=([\d.]+)', response['Server-Timing'])
+        return {name: float(duration) for name, duration in timings}
+
+    def test_serializer_time_reported_apart_from_render(self):
+        response = self.client.get('/api/agents/stores/', HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        timings = self.timings(response)
+        self.assertEqual(set(timings), {'db', 'serialize', 'render', 'app', 'total'})
+        self.assertGreater(timings['serialize'], 0)
+        self.assertLessEqual(timings['serialize'] + timings['render'] + timings['db'], timings['total'] + 0.2)
+        profile = EndpointProfile.objects.get()
+        self.assertGreater(profile.serialize_time_ms, 0)
+
+    def test_values_list_path_timed(self):
+        response = self.client.get('/api/agents/metrics/', HTTP_X_PROFILE='1')
+        self.assertIn('serialize', self.timings(response))
+
+    def test_custom_action_serializer_timed(self):
+        # lots() builds its serializer itself rather than through get_serializer()
+        item = Inventory.objects.create(product_id='P001', product_name='Milk',
+                                        store_location='Koramangala Store', quantity=20)
+        response = self.client.get(f'/api/inventory/{item.pk}/lots/', HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(self.timings(response)['serialize'], 0)
+
+    def test_serializer_time_outside_profiled_requests_ignored(self):
+        self.assertEqual(len(StoreSerializer(Store.objects.all(), many=True).data), 2)
+
+    def test_output_unchanged(self):
+        profiled = self.client.get('/api/agents/stores/', HTTP_X_PROFILE='1').json()
+        self.assertEqual(profiled, self.client.get('/api/agents/stores/').json())
+
+    def test_profiles_filtered_by_date(self):
+        self.client.get('/api/agents/stores/', HTTP_X_PROFILE='1')
+        today = timezone.localdate()
+        response = self.client.get('/api/agents/endpoint-profiles/', {'date': today.isoformat()})
+        self.assertEqual(len(response.json()['results']), 1)
+        for value in ('today', '2026-02-30'):
+            with self.subTest(date=value):
+                response = self.client.get('/api/agents/endpoint-profiles/', {'date': value})
+                self.assertEqual(response.status_code, 400)
+
+
+class TracingTests(TestCase):
+
+    def test_records_span_and_response_time(self):
+        traced = traced_task('TestAgent')(lambda: {'status': 'success'})
+        self.assertEqual(traced(), {'status': 'success'})
+        span = TaskSpan.objects.get(agent_name='TestAgent')
+        self.assertEqual(span.status, 'success')
+        self.assertTrue(AgentMetrics.objects.filter(agent_name='TestAgent', metric_type='response_time').exists())
+
+    def test_span_filters(self):
+        traced_task('TestAgent')(lambda: 'done')()
+        span = TaskSpan.objects.get(agent_name='TestAgent')
+        response = self.client.get('/api/agents/task-spans/', {'trace_id': span.trace_id})
+        self.assertEqual([row['id'] for row in response.json()['results']], [span.pk])
+        for params in ({'coordination': 'x'}, {'trace_id': 'abc'}):
+            with self.subTest(params=params):
+                response = self.client.get('/api/agents/task-spans/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(params)), response.json())
+
+    def test_failed_span_write_leaves_callers_transaction_usable(self):
+        traced = traced_task('TestAgent')(lambda: 'done')
+        with transaction.atomic():
+            with mock.patch.object(AgentMetrics, '_do_insert', side_effect=DatabaseError('metrics table is gone')):
+                self.assertEqual(traced(), 'done')
+            # Without the savepoint, the failed insert would have marked this block for rollback
+            self.assertFalse(TaskSpan.objects.filter(agent_name='TestAgent').exists())
+            Store.objects.count()
+
+
+class LegacyStoreTests(TestCase):
+
+    def test_matches_name_then_location(self):
+        warehouse, store, _ = make_network()
+        self.assertEqual(legacy_store('Koramangala Store'), store)
+        self.assertEqual(legacy_store('Electronic City'), warehouse)
+        created = legacy_store('Hosur Road Warehouse')
+        self.assertTrue(created.store_id.startswith('LEGACY-'))
+        self.assertEqual(created.store_type, 'warehouse')
+
+    def test_demo_data_links_real_stores(self):
+        call_command('setup_demo_data', stdout=io.StringIO())
+        self.assertFalse(Store.objects.filter(store_id__startswith='LEGACY-').exists())
+        for store_location, location in Inventory.objects.values_list('store_location', 'store__location'):
+            self.assertEqual(location, store_location)
+        warehouse_rows = Inventory.objects.filter(store_location='Electronic City')
+        self.assertTrue(warehouse_rows.exists())
+        self.assertEqual(set(warehouse_rows.values_list('store__store_type', flat=True)), {'warehouse'})
+
+        transfer = transfer_stock('MILK001', 'Electronic City', 'Whitefield', 5)
+        transfer = TransferLog.objects.select_related('source_store', 'target_store').get(pk=transfer.pk)
+        self.assertEqual((transfer.source_store.store_id, transfer.target_store.store_id), ('WH001', 'ST001'))
+        self.assertFalse(Store.objects.filter(store_id__startswith='LEGACY-').exists())
+
+
+class StoreAliasTests(TestCase):
+    """A store named by its location reaches the rows filed under its name"""
+
+    def setUp(self):
+        self.warehouse, self.store, _ = make_network()
+        self.source = Inventory(product_id='P001', product_name='Milk', store_location='Central Warehouse', quantity=50)
+        self.source.save()
+        self.target = Inventory(product_id='P001', product_name='Milk', store_location='Koramangala Store', quantity=5)
+        self.target.save()
+
+    def test_transfer_to_alias(self):
+        transfer = transfer_stock('P001', 'Electronic City', 'Koramangala', 10)
+        self.assertEqual((transfer.source_store_id, transfer.target_store_id), (self.warehouse.pk, self.store.pk))
+        self.assertEqual(dict(Inventory.objects.values_list('pk', 'quantity')),
+                         {self.source.pk: 40, self.target.pk: 15})
+        response = self.client.post('/api/transfers/batch/', [
+            {'product_id': 'P001', 'from_store': 'Koramangala', 'to_store': 'Central Warehouse', 'quantity': 5},
+        ], content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Inventory.objects.count(), 2)
+
+    def test_transfer_between_names_of_one_store(self):
+        with self.assertRaises(ValueError):
+            transfer_stock('P001', 'Koramangala Store', 'Koramangala', 1)
+        self.assertEqual(Inventory.objects.get(pk=self.target.pk).quantity, 5)
+
+    def test_duplicate_row_under_alias_rejected(self):
+        response = self.client.post('/api/inventory/', {
+            'product_id': 'P001', 'product_name': 'Milk', 'store_location': 'Koramangala', 'quantity': 3,
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Inventory.objects.count(), 2)
+
+    def test_quantity_edit_keeps_links(self):
+        row = Inventory.objects.get(pk=self.target.pk)
+        row.quantity = 8
+        with CaptureQueriesContext(connection) as queries:
+            row.save()
+        self.assertFalse([query for query in queries.captured_queries if 'core_store' in query['sql']])
+        self.assertEqual(row.store_id, self.store.pk)
+
+
+class StockLedgerTests(TestCase):
+
+    def setUp(self):
+        _, self.store, _ = make_network()
+        self.now = timezone.now()
+        self.row = Inventory(product_id='P001', product_name='Milk', store_location='Koramangala Store', quantity=100)
+        self.row.save()
+        self.age_entries(hours=3)
+        adjust_stock(self.row.pk, -30)
+        self.age_entries(hours=2)
+
+    def age_entries(self, hours):
+        """Backdate the entries written since the last call"""
+        StockLedgerEntry.objects.filter(created_at__gt=self.now).update(created_at=self.now - timedelta(hours=hours))
+
+    def test_stock_at_replays_ledger(self):
+        self.assertEqual(stock_at(self.store.pk, self.now - timedelta(hours=4)), ({}, None))
+        self.assertEqual(stock_at(self.store.pk, self.now - timedelta(hours=2.5)), ({self.row.pk: 100}, None))
+        self.assertEqual(stock_at(self.store.pk, self.now), ({self.row.pk: 70}, None))
+
+    def test_snapshot_replay_matches_full_replay(self):
+        self.assertEqual(take_snapshots(until=self.now - timedelta(minutes=90)), 1)
+        adjust_stock(self.row.pk, 10)
+        self.age_entries(hours=1)
+
+        quantities, snapshot = stock_at(self.store.pk, self.now - timedelta(minutes=80))
+        self.assertEqual(quantities, {self.row.pk: 70})
+        self.assertEqual(snapshot.quantities, {str(self.row.pk): 70})
+        quantities, snapshot = stock_at(self.store.pk)
+        self.assertEqual(quantities, {self.row.pk: 80})
+        self.assertIsNotNone(snapshot)
+        self.assertEqual(quantities[self.row.pk], Inventory.objects.get(pk=self.row.pk).quantity)
+        self.assertEqual(stock_at(self.store.pk, self.now - timedelta(hours=2.5)), ({self.row.pk: 100}, None))
+
+        # Rolled forward from the previous snapshot; an unchanged store isn't snapshotted again
+        self.assertEqual(take_snapshots(until=self.now), 1)
+        latest = StockSnapshot.objects.get(taken_at=self.now)
+        self.assertEqual((latest.quantities, latest.entries_applied), ({str(self.row.pk): 80}, 1))
+        self.assertEqual(take_snapshots(until=self.now), 0)
+
+
+class BulkWriterTests(TestCase):
+
+    def setUp(self):
+        self.warehouse, self.store, self.product = make_network()
+
+    def forecast(self, **overrides):
+        item = {'store': self.store.pk, 'product': self.product.pk, 'forecast_date': '2026-11-01',
+                'predicted_demand': 40, 'confidence_score': 0.8}
+        item.update(overrides)
+        return item
+
+    def test_invalid_items_reported_by_index_and_skipped(self):
+        result = DemandForecastBulkWriter().run([
+            self.forecast(),
+            self.forecast(forecast_date='2026-11-02', predicted_demand=-1),
+            self.forecast(forecast_date='2026-11-03', store=999),
+            {'store': self.store.pk},
+            'not an object',
+            self.forecast(forecast_date='not a date'),
+        ])
+        self.assertEqual((result['created'], result['updated'], result['error_count']), (1, 0, 5))
+        errors = {error['index']: error['errors'] for error in result['errors']}
+        self.assertIn('predicted_demand', errors[1])
+        self.assertEqual(errors[2]['store'], ['Invalid pk "999" - object does not exist.'])
+        self.assertEqual(set(errors[3]), {'product', 'forecast_date', 'predicted_demand', 'confidence_score'})
+        self.assertEqual(errors[4], {'non_field_errors': ['Expected a JSON object.']})
+        self.assertIn('forecast_date', errors[5])
+        self.assertEqual(DemandForecast.objects.count(), 1)
+
+    def test_duplicate_in_batch_keeps_last(self):
+        result = DemandForecastBulkWriter().run([
+            self.forecast(predicted_demand=10), self.forecast(predicted_demand=20)
+        ])
+        self.assertEqual(result['errors'], [
+            {'index': 0, 'errors': {'non_field_errors': ['Duplicate of item 1 in this batch.']}}
+        ])
+        self.assertEqual(DemandForecast.objects.get().predicted_demand, 20)
+
+    def test_existing_key_needs_upsert(self):
+        DemandForecastBulkWriter().run([self.forecast(predicted_demand=10)])
+        result = DemandForecastBulkWriter().run([
+            self.forecast(predicted_demand=20), self.forecast(forecast_date='2026-11-02')
+        ])
+        self.assertEqual((result['created'], result['error_count']), (1, 1))
+        self.assertIn('already exists; use upsert', result['errors'][0]['errors']['non_field_errors'][0])
+        self.assertEqual(DemandForecast.objects.get(forecast_date='2026-11-01').predicted_demand, 10)
+
+        result = DemandForecastBulkWriter(upsert=True).run([self.forecast(predicted_demand=20)])
+        self.assertEqual((result['created'], result['updated'], result['error_count']), (0, 1, 0))
+        self.assertEqual(DemandForecast.objects.get(forecast_date='2026-11-01').predicted_demand, 20)
+
+    def test_upsert_without_conflict_target(self):
+        metric_id = str(uuid.uuid4())
+        item = {'metric_id': metric_id, 'agent_name': 'InventoryAgent', 'metric_type': 'accuracy',
+                'metric_value': 0.5, 'unit': '%'}
+        AgentMetricsBulkWriter().run([item])
+        result = AgentMetricsBulkWriter(upsert=True).run([
+            dict(item, metric_value=0.9), dict(item, metric_id=str(uuid.uuid4()))
+        ])
+        self.assertEqual((result['created'], result['updated']), (1, 1))
+        self.assertEqual(AgentMetrics.objects.get(metric_id=metric_id).metric_value, 0.9)
+
+    def test_inventory_upsert_goes_on_the_ledger(self):
+        item = {'product_id': 'P001', 'product_name': 'Milk', 'store_location': 'Koramangala', 'quantity': 50}
+        InventoryBulkWriter().run([item])
+        result = InventoryBulkWriter(upsert=True).run([dict(item, quantity=35)])
+        self.assertEqual(result['updated'], 1)
+        row = Inventory.objects.get()
+        self.assertEqual((row.quantity, row.store_id), (35, self.store.pk))
+        self.assertEqual(list(row.ledger_entries.order_by('pk').values_list('delta', 'reason')),
+                         [(50, 'opening'), (-15, 'correction')])
+
+    def test_ndjson_endpoint(self):
+        body = '\n'.join([json.dumps(self.forecast()), '{broken', ''])
+        response = self.client.post('/api/agents/forecasts/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['created'], response.json()['error_count']), (1, 1))
+        self.assertIn('Line 2 is not valid JSON', response.json()['errors'][0]['errors']['non_field_errors'][0])
+        response = self.client.post('/api/agents/forecasts/bulk/', {'not': 'a list'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ValuesSerializerTests(TestCase):
+    """The values_list() fast path must return what the ModelSerializer would"""
+
+    def setUp(self):
+        warehouse, store, product = make_network()
+        for day, factors in enumerate([{'weather': 'rainy'}, {}, {'event': 'festival', 'weather': 'sunny'}], start=1):
+            DemandForecast.objects.create(store=store, product=product, forecast_date=f'2026-11-0{day}',
+                                          predicted_demand=10 * day, confidence_score=0.25 * day,
+                                          external_factors=factors)
+        AgentMetrics.objects.create(agent_name='InventoryAgent', metric_type='accuracy', metric_value=0.93,
+                                    unit='%', additional_data={'window': [1, 2]})
+        for location in ('Central Warehouse', 'Koramangala Store'):
+            Inventory(product_id='P001', product_name='Milk', store_location=location, quantity=50).save()
+        transfer_stock('P001', 'Central Warehouse', 'Koramangala Store', 5, reason='Restock')
+        # A transfer from a store that is gone: the nullable relation reads as null
+        transfer = transfer_stock('P001', 'Koramangala Store', 'Central Warehouse', 2)
+        TransferLog.objects.filter(pk=transfer.pk).update(source_store=None)
+
+    def expected(self, serializer_class, queryset):
+        return json.loads(JSONRenderer().render(serializer_class(queryset.order_by('pk'), many=True).data))
+
+    def listed(self, url):
+        return sorted(self.client.get(url).json()['results'], key=lambda item: item['id'])
+
+    def assert_same_output(self):
+        self.assertEqual(self.listed('/api/agents/forecasts/'),
+                         self.expected(DemandForecastSerializer, DemandForecast.objects.all()))
+        self.assertEqual(self.listed('/api/agents/metrics/'),
+                         self.expected(AgentMetricsSerializer, AgentMetrics.objects.all()))
+        self.assertEqual(self.listed('/api/transfers/'),
+                         self.expected(TransferLogSerializer, TransferLog.objects.all()))
+
+    def test_matches_model_serializer(self):
+        self.assert_same_output()
+        self.assertIn(None, [item['source_store'] for item in self.listed('/api/transfers/')])
+
+    @override_settings(TIME_ZONE='Asia/Kolkata')
+    def test_matches_outside_utc(self):
+        self.assert_same_output()
+        self.assertIn('+05:30', self.client.get('/api/transfers/').json()['results'][0]['timestamp'])
+
+    def test_method_fields_not_compiled(self):
+        with self.assertRaises(ImproperlyConfigured):
+            ValuesSerializer(EndpointProfileSerializer())
+
+
+class SparseFieldsTests(TestCase):
+
+    def setUp(self):
+        _, self.store, _ = make_network()
+        self.inspection = VisionInspection.objects.create(
+            store=self.store, image_path='/shelves/1.jpg', inspection_type='shelf_stock',
+            detected_objects=[{'label': 'milk', 'box': [1, 2, 3, 4]}], anomalies_found=['empty_shelf'],
+        )
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, ' '.join(query['sql'] for query in queries.captured_queries)
+
+    def test_selected_fields_only(self):
+        response, sql = self.get('/api/agents/inspections/?fields=id,store_name,priority')
+        self.assertEqual(response.json()['results'], [
+            {'id': self.inspection.pk, 'store_name': 'Koramangala Store', 'priority': 'medium'}
+        ])
+        self.assertNotIn('"anomalies_found"', sql)
+        self.assertIn('"core_store"."name"', sql)
+
+    def test_expandable_fields_left_out_of_lists(self):
+        listed = self.client.get('/api/agents/inspections/').json()['results'][0]
+        self.assertNotIn('detected_objects', listed)
+        self.assertIn('anomalies_found', listed)
+        expanded = self.client.get('/api/agents/inspections/?expand=detected_objects').json()['results'][0]
+        self.assertEqual(expanded['detected_objects'], self.inspection.detected_objects)
+        detail = self.client.get(f'/api/agents/inspections/{self.inspection.pk}/').json()
+        self.assertIn('detected_objects', detail)
+        detail = self.client.get(f'/api/agents/inspections/{self.inspection.pk}/?fields=id').json()
+        self.assertEqual(detail, {'id': self.inspection.pk})
+
+    def test_unknown_fields_rejected(self):
+        response = self.client.get('/api/agents/inspections/?fields=id,colour')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'fields': 'Unknown field(s) colour'})
+        response = self.client.get('/api/agents/inspections/?expand=store_name')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('expand', response.json())
+
+    def test_writes_see_every_field(self):
+        response = self.client.patch(f'/api/agents/inspections/{self.inspection.pk}/?fields=id',
+                                     {'priority': 'high'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['priority'], 'high')
+        self.assertIn('detected_objects', response.json())
+
+
+class JSONFilterTests(TestCase):
+    """Containment filters, through the json_each()/key-lookup fallback on SQLite"""
+
+    def setUp(self):
+        _, self.store, self.product = make_network()
+        self.inspections = [
+            VisionInspection.objects.create(store=self.store, image_path=f'/shelves/{number}.jpg',
+                                            inspection_type='spoilage', anomalies_found=anomalies)
+            for number, anomalies in enumerate([['spoiled_products', 'empty_shelf'], ['empty_shelf'], []])
+        ]
+        self.forecasts = [
+            DemandForecast.objects.create(store=self.store, product=self.product, forecast_date=f'2026-11-0{day}',
+                                          predicted_demand=10, confidence_score=0.5, external_factors=factors)
+            for day, factors in enumerate([
+                {'weather': 'rainy', 'event': 'cricket_match'}, {'weather': 'rainy'}, {'weather': 'sunny'}, {},
+            ], start=1)
+        ]
+
+    def pks(self, rows):
+        return sorted(row.pk if hasattr(row, 'pk') else row['id'] for row in rows)
+
+    def test_array_contains(self):
+        first, second, _ = self.inspections
+        matches = VisionInspection.objects.filter(JSONArrayContains(F('anomalies_found'), Value('empty_shelf')))
+        self.assertEqual(self.pks(matches), [first.pk, second.pk])
+        matches = json_contains(VisionInspection.objects.all(), 'anomalies_found', ['empty_shelf', 'spoiled_products'])
+        self.assertEqual(self.pks(matches), [first.pk])
+        self.assertFalse(json_contains(VisionInspection.objects.all(), 'anomalies_found', ['empty']).exists())
+
+    def test_object_contains(self):
+        first, second, _, _ = self.forecasts
+        matches = json_contains(DemandForecast.objects.all(), 'external_factors', {'weather': 'rainy'})
+        self.assertEqual(self.pks(matches), [first.pk, second.pk])
+
+    def test_query_parameters(self):
+        first, second, _ = self.inspections
+        response = self.client.get('/api/agents/inspections/?anomalies_found=empty_shelf')
+        self.assertEqual(self.pks(response.json()['results']), [first.pk, second.pk])
+        response = self.client.get('/api/agents/forecasts/?external_factors=weather:rainy,event:cricket_match')
+        self.assertEqual(self.pks(response.json()['results']), [self.forecasts[0].pk])
+        response = self.client.get('/api/agents/forecasts/?external_factors=weather:rainy&external_factors=event:none')
+        self.assertEqual(response.json()['results'], [])
+
+    def test_malformed_pairs_rejected(self):
+        response = self.client.get('/api/agents/forecasts/?external_factors=rainy')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('external_factors', response.json())
+
+
+class ConcurrentStockMovementTests(TransactionTestCase):
+    """Movements from many threads at once must not lose updates"""
+    threads = 4
+    movements_per_thread = 25
+
+    def setUp(self):
+        make_network()
+        self.stores = ['Central Warehouse', 'Koramangala Store', 'Indiranagar Store']
+        for store in self.stores:
+            Inventory(product_id='P001', product_name='Milk', store_location=store, quantity=500).save()
+        self.rows = dict(Inventory.objects.values_list('store_location', 'pk'))
+
+    def retry(self, operation):
+        # SQLite lets one writer in at a time; a refused transaction rolled back and is retried
+        for attempt in range(200):
+            try:
+                return operation()
+            except OperationalError:
+                time.sleep(0.002 * (attempt % 10 + 1))
+        raise AssertionError('movement never got the database')
+
+    def test_final_quantity_is_sum_of_deltas(self):
+        applied = {store: 0 for store in self.stores}
+        lock = threading.Lock()
+        errors = []
+
+        def worker(index):
+            rng = random.Random(index)
+            try:
+                for _ in range(self.movements_per_thread):
+                    if rng.random() < 0.5:
+                        store = rng.choice(self.stores)
+                        delta = rng.choice([-1, 1]) * rng.randint(1, 30)
+                        try:
+                            self.retry(lambda: adjust_stock(self.rows[store], delta))
+                        except InsufficientStock:
+                            continue
+                        changes = {store: delta}
+                    else:
+                        source, target = rng.sample(self.stores, 2)
+                        quantity = rng.randint(1, 30)
+                        try:
+                            self.retry(lambda: transfer_stock('P001', source, target, quantity))
+                        except InsufficientStock:
+                            continue
+                        changes = {source: -quantity, target: quantity}
+                    with lock:
+                        for store, delta in changes.items():
+                            applied[store] += delta
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(index,)) for index in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        self.assertEqual(errors, [])
+
+        final = dict(Inventory.objects.values_list('store_location', 'quantity'))
+        ledger = dict(
+            StockLedgerEntry.objects.values_list('inventory__store_location').annotate(total=Sum('delta')).order_by()
+        )
+        for store in self.stores:
+            self.assertEqual(final[store], 500 + applied[store], store)
+            self.assertEqual(ledger[store], final[store], store)
+            self.assertGreaterEqual(final[store], 0)
+
+
+@unittest.skipUnless(find_spec('pyarrow'), 'archiving needs pyarrow')
+class ArchiveTests(TestCase):
+    """The unpartitioned path; PostgreSQL partitions are detached and dropped instead"""
+    month = date(2025, 3, 1)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(ARCHIVE_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def coordination(self, day):
+        coordination = CortexCoordination.objects.create(
+            event_type='system_health_check', involved_agents=['InventoryAgent'], coordination_data={'day': day},
+            priority='low', status='completed',
+        )
+        created_at = datetime(2025, 3, day, 12, tzinfo=dt_timezone.utc)
+        CortexCoordination.objects.filter(pk=coordination.pk).update(created_at=created_at)
+        return coordination
+
+    def test_archives_and_deletes_the_month(self):
+        archived = [self.coordination(2), self.coordination(30)]
+        kept = CortexCoordination.objects.create(event_type='system_health_check', priority='low', status='completed')
+        span = TaskSpan.objects.create(
+            trace_id=uuid.uuid4(), coordination=archived[0], task_name='t', agent_name='CortexManager',
+            status='success', started_at=timezone.now(), wall_time_ms=1, db_time_ms=0, query_count=0,
+        )
+
+        self.assertEqual(archive_month(CortexCoordination, self.month), 2)
+        self.assertEqual(list(CortexCoordination.objects.values_list('pk', flat=True)), [kept.pk])
+        span.refresh_from_db()
+        self.assertIsNone(span.coordination_id)
+        frame = read_archive(CortexCoordination, self.month, date(2025, 4, 1))
+        self.assertEqual(sorted(frame['id']), [row.pk for row in archived])
+        self.assertEqual(sorted(frame['coordination_data']), ['{"day": 2}', '{"day": 30}'])
+
+        # Late rows for an archived month go to a second file
+        self.coordination(15)
+        self.assertEqual(archive_month(CortexCoordination, self.month), 1)
+        self.assertEqual(archived_months(CortexCoordination), [self.month])
+        self.assertEqual(len(read_archive(CortexCoordination, self.month, date(2025, 4, 1))), 3)
+        self.assertEqual(archive_month(CortexCoordination, self.month), 0)
+
+
+class ForecastHorizonTests(TestCase):
+
+    def setUp(self):
+        _, self.store, self.product = make_network()
+        self.today = timezone.localdate()
+        save_curve(self.store, self.product, self.today, 'v1', [float(day) for day in range(7)],
+                   {level: [float(day) for day in range(7)] for level in QUANTILES}, 0.9)
+
+    def test_horizon(self):
+        response = self.client.get('/api/agents/forecasts/horizon/', {'store': self.store.pk, 'days': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['values'], [0.0, 1.0, 2.0])
+
+    def test_pack_round_trip(self):
+        mean = [1.234567, 2.5, 1234567.891, 0.0, 7.0]
+        quantiles = {level: [value * level for value in mean] for level in QUANTILES}
+        points = pack_curve(mean, quantiles)
+        self.assertEqual(len(points), 4 * len(mean) * 4)
+        # float32 keeps about 7 significant digits, rounded to 2 decimals on the way out
+        float32 = [round(value, 2) for value in array('f', mean)]
+        self.assertEqual(curve_values(points, 5), float32)
+        self.assertEqual(float32[:3], [1.23, 2.5, 1234567.88])
+        self.assertEqual(curve_values(points, 5, 0.9), [round(value, 2) for value in array('f', quantiles[0.9])])
+        with self.assertRaises(ValueError):
+            pack_curve(mean, {**quantiles, 0.5: mean[:4]})
+
+    def test_slicing(self):
+        mean = [float(day) for day in range(10)]
+        points = pack_curve(mean, {level: [day + level for day in mean] for level in QUANTILES})
+        self.assertEqual(curve_values(points, 10, first_day=2, days=3), [2.0, 3.0, 4.0])
+        self.assertEqual(curve_values(points, 10, 0.1, first_day=8, days=5), [8.1, 9.1])
+        self.assertEqual(curve_values(points, 10, first_day=-2, days=2), [0.0, 1.0])
+        self.assertEqual(curve_values(points, 10, first_day=10), [])
+
+    def test_demand_between_offsets_from_the_latest_run(self):
+        earlier = self.today - timedelta(days=2)
+        save_curve(self.store, self.product, earlier, 'v1', [float(day) * 10 for day in range(7)],
+                   {level: [0.0] * 7 for level in QUANTILES}, 0.9)
+        # From today the run starting today applies
+        [curve] = demand_between(self.today, self.today + timedelta(days=2))
+        self.assertEqual((curve['run_date'], curve['values']), (self.today, [0.0, 1.0, 2.0]))
+        # From yesterday it's the earlier run, one day in, cut off where its horizon ends
+        [curve] = demand_between(self.today - timedelta(days=1), self.today + timedelta(days=20))
+        self.assertEqual((curve['run_date'], curve['values']), (earlier, [10.0, 20.0, 30.0, 40.0, 50.0, 60.0]))
+
+    def test_bad_parameters_are_rejected(self):
+        for params in ({'store': 'x'}, {'product': '1.5'}, {'store': self.store.pk, 'days': 'week'},
+                       {'store': self.store.pk, 'start': 'soon'}, {'store': self.store.pk, 'start': '2026-02-30'}):
+            with self.subTest(params=params):
+                response = self.client.get('/api/agents/forecasts/horizon/', params)
+                self.assertEqual(response.status_code, 400)
+
+
+class BacktestTests(TestCase):
+    """Forecasts of 10 (sold 8), 5 (sold nothing) and 4 (shipped 5) on one day"""
+
+    def setUp(self):
+        self.warehouse, self.store, milk = make_network()
+        Product.objects.create(product_id='P002', name='Bread', category='Bakery', unit_price=40, unit_weight=0.5)
+        self.day = timezone.localdate() - timedelta(days=3)
+        noon = timezone.make_aware(datetime.combine(self.day, datetime.min.time())) + timedelta(hours=12)
+        for store, product_id, forecast, sold, reason in (
+            (self.store, 'P001', 10, 8, 'adjustment'),
+            (self.store, 'P002', 5, 0, 'adjustment'),
+            (self.warehouse, 'P001', 4, 5, 'transfer_out'),
+        ):
+            row = Inventory(product_id=product_id, product_name=product_id, store_location=store.name, quantity=50)
+            row.save()
+            DemandForecast.objects.create(store=store, product=row.catalog_product, forecast_date=self.day,
+                                          predicted_demand=forecast, confidence_score=0.8)
+            if sold:
+                StockLedgerEntry.objects.create(inventory=row, store=store, delta=-sold, reason=reason,
+                                                created_at=noon)
+        # Restocking is not demand
+        StockLedgerEntry.objects.create(inventory=row, store=self.warehouse, delta=20, reason='adjustment',
+                                        created_at=noon)
+
+    def test_evaluate_day(self):
+        summary, metrics = evaluate_day(self.day)
+        self.assertEqual((summary.forecasts, summary.forecast_units, summary.actual_units), (3, 19, 13))
+        self.assertAlmostEqual(summary.wape, 8 / 13)
+        self.assertAlmostEqual(summary.mape, (2 / 8 + 1 / 5) / 2)  # the unsold pair has no percentage error
+        self.assertAlmostEqual(summary.bias, 6 / 13)
+
+        by_key = {(metric.additional_data['dimension'], metric.additional_data['key']): metric for metric in metrics}
+        # Bread sold nothing anywhere: its accuracy is undefined, so it gets no metric
+        self.assertNotIn(('category', 'Bakery'), by_key)
+        self.assertEqual(by_key[('store', self.store.pk)].metric_value, 12.5)  # WAPE (2 + 5) / 8
+        self.assertEqual(by_key[('store', self.warehouse.pk)].metric_value, 80.0)  # WAPE 1 / 5
+        dairy = by_key[('category', 'Dairy')].additional_data
+        self.assertEqual((dairy['forecasts'], dairy['actual_units'], dairy['abs_error'], dairy['error']), (2, 13, 3, 1))
+        self.assertEqual(by_key[('model_version', 'LNN_v1')].metric_value, round((1 - 8 / 13) * 100, 2))
+
+    def test_day_without_forecasts(self):
+        summary, metrics = evaluate_day(self.day + timedelta(days=1))
+        self.assertEqual((summary.forecasts, summary.wape, metrics), (0, None, []))
+
+    def test_run_backtest_resumes_and_rolls_up(self):
+        quiet_day = self.day + timedelta(days=1)
+        DemandForecast.objects.create(store=self.store, product=Product.objects.get(product_id='P001'),
+                                      forecast_date=quiet_day, predicted_demand=6, confidence_score=0.8)
+        days = run_backtest(until=quiet_day)
+        self.assertEqual([day.forecast_date for day in days], [self.day, quiet_day])
+        # Nothing sold on the second day: no WAPE, MAPE or bias to report
+        quiet = ForecastBacktestDay.objects.get(forecast_date=quiet_day)
+        self.assertEqual((quiet.actual_units, quiet.wape, quiet.mape, quiet.bias), (0, None, None, None))
+        self.assertEqual(run_backtest(until=quiet_day), [])
+
+        [report] = accuracy_report('model_version', self.day, quiet_day)
+        self.assertEqual((report['forecasts'], report['forecast_units'], report['actual_units']), (3, 19, 13))
+        self.assertEqual(report['wape'], round(8 / 13, 4))
+        response = self.client.get('/api/agents/forecasts/accuracy/', {'dimension': 'store', 'days': 7})
+        self.assertEqual({row['key']: row['accuracy'] for row in response.json()['results']},
+                         {self.store.pk: 12.5, self.warehouse.pk: 80.0})
+
+    def test_accuracy_rejects_bad_days(self):
+        response = self.client.get('/api/agents/forecasts/accuracy/', {'days': 'month'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/agents/forecasts/accuracy/', {'days': 7})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [])  # not backtested yet
+
+
+class ForecastHierarchyTests(TestCase):
+
+    def setUp(self):
+        self.today = timezone.localdate()
+        rng = random.Random(49)
+        stores = [
+            Store.objects.create(store_id=f'S{index}', name=f'Store {index}', location=location, store_type=store_type)
+            for index, (location, store_type) in enumerate([
+                ('Koramangala, Bangalore', 'store'), ('Whitefield, Bangalore', 'store'),
+                ('Mumbai Zone 4', 'store'), ('Andheri, Mumbai', 'warehouse'),
+            ])
+        ]
+        products = [
+            Product.objects.create(product_id=f'P{index}', name=f'Product {index}', category=category,
+                                   unit_price=10, unit_weight=1.0)
+            for index, category in enumerate(['Dairy', 'Dairy', 'Bakery'])
+        ]
+        sold_at = timezone.now() - timedelta(days=3)
+        for store in stores:
+            for product in products:
+                row = Inventory(product_id=product.product_id, product_name=product.name,
+                                store_location=store.name, quantity=500)
+                row.save()
+                DemandForecast.objects.create(store=store, product=product, forecast_date=self.today,
+                                              predicted_demand=rng.randint(0, 40), confidence_score=0.8)
+                # Recent demand for most pairs, so aggregate nodes have base estimates to reconcile with
+                if rng.random() < 0.75:
+                    StockLedgerEntry.objects.create(inventory=row, store=store, delta=-rng.randint(100, 900),
+                                                    reason='adjustment', created_at=sold_at)
+
+    def test_cube_levels_add_up(self):
+        forecasts = sum(DemandForecast.objects.values_list('predicted_demand', flat=True))
+        for method in ('bottom_up', 'mint'):
+            with self.subTest(method=method):
+                cells = compute_cube(self.today, method)
+                total = next(cell for cell in cells
+                             if (cell['store_level'], cell['product_level']) == ('network', 'all'))
+                self.assertEqual((total['series'], total['forecast_demand']), (12, forecasts))
+                if method == 'bottom_up':
+                    self.assertEqual(total['demand'], forecasts)
+                else:
+                    self.assertNotAlmostEqual(total['demand'], forecasts, places=0)
+                levels = {}
+                for cell in cells:
+                    levels.setdefault((cell['store_level'], cell['product_level']), []).append(cell)
+                self.assertEqual(len(levels), 11)
+                for level_cells in levels.values():
+                    self.assertAlmostEqual(sum(cell['demand'] for cell in level_cells), total['demand'], delta=0.1)
+                # Each region x category node is the sum of its stores
+                for parent in levels[('region', 'category')]:
+                    children = [cell['demand'] for cell in levels[('store', 'category')]
+                                if (cell['region'], cell['category']) == (parent['region'], parent['category'])]
+                    self.assertAlmostEqual(sum(children), parent['demand'], delta=0.05)
+                self.assertEqual({cell['store_key'] for cell in levels[('region', 'all')]}, {'Bangalore', 'Mumbai'})
+
+    def test_mint_matches_dense_solve(self):
+        import numpy as np
+
+        rng = np.random.default_rng(49)
+        forecast = rng.uniform(0, 50, 8)
+        history = rng.uniform(0, 30, 8)
+        history[6:] = 0  # the last region has no recent demand, so no base estimate
+        level_codes = [
+            np.array([0, 0, 1, 1, 1, 1, 2, 2]),  # region
+            np.array([0, 1, 0, 1, 0, 1, 0, 1]),  # category
+            np.array([0, 1, 2, 3, 4, 5, 6, 7]) // 2,  # store
+            np.zeros(8, dtype=int),  # network
+        ]
+        rows, weights, targets = [np.eye(8)], [np.ones(8)], [forecast]
+        for codes in level_codes:
+            for group in range(codes.max() + 1):
+                members = codes == group
+                if history[members].sum() > 0:
+                    rows.append(members[np.newaxis].astype(float))
+                    weights.append([members.sum()])
+                    targets.append([history[members].sum()])
+        summing, inverse_weight = np.vstack(rows), np.diag(1 / np.concatenate(weights))
+        expected = np.linalg.solve(summing.T @ inverse_weight @ summing,
+                                   summing.T @ inverse_weight @ np.concatenate(targets))
+        np.testing.assert_allclose(_mint(forecast, history, level_codes), expected, rtol=1e-6)
+        # Without any base estimates there is nothing to reconcile with
+        np.testing.assert_allclose(_mint(forecast, np.zeros(8), level_codes), forecast)
+
+    def test_hierarchy_endpoint(self):
+        response = self.client.get('/api/agents/forecasts/hierarchy/',
+                                   {'store_level': 'region', 'product_level': 'all', 'method': 'bottom_up'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(row['store_key'] for row in response.json()['results']), ['Bangalore', 'Mumbai'])
+
+    def test_bad_date_is_rejected(self):
+        for value in ('tomorrow', '2026-02-30'):
+            with self.subTest(date=value):
+                response = self.client.get('/api/agents/forecasts/hierarchy/', {'date': value})
+                self.assertEqual(response.status_code, 400)
+
+
+class DisruptionIndexTests(TestCase):
+
+    def setUp(self):
+        disruption_index.invalidate()
+        self.addCleanup(disruption_index.invalidate)
+        self.now = timezone.now()
+        self.rng = random.Random(46)
+
+    def moment(self, low_hours, high_hours):
+        return self.now + timedelta(minutes=self.rng.randint(low_hours * 60, high_hours * 60))
+
+    def test_interval_tree_matches_brute_force(self):
+        intervals = []
+        for pk in range(300):
+            start = self.moment(-72, 24)
+            end = None if self.rng.random() < 0.2 else start + timedelta(minutes=self.rng.randint(0, 48 * 60))
+            intervals.append(DisruptionInterval.from_row(pk, start, end, None, None, 5.0, []))
+        tree = IntervalTree(intervals)
+        self.assertEqual(len(tree), 300)
+        for _ in range(500):
+            start = self.moment(-96, 48)
+            end = start + timedelta(minutes=self.rng.choice([0, 1, 90, 24 * 60]))
+            expected = {interval.pk for interval in intervals if interval.start <= end and interval.end >= start}
+            self.assertEqual({interval.pk for interval in tree.overlapping(start, end)}, expected)
+        self.assertEqual(IntervalTree([]).overlapping(self.now, self.now), [])
+
+    def test_active_disruption_ids_match_brute_force(self):
+        # Stores along a line, ~11 km apart; half the disruptions have coordinates, half name an area
+        stores = [
+            Store.objects.create(store_id=f'S{index}', name=f'Store {index}', location=f'Area {index}',
+                                 store_type='store', latitude=12.9 + index * 0.1, longitude=77.6)
+            for index in range(5)
+        ]
+        rows = []
+        for index in range(120):
+            start = self.moment(-60, 12) + timedelta(microseconds=index)  # distinct, so the order is defined
+            end = None if self.rng.random() < 0.2 else start + timedelta(minutes=self.rng.randint(0, 30 * 60))
+            located = self.rng.random() < 0.5
+            rows.append(ExternalDisruption.objects.create(
+                event_type='traffic', title=f'Disruption {index}', description='', severity='low',
+                start_time=start, end_time=end, data_source='test', impact_radius_km=self.rng.choice([2, 8, 20]),
+                latitude=12.9 + self.rng.randint(0, 4) * 0.1 if located else None,
+                longitude=77.6 if located else None,
+                affected_areas=[] if located else [f'Area {self.rng.randint(0, 4)}'],
+            ))
+
+        def expected(start, end, store, radius_km):
+            matches = [
+                row for row in rows
+                if row.start_time <= end and (row.end_time is None or row.end_time >= start)
+                and (store is None or DisruptionInterval.from_row(
+                    row.pk, row.start_time, row.end_time, row.latitude, row.longitude, row.impact_radius_km,
+                    row.affected_areas).affects(store, radius_km))
+            ]
+            return [row.pk for row in sorted(matches, key=lambda row: row.start_time, reverse=True)]
+
+        # Recent windows are answered by the index, older ones by the database
+        for low_hours in (-12, -50):
+            for _ in range(60):
+                start = self.moment(low_hours, low_hours + 12)
+                end = start + timedelta(minutes=self.rng.choice([0, 30, 6 * 60]))
+                store = self.rng.choice([None, *stores])
+                radius_km = self.rng.choice([0, 5])
+                with self.subTest(start=start, end=end, store=store, radius_km=radius_km):
+                    self.assertEqual(active_disruption_ids(start, end, store, radius_km),
+                                     expected(start, end, store, radius_km))
+
+    def test_active_rejects_bad_datetimes(self):
+        for params in ({'at': 'now'}, {'start': '2026-02-30T10:00:00'}, {'end': '2026-01-01T25:00:00'}):
+            with self.subTest(params=params):
+                response = self.client.get('/api/agents/disruptions/active/', params)
+                self.assertEqual(response.status_code, 400)
+
+
+class LowStockTests(TestCase):
+
+    def setUp(self):
+        _, self.store, self.product = make_network()
+        self.row = Inventory(product_id='P001', product_name='Milk', store_location='Koramangala Store', quantity=50)
+        self.row.save()
+
+    def test_threshold_and_store_parameters(self):
+        response = self.client.get('/api/inventory/low_stock/', {'threshold': 60, 'store': self.store.pk})
+        self.assertEqual([row['id'] for row in response.json()], [self.row.pk])
+        for params in ({'threshold': 'ten'}, {'store': 'x'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/inventory/low_stock/', params).status_code, 400)
+
+    def set_quantity(self, quantity):
+        self.row.quantity = quantity
+        self.row.save()
+
+    def test_crossing_below_and_back(self):
+        self.set_quantity(5)
+        item = LowStockItem.objects.get(inventory=self.row)
+        self.assertEqual((item.store_id, item.product_id, item.quantity, item.minimum_stock_level),
+                         (self.store.pk, self.product.pk, 5, 10))
+        self.set_quantity(4)  # still below: the item follows, no new crossing
+        self.assertEqual(LowStockItem.objects.get(inventory=self.row).quantity, 4)
+        self.set_quantity(10)
+        self.assertFalse(LowStockItem.objects.exists())
+        self.assertEqual(list(StockLevelEvent.objects.order_by('pk').values_list('kind', 'quantity')),
+                         [('below_minimum', 5), ('recovered', 10)])
+
+    def test_minimum_change_rechecks_rows(self):
+        self.product.minimum_stock_level = 60
+        self.product.save()
+        self.assertTrue(LowStockItem.objects.filter(inventory=self.row, minimum_stock_level=60).exists())
+        self.product.minimum_stock_level = 10
+        self.product.save()
+        self.assertFalse(LowStockItem.objects.exists())
+        self.assertEqual(StockLevelEvent.objects.count(), 2)
+
+    def test_events_task_creates_rebalance(self):
+        self.set_quantity(5)
+        self.assertEqual(low_stock_events_task(), {'status': 'success', 'events_processed': 1, 'actions_created': 1})
+        action = StockRebalanceAction.objects.get()
+        self.assertEqual((action.source_store.store_id, action.target_store_id, action.quantity),
+                         ('WH001', self.store.pk, 95))
+        self.assertFalse(StockLevelEvent.objects.filter(processed_at__isnull=True).exists())
+        self.assertEqual(low_stock_events_task()['events_processed'], 0)
+
+    def test_recovered_row_gets_no_action(self):
+        self.set_quantity(5)
+        self.set_quantity(50)
+        self.assertEqual(low_stock_events_task()['actions_created'], 0)
+        self.assertFalse(StockRebalanceAction.objects.exists())
+
+    def test_endpoint_lists_rows_below_their_minimum(self):
+        other = Inventory(product_id='P001', product_name='Milk', store_location='Central Warehouse', quantity=3)
+        other.save()
+        self.set_quantity(5)
+        response = self.client.get('/api/inventory/low_stock/')
+        self.assertEqual([row['id'] for row in response.json()], [other.pk, self.row.pk])
+        response = self.client.get('/api/inventory/low_stock/', {'store': self.store.pk})
+        self.assertEqual([row['id'] for row in response.json()], [self.row.pk])
+
+
+class StockLotTests(TestCase):
+
+    def setUp(self):
+        self.warehouse, self.store, _ = make_network()
+        self.today = timezone.localdate()
+        self.row = Inventory(product_id='P001', product_name='Milk', store_location='Central Warehouse', quantity=0)
+        self.row.save()
+        receive_stock(self.row.pk, 5, self.today + timedelta(days=10), 'B')
+        receive_stock(self.row.pk, 6, None, 'DRY')
+        receive_stock(self.row.pk, 4, self.today + timedelta(days=3), 'A')
+
+    def lots(self, row):
+        return list(StockLot.objects.filter(inventory=row).order_by(*FEFO_ORDER).values_list('lot_number', 'quantity'))
+
+    def test_withdraw_earliest_expiry_first(self):
+        book = LotBook([self.row.pk])
+        self.assertEqual(book.withdraw(self.row.pk, 7), [
+            (self.today + timedelta(days=3), 'A', 4), (self.today + timedelta(days=10), 'B', 3),
+        ])
+        book.save()
+        self.assertEqual(self.lots(self.row), [('B', 2), ('DRY', 6)])
+        self.assertEqual(Inventory.objects.get(pk=self.row.pk).expiry_date, self.today + timedelta(days=10))
+
+    def test_non_perishable_stock_leaves_last(self):
+        adjust_stock(self.row.pk, -12)
+        self.assertEqual(self.lots(self.row), [('DRY', 3)])
+        self.assertIsNone(Inventory.objects.get(pk=self.row.pk).expiry_date)
+
+    def test_transfer_splits_lots(self):
+        transfer_stock('P001', 'Central Warehouse', 'Koramangala Store', 6)
+        target = Inventory.objects.get(store=self.store)
+        self.assertEqual(self.lots(target), [('A', 4), ('B', 2)])
+        self.assertEqual(self.lots(self.row), [('B', 3), ('DRY', 6)])
+        self.assertEqual(target.expiry_date, self.today + timedelta(days=3))
+        self.assertEqual(StockLot.objects.get(inventory=target, lot_number='B').store_id, self.store.pk)
+
+    def test_expiring_endpoint(self):
+        expired = StockLot.objects.create(inventory=self.row, store=self.warehouse, quantity=2,
+                                          expiry_date=self.today - timedelta(days=1))
+        response = self.client.get('/api/inventory/expiring/', {'days': 5})
+        self.assertEqual(response.json(), [{
+            'store_id': self.warehouse.pk, 'store__name': 'Central Warehouse', 'quantity': 4, 'lots': 1,
+            'earliest_expiry': (self.today + timedelta(days=3)).isoformat(),
+        }])
+        response = self.client.get('/api/inventory/expiring/', {'days': 30, 'include_expired': 'true'})
+        self.assertEqual(response.json()[0]['quantity'], 11)
+        self.assertEqual(response.json()[0]['earliest_expiry'], expired.expiry_date.isoformat())
+        response = self.client.get('/api/inventory/expiring/', {'days': 5, 'store': self.store.pk})
+        self.assertEqual(response.json(), [])
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        search_indexes.clear()  # the fallback index outlives each test's rollback
+        self.addCleanup(search_indexes.clear)
+
+    def explanation(self, text):
+        return AgentExplanation.objects.create(query='Why?', explanation_text=text)
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('The trucks were delayed, shipping cold-chain boxes past glass'),
+                         ['truck', 'delay', 'shipp', 'cold', 'chain', 'boxe', 'past', 'glass'])
+
+    def test_bm25_ranking(self):
+        frequent = self.explanation('Cold chain breach: the cold room and cold trucks failed')
+        short = self.explanation('Cold trucks')
+        long = self.explanation('Cold weather slowed the trucks on the ring road past the depot')
+        self.explanation('Warm storage overflow')
+        ranked = [hit['id'] for hit in search('cold', ['explanations'])]
+        # More occurrences first; at equal frequency the shorter text wins
+        self.assertEqual(ranked, [frequent.pk, short.pk, long.pk])
+        # Every word must match, after stemming
+        self.assertEqual({hit['id'] for hit in search('delays cold truck', ['explanations'])}, set())
+        self.assertEqual([hit['id'] for hit in search('trucks slowing', ['explanations'])], [long.pk])
+
+    def test_query_validation(self):
+        self.explanation('Cold trucks')
+        for q in ('', '  ', 'a', 'the', 'x y'):
+            with self.subTest(q=q):
+                self.assertEqual(self.client.get('/api/search/', {'q': q}).status_code, 400)
+        response = self.client.get('/api/search/', {'q': 'cold', 'type': 'explanations'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 1)
+
+
+@override_settings(AGENT_MODEL_CHECK_SECONDS=0, AGENT_MODEL_WEIGHTS={'YOLOv9': '/nonexistent/yolov9.pt'})
+class ModelRegistryTests(TestCase):
+
+    def setUp(self):
+        self.registry = ModelRegistry()
+
+    def loaded(self):
+        return {(entry['kind'], entry['version']) for entry in self.registry.stats()}
+
+    def test_hot_swap(self):
+        first = self.registry.get('forecaster')
+        self.assertEqual(first.version, 'LNN_v1')
+        self.assertIs(self.registry.get('forecaster'), first)
+        # Activated from another process: picked up on the next check, the old version dropped
+        ActiveAgentModel.objects.create(kind='forecaster', version='LNN_v2')
+        self.assertEqual(self.registry.get('forecaster').model.version, 'LNN_v2')
+        self.assertEqual(self.loaded(), {('forecaster', 'LNN_v2')})
+
+        self.registry.activate('forecaster', 'LNN_v3')
+        self.assertEqual(ActiveAgentModel.objects.get(kind='forecaster').version, 'LNN_v3')
+        self.assertEqual(self.loaded(), {('forecaster', 'LNN_v3')})
+        loads = AgentMetrics.objects.filter(agent_name='InventoryAgent', additional_data__event='model_load')
+        self.assertEqual(sorted(loads.values_list('additional_data__model', flat=True)), ['LNN_v1', 'LNN_v2', 'LNN_v3'])
+
+    def test_missing_artifact_is_never_activated(self):
+        with self.assertRaises(FileNotFoundError):
+            self.registry.activate('detector', 'YOLOv9')
+        self.assertFalse(ActiveAgentModel.objects.exists())
+
+    def test_missing_artifact_falls_back(self):
+        self.assertEqual(self.registry.get('detector').version, 'YOLOv8')
+        ActiveAgentModel.objects.create(kind='detector', version='YOLOv9')
+        # The version this process already runs keeps serving
+        self.assertEqual(self.registry.get('detector').version, 'YOLOv8')
+        failure = AgentMetrics.objects.get(metric_type='error_rate')
+        self.assertEqual((failure.agent_name, failure.additional_data['model']), ('VisionInspectorAgent', 'YOLOv9'))
+        # A fresh process starts on the default instead
+        self.assertEqual(ModelRegistry().get('detector').version, 'YOLOv8')
+
+    @override_settings(AGENT_MODEL_CHECK_SECONDS=60)
+    def test_failed_load_is_not_retried_on_every_call(self):
+        ActiveAgentModel.objects.create(kind='detector', version='YOLOv9')
+        for _ in range(3):
+            self.assertEqual(self.registry.get('detector').version, 'YOLOv8')
+        self.assertEqual(AgentMetrics.objects.filter(metric_type='error_rate').count(), 1)
+
+    @override_settings(AGENT_MODEL_DEFAULTS={**settings.AGENT_MODEL_DEFAULTS, 'detector': 'YOLOv9'})
+    def test_missing_default_raises(self):
+        with self.assertRaises(RuntimeError):
+            self.registry.get('detector')
+
+
+@override_settings(REPLICA_DATABASES=['replica_1'], REPLICA_MAX_LAG_SECONDS=5, REPLICA_LAG_CHECK_INTERVAL=0)
+class ReplicaRoutingTests(TestCase):
+
+    def setUp(self):
+        _lag_cache.clear()
+        self.addCleanup(_lag_cache.clear)
+        self.router = ReplicaRouter()
+        self.lag = mock.patch('core.db_routers.replica_lag', return_value=0.0).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def read(self):
+        return self.router.db_for_read(Store)
+
+    def test_only_safe_reads_use_the_replica(self):
+        self.assertEqual(self.read(), 'default')  # tasks, shell, migrations
+        with replica_reads():
+            self.assertEqual(self.read(), 'replica_1')
+        with replica_reads(pinned=True):
+            self.assertEqual(self.read(), 'default')
+
+    def test_read_after_write_stays_on_primary(self):
+        with replica_reads():
+            self.assertEqual(self.router.db_for_write(Store), 'default')
+            self.assertEqual(self.read(), 'default')
+        with replica_reads():
+            self.assertEqual(self.read(), 'replica_1')
+
+    def test_lagging_or_unreachable_replica_falls_back_to_primary(self):
+        with replica_reads():
+            for lag, alias in ((30.0, 'default'), (None, 'default'), (4.0, 'replica_1')):
+                with self.subTest(lag=lag):
+                    self.lag.return_value = lag
+                    self.assertEqual(self.read(), alias)
+
+    @override_settings(REPLICA_LAG_CHECK_INTERVAL=60)
+    def test_lag_is_cached(self):
+        self.lag.return_value = 30.0
+        with replica_reads():
+            self.assertEqual(self.read(), 'default')
+            self.lag.return_value = 0.0
+            self.assertEqual(self.read(), 'default')
+        self.assertEqual(self.lag.call_count, 1)
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_no_replicas_configured(self):
+        with replica_reads():
+            self.assertEqual(self.read(), 'default')
+        self.lag.assert_not_called()
+
+    def test_client_sticks_to_primary_after_writing(self):
+        make_network()
+        routed = []
+        route = ReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            routed.append(route(router, model, **hints))
+            return 'default'  # there is no replica connection to actually read from
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', autospec=True, side_effect=record):
+            response = self.client.post('/api/logs/', {'agent_name': 'Test', 'action': 'Wrote'},
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 201)
+            pin = response.cookies['agentx_primary_pin']
+            self.assertEqual(pin['max-age'], settings.REPLICA_STICKY_SECONDS)
+
+            routed.clear()
+            self.client.get('/api/agents/stores/')
+            self.assertEqual(set(routed), {'default'})
+
+            # Once the pin expires, reads go back to the replica
+            del self.client.cookies['agentx_primary_pin']
+            routed.clear()
+            self.client.get('/api/agents/stores/')
+            self.assertEqual(set(routed), {'replica_1'})
+
+
+@override_settings(DEBUG=False, OPENAPI_SCHEMA_REVISION='0123456789abcdef')
+class SchemaTests(TestCase):
+    generated = {'openapi': '3.0.3', 'info': {'title': 'Generated', 'version': '1'}, 'paths': {}}
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(OPENAPI_SCHEMA_DIR=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        clear_schema_cache()
+        self.addCleanup(clear_schema_cache)
+        mock.patch('core.schema.generate_schema', return_value=self.generated).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def title(self):
+        return self.client.get('/api/schema/', {'format': 'json'}).json()['info']['title']
+
+    def test_artifact_keyed_by_revision(self):
+        path = write_schema_artifact()
+        self.assertTrue(path.name.endswith('-0123456789ab.json'))
+        path.write_text(json.dumps({**self.generated, 'info': {'title': 'Built', 'version': '1'}}))
+        self.assertEqual(self.title(), 'Built')
+
+        # New code: the old revision's artifact is ignored
+        with override_settings(OPENAPI_SCHEMA_REVISION='fedcba9876543210'):
+            clear_schema_cache()
+            self.assertNotEqual(schema_artifact_path(), path)
+            self.assertEqual(self.title(), 'Generated')
+
+    def test_without_a_revision_schema_is_generated(self):
+        with override_settings(OPENAPI_SCHEMA_REVISION=''), mock.patch('core.schema._git_head', return_value=None):
+            clear_schema_cache()
+            self.assertIsNone(source_revision())
+            self.assertIsNone(schema_artifact_path())
+            with self.assertRaises(ImproperlyConfigured):
+                write_schema_artifact()
+            self.assertEqual(self.title(), 'Generated')
+
+    def test_etag_revalidation(self):
+        response = self.client.get('/api/schema/', {'format': 'json'})
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response = self.client.get('/api/schema/', {'format': 'json'}, HTTP_IF_NONE_MATCH=f'"other", {etag}')
+        self.assertEqual((response.status_code, response.content, response['ETag']), (304, b'', etag))
+        response = self.client.get('/api/schema/', {'format': 'json'}, HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+        # YAML is a different representation with its own tag
+        response = self.client.get('/api/schema/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
@@ -0,0 +1,180 @@
+"""
+Timing spans and metrics for agent tasks
+
+Every agent task runs under @traced_task, which measures wall time, DB
+time, query count and queue wait (enqueue to start) and records the
+outcome as a TaskSpan plus an AgentMetrics response_time row. Trace ids
+travel to child tasks in message headers, so the spans of one workflow -
+and the CortexCoordination that started it - can be read back together.
+"""
+import functools
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone as dt_timezone
+
+from celery import current_task
+from celery.signals import before_task_publish
+from django.db import DatabaseError, router, transaction
+from django.utils import timezone
+
+from .agent_models import AgentMetrics, TaskSpan
+from .profiling import QueryRecorder
+
+
+# Trace context of the task currently running in this thread
+_current_span = ContextVar('agentx_current_span', default=None)
+
+TRACE_HEADERS = ('trace_id', 'parent_span_id', 'coordination_id')
+
+
+@before_task_publish.connect(dispatch_uid='agentx_tracing_headers')
+def add_trace_headers(headers=None, **kwargs):
+    """Stamp outgoing tasks with their enqueue time and the caller's trace"""
+    if headers is None:
+        return
+    headers['enqueued_at'] = time.time()
+    span = _current_span.get()
+    if span is not None:
+        headers['trace_id'] = span['trace_id']
+        headers['parent_span_id'] = span['span_id']
+        headers['coordination_id'] = span['coordination_id']
+
+
+def link_coordination(coordination):
+    """Attach the running span, and the tasks it enqueues from now on, to a coordination"""
+    span = _current_span.get()
+    if span is not None:
+        span['coordination_id'] = coordination.id
+
+
+def _header(request, name):
+    # Workers expose custom message headers as request attributes, apply() under request.headers
+    value = getattr(request, name, None)
+    if value is None:
+        value = (getattr(request, 'headers', None) or {}).get(name)
+    return value
+
+
+def _inherited_context():
+    """Trace context from the message headers, else from a task calling us directly"""
+    request = getattr(current_task, 'request', None)
+    enqueued_at = _header(request, 'enqueued_at')
+    task_id = getattr(request, 'id', None) or ''
+    if _header(request, 'trace_id'):
+        parent = {name: _header(request, name) for name in TRACE_HEADERS}
+    else:
+        caller = _current_span.get()
+        parent = {
+            'trace_id': caller['trace_id'] if caller else None,
+            'parent_span_id': caller['span_id'] if caller else None,
+            'coordination_id': caller['coordination_id'] if caller else None,
+        }
+    return parent, enqueued_at, task_id
+
+
+def _outcome(result):
+    if isinstance(result, dict):
+        if result.get('deduplicated'):
+            return 'deduplicated'
+        if result.get('status') in ('duplicate', 'error'):
+            return result['status']
+    return 'success'
+
+
+def traced_task(agent_name):
+    """
+    Measure and record every run of an agent task.
+
+    Place it directly under @shared_task. Exceptions are recorded on the
+    span and re-raised, so Celery still sees the failure.
+    """
+    def decorator(func):
+        task_name = f'{func.__module__}.{func.__name__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            parent, enqueued_at, task_id = _inherited_context()
+            span = {
+                'span_id': str(uuid.uuid4()),
+                'trace_id': parent['trace_id'] or str(uuid.uuid4()),
+                'coordination_id': parent['coordination_id'],
+            }
+            token = _current_span.set(span)
+            recorder = QueryRecorder()
+            started_at = timezone.now()
+            started = time.perf_counter()
+            error = None
+            result = None
+            try:
+                with recorder.record():
+                    result = func(*args, **kwargs)
+                return result
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                wall_time_ms = (time.perf_counter() - started) * 1000
+                _current_span.reset(token)
+                _record(
+                    span, parent, task_name, agent_name, task_id, enqueued_at, started_at,
+                    wall_time_ms, recorder, error, result
+                )
+        return wrapper
+    return decorator
+
+
+def _record(span, parent, task_name, agent_name, task_id, enqueued_at, started_at,
+            wall_time_ms, recorder, error, result):
+    status = 'error' if error is not None else _outcome(result)
+    if enqueued_at is not None:
+        enqueued_at = datetime.fromtimestamp(enqueued_at, tz=dt_timezone.utc)
+        queue_wait_ms = max((started_at - enqueued_at).total_seconds() * 1000, 0.0)
+    else:
+        queue_wait_ms = None
+    db_time_ms = recorder.duration * 1000
+
+    using = router.db_for_write(TaskSpan)
+    if transaction.get_connection(using).needs_rollback:
+        # The task failed inside the caller's atomic block, whose rollback would discard the span anyway
+        return
+    try:
+        # A savepoint, so a failed write can't break a transaction the task was called in
+        with transaction.atomic(using=using):
+            TaskSpan.objects.create(
+                span_id=span['span_id'],
+                trace_id=span['trace_id'],
+                parent_span_id=parent['parent_span_id'],
+                coordination_id=span['coordination_id'],
+                task_name=task_name,
+                agent_name=agent_name,
+                celery_task_id=task_id,
+                status=status,
+                error=repr(error) if error is not None else '',
+                enqueued_at=enqueued_at,
+                started_at=started_at,
+                wall_time_ms=wall_time_ms,
+                db_time_ms=db_time_ms,
+                query_count=recorder.count,
+                queue_wait_ms=queue_wait_ms,
+            )
+            # Deduplicated calls did no work; keep them out of the latency series
+            if status in ('success', 'error'):
+                AgentMetrics.objects.create(
+                    agent_name=agent_name,
+                    metric_type='response_time',
+                    metric_value=wall_time_ms,
+                    unit='ms',
+                    additional_data={
+                        'task': task_name,
+                        'status': status,
+                        'span_id': span['span_id'],
+                        'trace_id': span['trace_id'],
+                        'db_time_ms': round(db_time_ms, 2),
+                        'query_count': recorder.count,
+                        'queue_wait_ms': round(queue_wait_ms, 2) if queue_wait_ms is not None else None,
+                    }
+                )
+    except DatabaseError:
+        # Tracing must never fail the task it measured
+        pass
@@ -0,0 +1,120 @@
+"""
+Bulk status transitions for rebalance actions and routes
+
+Selects rows by ID list or filter, checks each against the model's state
+machine (REBALANCE_TRANSITIONS / ROUTE_TRANSITIONS) and moves every
+allowed row with one conditional UPDATE. The candidate rows are locked
+first, so the rows reported as rejected are exactly the ones the UPDATE
+skipped.
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+
+def allowed_sources(transitions, target):
+    """Statuses the state machine lets move to `target`"""
+    return [source for source, targets in transitions.items() if target in targets]
+
+
+def bulk_transition(queryset, field, target, transitions, updates=None):
+    """
+    Move every row of `queryset` that may go to `target` there.
+
+    `updates` are extra column values for the moved rows (e.g. a
+    completion time). Returns (updated count, [{'id', field}] rejected,
+    ids of all matched rows).
+    """
+    sources = allowed_sources(transitions, target)
+    with transaction.atomic():
+        current = list(queryset.select_for_update().order_by('pk').values_list('pk', field))
+        rejected = [{'id': pk, field: value} for pk, value in current if value not in sources]
+        updated = queryset.filter(**{f'{field}__in': sources}).update(**{field: target, **(updates or {})})
+    return updated, rejected, {pk for pk, _ in current}
+
+
+class BulkTransitionSerializer(serializers.Serializer):
+    """A target status and the rows to move: an ID list or a filter"""
+    status = serializers.CharField(help_text="Target status")
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, max_length=50000,
+        help_text="Rows to transition"
+    )
+    filter = serializers.DictField(
+        required=False,
+        help_text="Select rows by field instead of by ID, e.g. {\"status\": \"pending\", \"urgency\": [\"high\"]}"
+    )
+
+    def validate(self, data):
+        if not data.get('ids') and not data.get('filter'):
+            raise serializers.ValidationError("Give ids or a non-empty filter")
+        return data
+
+
+class BulkTransitionMixin:
+    """
+    Adds POST .../transition/ to a viewset.
+
+    Set `transition_field`, `transitions` (the state machine) and
+    `transition_filters` ({filter key: ORM lookup}); override
+    transition_updates() to set more columns on moved rows.
+    """
+    transition_field = 'status'
+    transitions = {}
+    transition_filters = {}
+
+    def transition_updates(self, target):
+        return {}
+
+    @extend_schema(
+        summary="Bulk status transition",
+        description="Move the rows given by `ids` or `filter` to `status`. Rows whose current status "
+                    "can't move there are left unchanged and listed in `rejected`.",
+        request=BulkTransitionSerializer,
+        responses={200: OpenApiTypes.OBJECT}
+    )
+    @action(detail=False, methods=['post'])
+    def transition(self, request):
+        serializer = BulkTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        target = serializer.validated_data['status']
+        if target not in self.transitions:
+            return Response(
+                {"error": f"Unknown status {target}; expected one of {sorted(self.transitions)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # The plain table: select_for_update can't lock the nullable side of a viewset's joins
+        queryset = self.queryset.model.objects.all()
+        ids = serializer.validated_data.get('ids')
+        if ids:
+            queryset = queryset.filter(pk__in=ids)
+        try:
+            for key, value in serializer.validated_data.get('filter', {}).items():
+                if key not in self.transition_filters:
+                    return Response(
+                        {"error": f"Can't filter on {key}; expected one of {sorted(self.transition_filters)}"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                lookup = self.transition_filters[key]
+                queryset = queryset.filter(**{f'{lookup}__in' if isinstance(value, list) else lookup: value})
+        except (ValueError, TypeError, ValidationError) as exc:
+            return Response({"error": f"Invalid filter: {exc}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        updated, rejected, matched = bulk_transition(
+            queryset, self.transition_field, target, self.transitions, self.transition_updates(target)
+        )
+        result = {
+            'status': target,
+            'matched': len(matched),
+            'updated': updated,
+            'rejected_count': len(rejected),
+            'rejected': rejected,
+        }
+        if ids:
+            result['not_found'] = sorted(set(ids) - matched)
+        return Response(result)
@@ -0,0 +1,195 @@
+"""
+Read-only fast path for large list responses
+
+A ModelSerializer builds a model instance per row and runs every field
+through get_attribute/to_representation, which dominates CPU time on big
+pages. ValuesSerializer compiles a serializer's readable fields once
+into a values_list() column list and a per-column conversion, then turns
+each row tuple into the same dict the serializer would have produced -
+dotted sources like 'store.name' become joins instead of a query per
+row. Values whose JSON encoding already matches the serializer's output
+(ints, strings, UTC datetimes, dates, UUIDs, JSON) pass through
+untouched for the renderer to encode.
+
+Only plain model-field sources and PrimaryKeyRelatedFields can be
+compiled; a serializer with SerializerMethodFields, nested serializers
+or its own to_representation raises ImproperlyConfigured.
+"""
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .profiling import TimedSerializerMixin, serializer_timing
+from .renderers import ORJSONRenderer
+
+
+# Serializer fields whose to_representation returns what the database gives
+# for these model field types unchanged
+PASSTHROUGH_FIELDS = [
+    (serializers.ChoiceField, None),
+    (serializers.ReadOnlyField, None),
+    (serializers.CharField, {'CharField', 'TextField', 'SlugField'}),
+    (serializers.IntegerField, {'IntegerField', 'BigIntegerField', 'SmallIntegerField', 'PositiveIntegerField',
+                                'PositiveBigIntegerField', 'PositiveSmallIntegerField', 'AutoField',
+                                'BigAutoField', 'SmallAutoField'}),
+    (serializers.FloatField, {'FloatField'}),
+    (serializers.BooleanField, {'BooleanField'}),
+]
+UNSUPPORTED_FIELDS = (
+    serializers.SerializerMethodField, serializers.ManyRelatedField,
+    serializers.BaseSerializer, serializers.ModelField, serializers.HiddenField,
+)
+
+_compiled = {}
+
+
+def _passes_through(field, model_field):
+    """Whether a field's representation equals the raw value, as both JSON renderers encode it"""
+    if isinstance(field, serializers.DateTimeField):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        # ISO output is converted to the active timezone, so that's decided per call (None)
+        return output_format is None or (None if output_format == ISO_8601 else False)
+    if isinstance(field, serializers.DateField):
+        return getattr(field, 'format', api_settings.DATE_FORMAT) in (None, ISO_8601)
+    if isinstance(field, serializers.TimeField):
+        return getattr(field, 'format', api_settings.TIME_FORMAT) in (None, ISO_8601)
+    if isinstance(field, serializers.UUIDField):
+        return field.uuid_format == 'hex_verbose'
+    if isinstance(field, serializers.JSONField):
+        return not field.binary
+    for field_class, internal_types in PASSTHROUGH_FIELDS:
+        if isinstance(field, field_class):
+            return internal_types is None or model_field.get_internal_type() in internal_types
+    return False
+
+
+class ValuesSerializer:
+    """Turns values_list() rows into the dicts a serializer would produce"""
+
+    def __init__(self, serializer):
+        self.model = serializer.Meta.model
+        # TimedSerializerMixin only wraps the method; look past it for a real override
+        own = next(klass.__dict__['to_representation'] for klass in type(serializer).__mro__
+                   if klass is not TimedSerializerMixin and 'to_representation' in klass.__dict__)
+        if own is not serializers.ModelSerializer.to_representation:
+            raise ImproperlyConfigured(f'{type(serializer).__name__} overrides to_representation')
+
+        self.names = []
+        self.lookups = []
+        self.converters = []  # (column index, convert)
+        self.datetimes = []  # (column index, convert) passed through only in UTC
+        self.guards = []  # (lookup of a nullable join, names it hides when null)
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            lookup, model_field, guards = self._compile_source(field)
+            index = len(self.names)
+            self.names.append(name)
+            self.lookups.append(lookup)
+            for guard in guards:
+                self._guard(guard, name)
+            if isinstance(field, serializers.PrimaryKeyRelatedField):
+                if field.pk_field is not None:
+                    self.converters.append((index, field.pk_field.to_representation))
+                continue
+            passes = _passes_through(field, model_field)
+            if passes is None:
+                self.datetimes.append((index, field.to_representation))
+            elif not passes:
+                self.converters.append((index, field.to_representation))
+
+        self.columns = self.lookups + [lookup for lookup, _ in self.guards]
+
+    def _compile_source(self, field):
+        """The values() lookup for a field's source, its model field and the nullable relations it crosses"""
+        related = isinstance(field, serializers.RelatedField)
+        if (isinstance(field, UNSUPPORTED_FIELDS) or field.source == '*'
+                or (related and not isinstance(field, serializers.PrimaryKeyRelatedField))):
+            raise ImproperlyConfigured(f"Can't read {field.field_name} ({type(field).__name__}) from values()")
+        model = self.model
+        path = []
+        guards = []
+        for position, attr in enumerate(field.source_attrs):
+            try:
+                model_field = model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                raise ImproperlyConfigured(f"{field.field_name}'s source {field.source} isn't a database field")
+            last = position == len(field.source_attrs) - 1
+            if last:
+                path.append(model_field.attname if related else attr)
+            elif model_field.many_to_one or model_field.one_to_one:
+                if model_field.null:
+                    # A missing related object makes DRF skip the field rather than emit null
+                    guards.append('__'.join(path + [model_field.attname]))
+                path.append(attr)
+                model = model_field.related_model
+            else:
+                raise ImproperlyConfigured(f"{field.field_name}'s source {field.source} crosses a to-many relation")
+        return '__'.join(path), model_field, guards
+
+    def _guard(self, lookup, name):
+        for existing, names in self.guards:
+            if existing == lookup:
+                names.append(name)
+                return
+        self.guards.append((lookup, [name]))
+
+    def rows(self, queryset):
+        """Serialized dicts for every row of `queryset` (a QuerySet or a values_list page)"""
+        if not isinstance(queryset, list):
+            queryset = queryset.values_list(*self.columns)
+        names = self.names
+        converters = self.converters
+        if self.datetimes and timezone.get_current_timezone_name() != 'UTC':
+            converters = converters + self.datetimes
+        guards = [(len(names) + offset, hidden) for offset, (_, hidden) in enumerate(self.guards)]
+
+        data = []
+        for row in queryset:
+            item = dict(zip(names, row))
+            for index, convert in converters:
+                value = row[index]
+                if value is not None:
+                    item[names[index]] = convert(value)
+            for index, hidden in guards:
+                if row[index] is None:
+                    for name in hidden:
+                        del item[name]
+            data.append(item)
+        return data
+
+
+def values_serializer(serializer):
+    """The compiled ValuesSerializer for a serializer instance, cached by class and field set"""
+    key = (type(serializer), tuple(serializer.fields))
+    if key not in _compiled:
+        _compiled[key] = ValuesSerializer(serializer)
+    return _compiled[key]
+
+
+class ValuesListMixin:
+    """
+    Opt-in fast list() for read-heavy viewsets.
+
+    Serializes the page from values_list() with the viewset's serializer
+    compiled by ValuesSerializer and renders JSON with orjson; responses
+    are identical to the regular serializer's. Writes and detail views are
+    unchanged.
+    """
+    renderer_classes = [ORJSONRenderer, BrowsableAPIRenderer]
+
+    def values_data(self, queryset):
+        return values_serializer(self.get_serializer(many=True).child).rows(queryset)
+
+    def list(self, request, *args, **kwargs):
+        compiled = values_serializer(self.get_serializer(many=True).child)
+        queryset = self.filter_queryset(self.get_queryset()).values_list(*compiled.columns)
+        page = self.paginate_queryset(queryset)
+        with serializer_timing():
+            rows = compiled.rows(page if page is not None else queryset)
+        if page is not None:
+            return self.get_paginated_response(rows)
+        return Response(rows)
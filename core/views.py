@@ -3,8 +3,17 @@ from rest_framework.decorators import api_view, action
 from rest_framework.response import Response
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiResponse
 from drf_spectacular.types import OpenApiTypes
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+from .agent_models import Store
 from .models import Inventory, TransferLog, DeliveryRoute, AgentLog
 from .serializers import *
+from .bulk import BulkWriteMixin, InventoryBulkWriter
+from .stock_ledger import stock_at
+from .stock_lots import FEFO_ORDER, expiring_stock
+from .stock_movements import InsufficientStock, adjust_stock, apply_movements, receive_stock, transfer_stock
+from .values_serializers import ValuesListMixin
 from datetime import datetime, timedelta
 
 
@@ -40,7 +49,7 @@ from datetime import datetime, timedelta
         responses={204: None}
     )
 )
-class InventoryViewSet(viewsets.ModelViewSet):
+class InventoryViewSet(BulkWriteMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing inventory items.
     
@@ -51,17 +60,24 @@ class InventoryViewSet(viewsets.ModelViewSet):
     """
     queryset = Inventory.objects.all()
     serializer_class = InventorySerializer
+    bulk_writer_class = InventoryBulkWriter
 
     @extend_schema(
         summary="Get low stock items",
-        description="Retrieve inventory items with quantity below specified threshold",
+        description="Retrieve inventory items below their product's minimum stock level, "
+                    "or below a fixed threshold if one is given",
         parameters=[
             OpenApiParameter(
                 name='threshold',
                 type=OpenApiTypes.INT,
                 location=OpenApiParameter.QUERY,
-                description='Stock threshold (default: 10)',
-                default=10
+                description="Fixed stock threshold (default: each product's minimum_stock_level)"
+            ),
+            OpenApiParameter(
+                name='store',
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description='Only this store ID'
             )
         ],
         responses={200: InventorySerializer(many=True)}
@@ -69,11 +85,136 @@ class InventoryViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def low_stock(self, request):
         """Get inventory items with low stock."""
-        threshold = int(request.query_params.get('threshold', 10))
-        low_stock_items = self.queryset.filter(quantity__lt=threshold)
+        try:
+            threshold = int(request.query_params['threshold']) if 'threshold' in request.query_params else None
+            store_id = int(request.query_params['store']) if request.query_params.get('store') else None
+        except ValueError:
+            return Response({"error": "threshold and store must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        if threshold is not None:
+            low_stock_items = self.queryset.filter(quantity__lt=threshold)
+        else:
+            # Maintained incrementally by core.low_stock, so this never scans the whole table
+            low_stock_items = self.queryset.filter(low_stock__isnull=False).order_by('low_stock__below_since')
+        if store_id is not None:
+            low_stock_items = low_stock_items.filter(store_id=store_id)
         serializer = self.get_serializer(low_stock_items, many=True)
         return Response(serializer.data)
 
+    @extend_schema(
+        summary="Get stock at a point in time",
+        description="Reconstruct a store's stock levels at any moment from the stock ledger and its nearest snapshot",
+        parameters=[
+            OpenApiParameter(
+                name='store',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Store ID (pk) or legacy store location name',
+                required=True
+            ),
+            OpenApiParameter(
+                name='at',
+                type=OpenApiTypes.DATETIME,
+                location=OpenApiParameter.QUERY,
+                description='ISO 8601 timestamp (default: now)'
+            )
+        ],
+        responses={200: OpenApiTypes.OBJECT}
+    )
+    @action(detail=False, methods=['get'])
+    def stock_at(self, request):
+        """Get a store's stock levels as of a past moment."""
+        store_param = request.query_params.get('store')
+        if not store_param:
+            return Response({"error": "store is required"}, status=status.HTTP_400_BAD_REQUEST)
+        stores = Store.objects.filter(pk=store_param) if store_param.isdigit() else Store.objects.filter(name=store_param)
+        store = stores.order_by('pk').first()
+        if store is None:
+            return Response({"error": f"Unknown store {store_param}"}, status=status.HTTP_404_NOT_FOUND)
+
+        at = None
+        if request.query_params.get('at'):
+            at = parse_datetime(request.query_params['at'])
+            if at is None:
+                return Response({"error": "at must be an ISO 8601 datetime"}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(at):
+                at = timezone.make_aware(at)
+
+        quantities, snapshot = stock_at(store.pk, at)
+        products = Inventory.objects.in_bulk(quantities.keys())
+        items = []
+        for inventory_id, quantity in sorted(quantities.items()):
+            row = products.get(inventory_id)
+            items.append({
+                'inventory_id': inventory_id,
+                'product_id': row.product_id if row else None,
+                'product_name': row.product_name if row else None,
+                'quantity': quantity,
+            })
+        return Response({
+            'store': store.pk,
+            'store_name': store.name,
+            'at': (at or timezone.now()).isoformat(),
+            'snapshot_taken_at': snapshot.taken_at.isoformat() if snapshot else None,
+            'items': items,
+        })
+
+    @extend_schema(
+        summary="List or receive stock lots",
+        description="GET lists the item's lots in first-expired-first-out order; POST receives a new lot, "
+                    "adding its quantity to the item",
+        request=StockLotSerializer,
+        responses={200: StockLotSerializer(many=True), 201: StockLotSerializer}
+    )
+    @action(detail=True, methods=['get', 'post'])
+    def lots(self, request, pk=None):
+        """List an item's lots or receive a new one."""
+        item = self.get_object()
+        if request.method == 'POST':
+            serializer = StockLotSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            lot = receive_stock(item.pk, **serializer.validated_data)
+            return Response(StockLotSerializer(lot).data, status=status.HTTP_201_CREATED)
+        lots = item.lots.filter(quantity__gt=0).order_by(*FEFO_ORDER)
+        return Response(StockLotSerializer(lots, many=True).data)
+
+    @extend_schema(
+        summary="Get expiring stock by store",
+        description="Stock expiring within the next N days across the network (or one store), "
+                    "grouped by store, soonest first",
+        parameters=[
+            OpenApiParameter(
+                name='days',
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description='Days ahead to look (default: 3)',
+                default=3
+            ),
+            OpenApiParameter(
+                name='store',
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description='Only this store ID'
+            ),
+            OpenApiParameter(
+                name='include_expired',
+                type=OpenApiTypes.BOOL,
+                location=OpenApiParameter.QUERY,
+                description='Also count lots already past their expiry date'
+            )
+        ],
+        responses={200: OpenApiTypes.OBJECT}
+    )
+    @action(detail=False, methods=['get'])
+    def expiring(self, request):
+        """Get stock expiring soon, per store."""
+        try:
+            days = int(request.query_params.get('days', 3))
+            store_id = int(request.query_params['store']) if request.query_params.get('store') else None
+        except ValueError:
+            return Response({"error": "days and store must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        include_expired = request.query_params.get('include_expired', '').lower() in ('1', 'true', 'yes')
+        return Response(list(expiring_stock(days, store_id=store_id, include_expired=include_expired)))
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -107,7 +248,7 @@ class InventoryViewSet(viewsets.ModelViewSet):
         responses={204: None}
     )
 )
-class TransferLogViewSet(viewsets.ModelViewSet):
+class TransferLogViewSet(ValuesListMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing transfer logs.
     
@@ -117,6 +258,58 @@ class TransferLogViewSet(viewsets.ModelViewSet):
     queryset = TransferLog.objects.all()
     serializer_class = TransferLogSerializer
 
+    def create(self, request, *args, **kwargs):
+        """Log a transfer and move the stock in the same transaction."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            transfer = transfer_stock(
+                product_id=data['product'].product_id,
+                from_store=data['from_store'],
+                to_store=data['to_store'],
+                quantity=data['quantity'],
+                reason=data['reason']
+            )
+        except (Inventory.DoesNotExist, ValueError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except InsufficientStock as e:
+            return Response({"error": f"Insufficient stock: {e}"}, status=status.HTTP_409_CONFLICT)
+        return Response(self.get_serializer(transfer).data, status=status.HTTP_201_CREATED)
+
+    @extend_schema(
+        summary="Apply a batch of transfers",
+        description=(
+            "Move stock for many products/stores in one all-or-nothing transaction. "
+            "Each movement decrements the source row, increments the destination row "
+            "(created if missing) and writes a transfer log."
+        ),
+        request=StockMovementSerializer(many=True),
+        responses={
+            201: TransferLogSerializer(many=True),
+            400: OpenApiResponse(description="Invalid movement or unknown source inventory"),
+            409: OpenApiResponse(description="A movement would take stock below zero; nothing was applied")
+        }
+    )
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """Apply many stock movements atomically."""
+        serializer = StockMovementSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        try:
+            transfers = apply_movements(serializer.validated_data)
+        except (Inventory.DoesNotExist, ValueError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except InsufficientStock as e:
+            return Response(
+                {"error": f"Insufficient stock: {e}", "rows": e.rows},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response(
+            {"created": len(transfers)},
+            status=status.HTTP_201_CREATED
+        )
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -245,6 +438,7 @@ class AgentLogViewSet(viewsets.ModelViewSet):
             ]
         ),
         400: OpenApiResponse(description="Bad request - simulation failed"),
+        409: OpenApiResponse(description="Not enough stock at the distribution center for the transfers"),
         500: OpenApiResponse(description="Internal server error")
     },
     tags=['Agent Operations']
@@ -264,35 +458,36 @@ def run_fake_agent(request):
         eggs = Inventory.objects.get(product_name="Great Value Eggs", store_location="Walmart Supercenter #1234")
         bread = Inventory.objects.get(product_name="Wonder Bread", store_location="Walmart Supercenter #1234")
 
-        milk.quantity -= 8  # Simulate drop in milk stock
-        eggs.quantity -= 12 # Simulate drop in eggs stock
-        bread.quantity -= 5 # Simulate drop in bread stock
-        milk.save()
-        eggs.save()
-        bread.save()
+        with transaction.atomic():
+            # Simulate drops in stock (sales) as atomic decrements
+            adjust_stock(milk.pk, -8)
+            adjust_stock(eggs.pk, -12)
+            adjust_stock(bread.pk, -5)
 
-        # 2. Create transfers for multiple products
-        TransferLog.objects.create(
-            from_store="Walmart Distribution Center - Dallas",
-            to_store="Walmart Supercenter #1234",
-            product=milk,
-            quantity=20,
-            reason="Restocking Great Value Milk due to high demand (July 4th BBQ)"
-        )
-        TransferLog.objects.create(
-            from_store="Walmart Distribution Center - Dallas",
-            to_store="Walmart Supercenter #1234",
-            product=eggs,
-            quantity=30,
-            reason="Eggs restock for weekend breakfast rush"
-        )
-        TransferLog.objects.create(
-            from_store="Walmart Distribution Center - Dallas",
-            to_store="Walmart Supercenter #1234",
-            product=bread,
-            quantity=15,
-            reason="Wonder Bread restock for sandwich promotion"
-        )
+            # 2. Move stock for multiple products from the distribution center
+            apply_movements([
+                {
+                    "product_id": milk.product_id,
+                    "from_store": "Walmart Distribution Center - Dallas",
+                    "to_store": "Walmart Supercenter #1234",
+                    "quantity": 20,
+                    "reason": "Restocking Great Value Milk due to high demand (July 4th BBQ)"
+                },
+                {
+                    "product_id": eggs.product_id,
+                    "from_store": "Walmart Distribution Center - Dallas",
+                    "to_store": "Walmart Supercenter #1234",
+                    "quantity": 30,
+                    "reason": "Eggs restock for weekend breakfast rush"
+                },
+                {
+                    "product_id": bread.product_id,
+                    "from_store": "Walmart Distribution Center - Dallas",
+                    "to_store": "Walmart Supercenter #1234",
+                    "quantity": 15,
+                    "reason": "Wonder Bread restock for sandwich promotion"
+                }
+            ])
 
         # 3. Create delivery routes for each product
         DeliveryRoute.objects.create(
@@ -349,6 +544,11 @@ def run_fake_agent(request):
             {"error": "Required inventory not found in Walmart Supercenter #1234"},
             status=status.HTTP_400_BAD_REQUEST
         )
+    except InsufficientStock as e:
+        return Response(
+            {"error": f"Insufficient stock for agent transfers: {e}"},
+            status=status.HTTP_409_CONFLICT
+        )
     except Exception as e:
         return Response(
             {"error": f"Agent simulation failed: {str(e)}"},